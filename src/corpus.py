@@ -0,0 +1,214 @@
+# This file contains functions for building the first base receiving dataset across all of the games
+
+import numpy as np
+import pandas as pd
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src.game import Game, FIRST_BASE_COORDS
+from src.utils import get_all_game_strs
+
+
+# the event level fields that get saved for each throw and receive
+COLS_TO_SAVE = [
+    "game_str", "play_id", "player_id",
+    "player_position",
+    "xy_throw_angle", "elevation_throw_angle",
+    "throw_bounced",
+    "throw_velo", "batter_dist_to_first",
+    "thrower_x", "thrower_y",
+    "batter_x", "batter_y",
+    "ball_position_x", "ball_position_y", "ball_position_z",
+    "type"
+]
+
+# 27 is average sprint speed in fps
+SPRINT_SPEED_FPS = 27
+
+# 1.4667 is mph to fps conversion
+MPH_TO_FPS = 1.4667
+
+
+def extract_first_base_throws_and_receives(game_obj):
+    """
+    Finds the throws and receives on plays that end with the first baseman, for a single game
+
+    This is the loop body from the AnalysisPipeline notebook
+
+    Params:
+        game_obj: (Game)
+            - a prepped Game, if "full_seq" is in its which_outs, trusted full sequence outs are used as labels,
+              otherwise is_out_at_first is
+
+    Returns:
+        a df with COLS_TO_SAVE, where "type" says whether the row is a throw or receive and whether it was an out
+
+    """
+    g_game_info = game_obj.game_info_df
+    g_game_events = game_obj.game_events_df
+
+    if "full_seq" in game_obj.which_outs:
+        out_plays = g_game_info.loc[(g_game_info["this_play_outs"] == 1) & (g_game_info["trust_this_half"] == 1), "play_per_game"].values
+        not_out_plays = g_game_info.loc[(g_game_info["this_play_outs"] == 0) & (g_game_info["trust_this_half"] == 1), "play_per_game"].values
+    else:
+        out_plays = g_game_info.loc[g_game_info["is_out_at_first"] == 1, "play_per_game"].values
+        not_out_plays = g_game_info.loc[g_game_info["is_out_at_first"] == -1, "play_per_game"].values
+
+    # the first baseman receiving the ball to end the play, and it isn't a pickoff
+    first_base_receives = (g_game_events["event"] == "ball acquired") &\
+        (g_game_events["next_event"] == "end of play") &\
+        (g_game_events["player_position"] == 3) &\
+        (g_game_events["prev_event"] != "pickoff throw")
+
+    throws = g_game_events["event"] == "throw (ball-in-play)"
+
+    model_rows = []
+
+    for plays, which in [(out_plays, "out"), (not_out_plays, "not_out")]:
+
+        receives = g_game_events.loc[first_base_receives & (g_game_events["play_per_game"].isin(plays)), :].copy()
+
+        if which == "not_out":
+            # outfielders throwing the ball back in aren't plays at first
+            receives = receives.loc[~receives["prev_player_position"].isin([7, 8, 9]), :]
+
+        # get the last throw! (I am assuming this is a throw to first because it end with first!)
+        last_throws = g_game_events.loc[
+            throws & (g_game_events["play_per_game"].isin(receives["play_per_game"].values))
+        ].groupby("play_per_game").last()
+
+        last_throws["type"] = "trusted_first_base_" + which + "_throws"
+        receives["type"] = "trusted_first_base_" + which + "_receives"
+
+        model_rows += [last_throws[COLS_TO_SAVE], receives[COLS_TO_SAVE]]
+
+    return pd.concat(model_rows, ignore_index=True)
+
+
+def combine_throws_and_receives(model_dataset):
+    """
+    Lines up each throw with its receive, and computes the features that need both
+
+    This is load_model_data plus the feature cells from the AnalysisPipeline notebook,
+    the output looks like full_computed_dataset.csv
+
+    """
+
+    combined = []
+
+    for which, target in [("out", 1), ("not_out", 0)]:
+        this_combined = model_dataset.loc[model_dataset["type"] == "trusted_first_base_" + which + "_throws"].merge(
+            model_dataset.loc[model_dataset["type"] == "trusted_first_base_" + which + "_receives"],
+            on=["game_str", "play_id"],
+            how="left",
+            suffixes=["_throw", "_receive"]
+        )
+
+        this_combined["target"] = target
+        combined.append(this_combined)
+
+    train = pd.concat(combined, ignore_index=True)
+
+    first_base_xyz = np.append(FIRST_BASE_COORDS, 0)
+
+    vect_receive_to_bag = train[["ball_position_x_receive", "ball_position_y_receive", "ball_position_z_receive"]].values - first_base_xyz
+    vect_throw_to_bag = train[["ball_position_x_throw", "ball_position_y_throw", "ball_position_z_throw"]].values - first_base_xyz
+
+    train["dist_from_bag_receive"] = np.sqrt((vect_receive_to_bag ** 2).sum(axis=1))
+    train["dist_from_bag_throw"] = np.sqrt((vect_throw_to_bag ** 2).sum(axis=1))
+
+    # the length of the receive projected onto the throw
+    train["shorten_throw_by"] = np.abs((vect_receive_to_bag * vect_throw_to_bag).sum(axis=1)) / train["dist_from_bag_throw"]
+
+    train["batter_time_to_first_throw"] = train["batter_dist_to_first_throw"] / SPRINT_SPEED_FPS
+    train["throw_time_to_first_throw"] = train["dist_from_bag_throw"] / (train["throw_velo_throw"] * MPH_TO_FPS)
+
+    # only keep receives that are actually around the bag
+    train = train.loc[train["dist_from_bag_receive"] < 15]
+
+    return train.reset_index(drop=True)
+
+
+def _build_one_game(which_game, file_path, which_outs, cache_dir):
+    """
+    The work that gets done for each game, it never raises so one bad game can't kill the whole build
+
+    Returns:
+        (which_game, df of throws and receives or None, the traceback or None, seconds it took)
+
+    """
+    start_time = time.time()
+
+    try:
+        game_obj = Game(which_game, file_path=file_path, which_outs=which_outs, cache_dir=cache_dir)
+
+        return which_game, extract_first_base_throws_and_receives(game_obj), None, time.time() - start_time
+
+    except Exception:
+        return which_game, None, traceback.format_exc(), time.time() - start_time
+
+
+def build_corpus(path="data/", workers=None, games=None, which_outs=["full_seq", "at_first"], cache_dir=None, out_file=None, verbose=True):
+    """
+    Builds the full_computed_dataset.csv table from every game, with the games spread across processes
+
+    Params:
+        path: (str)
+            - where your data lives
+        workers: (int or None)
+            - how many processes to use, None uses all of the cores, 1 does everything in this process
+        games: (list of str or None)
+            - which games to use, defaults to get_all_game_strs(path)
+        cache_dir: (str or None)
+            - passed to each Game, see Game.__init__
+        out_file: (str or None)
+            - if given, the dataset gets written here too
+
+    Returns:
+        the combined dataset, and a dict of game -> traceback for the games that failed
+
+    """
+
+    if games is None:
+        games = get_all_game_strs(path)
+
+    results = {}
+    failed_games = {}
+
+    def collect(which_game, model_rows, error, secs):
+        if error is None:
+            results[which_game] = model_rows
+        else:
+            failed_games[which_game] = error
+
+        if verbose:
+            print("{} {} in {:.1f}s".format(which_game, "done" if error is None else "FAILED", secs))
+
+    if workers == 1:
+        for which_game in games:
+            collect(*_build_one_game(which_game, path, which_outs, cache_dir))
+
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_build_one_game, which_game, path, which_outs, cache_dir) for which_game in games
+            ]
+
+            for future in as_completed(futures):
+                collect(*future.result())
+
+    if verbose and len(failed_games):
+        print("{} of {} games failed: {}".format(len(failed_games), len(games), sorted(failed_games)))
+
+    # concat once at the end, in the same order as games so the output doesn't depend on which process finished first
+    game_results = [results[which_game] for which_game in games if which_game in results]
+    
+    model_dataset = pd.concat(game_results, ignore_index=True) if len(game_results) else pd.DataFrame(columns=COLS_TO_SAVE)
+
+    full_dataset = combine_throws_and_receives(model_dataset)
+
+    if out_file is not None:
+        full_dataset.to_csv(out_file)
+
+    return full_dataset, failed_games
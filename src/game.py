@@ -3,6 +3,8 @@
 import numpy as np
 import pandas as pd
 import os
+import hashlib
+import json
 
 # some mappings to make my life easier
 EVENT_CODE_TO_DESC = {
@@ -56,17 +58,160 @@ GAME_INFO_PLAYER_POSITION_DESC_TO_CODE = {
 
 FIRST_BASE_COORDS = np.array([63.63961031, 63.63961031])
 
+# the dtypes each table gets read in as, to keep the tables small
+# int columns that have missing values are read as float64 (which holds them exactly), see _read_table
+# player_position is int16 because things like ball bounces use 255
+LOAD_DTYPES = {
+    "game_info" : {
+        "game_str" : "category",
+        "home_team" : "category",
+        "away_team" : "category",
+        "at_bat" : "int16",
+        "play_per_game" : "int16",
+        "inning" : "int8",
+        **{col : "int32" for col in GAME_INFO_PLAYER_POSITION_DESC_TO_CODE}
+    },
+    "game_events" : {
+        "game_str" : "category",
+        "play_id" : "int32",
+        "at_bat" : "int16",
+        "play_per_game" : "int16",
+        "timestamp" : "int64",
+        "player_position" : "int16",
+        "event_code" : "int8"
+    },
+    "ball_pos" : {
+        "game_str" : "category",
+        "play_id" : "int32",
+        "timestamp" : "int64",
+        "ball_position_x" : "float32",
+        "ball_position_y" : "float32",
+        "ball_position_z" : "float32"
+    },
+    "player_pos" : {
+        "game_str" : "category",
+        "play_id" : "int32",
+        "timestamp" : "int64",
+        "player_position" : "int16",
+        "field_x" : "float32",
+        "field_y" : "float32"
+    }
+}
+
+# the derived string columns are categories, with the same categories in every game so they can be concat-ed
+EVENT_DTYPE = pd.CategoricalDtype([desc for desc in EVENT_CODE_TO_DESC.values() if desc is not None])
+PLAYER_POSITION_DESC_DTYPE = pd.CategoricalDtype(list(PLAYER_POSITION_CODE_TO_DESC.values()))
+
+# bump this when the prep changes, so old cached games don't get loaded
+CACHE_VERSION = 10
+
+# the fully prepped tables that get written to the cache
+CACHED_FRAMES = [
+    "game_info_df",
+    "game_events_df",
+    "new_ball_pos",
+    "new_player_pos",
+    "timestamp_df",
+    "ts_lag_df",
+    "acquired_dist_df",
+    "play_id_to_per_game_mapper"
+]
+
+# the stages a Game's prep is broken into, and the stages each one needs to have run first
+# a stage runs the first time one of its attributes (see STAGE_ATTRIBUTES) gets looked up, or from Game.precompute
+GAME_STAGES = {
+    "read" : [],
+    "events" : ["read"],
+    "alignment" : ["events"],
+    "player_pos" : ["alignment"],
+    "ball_pos" : ["alignment"],
+    "ball_velos" : ["ball_pos"],
+    "info" : ["events", "player_pos"],
+    "event_features" : ["info", "ball_velos", "player_pos"],
+    # without "at_first" in which_outs this only needs info, see Game._stage_dependencies
+    "outs_at_first" : ["info", "event_features"],
+    "timestamps" : ["event_features", "ball_velos", "player_pos"]
+}
+
+# the attributes each stage finishes, the half done tables in between live in Game._stage_tables
+STAGE_ATTRIBUTES = {
+    "read" : ["play_id_to_per_game_mapper", "pid_to_ppg", "ppg_to_pid"],
+    "events" : [],
+    "alignment" : ["acquired_dist_df", "avg_ball_and_player_dist", "player_pos_df", "ts_lag_df"],
+    "player_pos" : ["new_player_pos", "player_pos_play_index"],
+    "ball_pos" : ["ball_pos_df"],
+    "ball_velos" : ["new_ball_pos", "ball_pos_play_index"],
+    "info" : ["which_half_innings_are_valid"],
+    "event_features" : ["game_events_df", "game_events_play_index"],
+    "outs_at_first" : ["game_info_df"],
+    "timestamps" : ["timestamp_df", "timestamp_play_index"]
+}
+
+# the half done tables each stage uses up, they only get dropped once the stage has finished so a stage that fails can be run again
+STAGE_CONSUMED_TABLES = {
+    "events" : ["game_events"],
+    "alignment" : ["player_pos"],
+    "ball_pos" : ["ball_pos"],
+    "info" : ["game_info"],
+    "event_features" : ["events"]
+}
+
+ATTRIBUTE_TO_STAGE = {attribute : stage for stage, attributes in STAGE_ATTRIBUTES.items() for attribute in attributes}
+
+# plays where a player that acquires the ball is further than this many ft from it get their timestamps realigned
+REALIGN_MIN_DIST_FT = 5
+
+# smoothing="kalman" models each axis of the ball as constant acceleration plus random jerk, see Game._kalman_smooth
+KALMAN_JERK_STD = 1000
+KALMAN_MEASUREMENT_STD_FT = 0.5
+
+# the in glove rows are really where the fielder is, so they get trusted less
+KALMAN_GLOVE_STD_FT = 3
+
+# how unsure the smoother is about the ball's velocity (ft/s) and acceleration (ft/s^2) at the start of a play
+KALMAN_INITIAL_VELO_STD = 150
+KALMAN_INITIAL_ACCEL_STD = 100
+
+# the window of ball data (in ms) used to compute the details of a throw
+THROW_BUFFER_MS = -10
+THROW_SNAPSHOT_MS = 250
+
+# when resampling onto a fixed clock, don't interpolate across gaps in the data longer than this (in ms)
+RESAMPLE_MAX_GAP_MS = 250
+
 
 class Game:
-    def __init__(self, which_game, file_path="data/", debug_mode=False, which_outs=["full_seq", "at_first"]):
+    def __init__(self, which_game, file_path="data/", debug_mode=False, which_outs=["full_seq", "at_first"], cache_dir=None, resample_hz=None, usecols=None, stages=None, smoothing="rolling", lazy=False):
         """
-        When you instantiate a Game object, all of the data gets read, prepped, and cleaned
+        When you instantiate a Game object, all of the data gets read, prepped, and cleaned, 
+        with lazy=True each stage of the prep (see GAME_STAGES) waits until one of the attributes it makes gets looked up
         
         Params:
             which_game: (str)
                 - a string representation of the game, looks like "1902_24_TeamMA_TeamA1"
             file_path: (str)
                 - where your data lives
+            cache_dir: (str or None)
+                - if given, the prepped tables are saved here and loaded back next time, 
+                  the cache is rebuilt if the csvs or which_outs change
+            resample_hz: (int or None)
+                - if given, the ball and player data also get resampled onto a clock with this many ticks a second, 
+                  see resample_to_clock
+            usecols: (dict or None)
+                - table name ("game_info", "game_events", "ball_pos", "player_pos") -> the columns to read, 
+                  tables that aren't in here get all of their columns read, 
+                  the columns the pipeline itself uses (like the fielder ids in game_info) still need to be in here
+            stages: (list of str or None)
+                - only run these stages (and the ones they need) right away, the rest run when they get looked up, 
+                  see precompute, None runs all of them (or none of them with lazy=True), 
+                  with a cache_dir every stage gets run so the whole game can be cached
+            smoothing: (str)
+                - how the ball gets smoothed, "rolling" is a centered 3 sample mean, 
+                  "kalman" is a Kalman filter + RTS smoother that gives the smoothed velos too, see _smooth_ball_position. 
+                  The ball tables aren't the same shape in both modes: "kalman" has no lag_1_smoothed_* or diff_smoothed_* columns 
+                  (its smoothed velos don't come from diffs) and its smoothed_ball_velo_* come right after the smoothed positions
+            lazy: (bool)
+                - don't run any stages (besides the ones in stages) until their attributes get looked up
                 
         """
         # compute a bunch of info to help me later
@@ -80,7 +225,9 @@ class Game:
         self.season = game_string_tokens[0]
         self.game_num = game_string_tokens[1]
         
-        self.ts_lag_df = None
+        self.this_ts_fielders = None
+        self.this_ts_batters = None
+        self.this_ts_ball = None
         
         # Possible TODOs:
         # - runs for each team
@@ -88,172 +235,658 @@ class Game:
         # TODO: I don't know that I will fill this in for each case, but I will for the easy ones
         self.winner = None
         
-        self.which_half_innings_are_valid = {}
+        # the HRs and flyouts the outs solvers look at, see _get_outs_event_sets
+        self.outs_event_sets = None
         
         # which way to compute outs
         self.which_outs = which_outs
         
-        #### read in all my data ###
+        # which way to smooth the ball
+        if smoothing not in ["rolling", "kalman"]:
+            raise ValueError("smoothing has to be \"rolling\" or \"kalman\", not {}".format(smoothing))
         
-        # read in game info
-        self.game_info_df = pd.read_csv(file_path + "game_info/game_info-" + which_game + ".csv", index_col=0)
+        self.smoothing = smoothing
         
-        # read in game events
-        self.game_events_df = pd.read_csv(file_path + "game_events/game_events-" + which_game + ".csv", index_col=0)
+        player_pos_path = file_path + "player_pos/" + self.home_team + "/player_pos-"
+        player_pos_path += self.season + "_" + self.home_team + "/player_pos-" + which_game + ".csv"
         
-        # play per game and play_id are not the same, make a mapper between the two
-        self.play_id_to_per_game_mapper = self.game_events_df[["play_id" , "play_per_game"]].drop_duplicates()
+        self.source_paths = {
+            "game_info" : file_path + "game_info/game_info-" + which_game + ".csv",
+            "game_events" : file_path + "game_events/game_events-" + which_game + ".csv",
+            "ball_pos" : file_path + "ball_pos/ball_pos-" + which_game + ".csv",
+            "player_pos" : player_pos_path
+        }
         
-        # read in ball pos
-        self.ball_pos_df = pd.read_csv(file_path + "ball_pos/ball_pos-" + which_game + ".csv", index_col=0)        
+        self.usecols = usecols if usecols is not None else {}
         
-        # read in play pos
-        player_pos_path = file_path + "player_pos/" + self.home_team + "/player_pos-"
-        player_pos_path += self.season + "_" + self.home_team + "/player_pos-" + which_game + ".csv"
-        self.player_pos_df = pd.read_csv(player_pos_path, index_col=0)
+        self.debug_mode = debug_mode
+        
+        self.cache_path = None
+        
+        # set by resample_to_clock
+        self.resample_hz = None
         
+        # the half done tables that get passed between stages
+        self._stage_tables = {}
+        
+        self.stages_run = set()
         
         if debug_mode:
             # I think I have an infinite recursion somewhere
-            # add this so I can just skip
+            # add this so I can just skip, nothing after reading in the data gets run
+            self._run_stage("read")
+            
+            self.game_info_df = self._stage_tables["game_info"]
+            self.game_events_df = self._stage_tables["game_events"]
+            self.ball_pos_df = self._stage_tables["ball_pos"]
+            self.player_pos_df = self._stage_tables["player_pos"]
             
             return
         
-        #### clean and impute data
-        # add a bunch of fields to events to make my life easier
-        self.game_events_df = self._prep_events_df(self.game_events_df)
+        if cache_dir is not None:
+            self.cache_path, cache_found_by = self._find_cache(cache_dir)
+            
+            if cache_found_by is not None:
+                self._load_from_cache(self.cache_path)
+                
+                # the csvs got touched but didn't change, save their new sizes and times so they don't get hashed next time
+                if cache_found_by == "hash":
+                    self._save_to_cache(self.cache_path)
+                
+            else:
+                self.precompute()
+                self._save_to_cache(self.cache_path)
+        
+        elif lazy:
+            self.precompute(stages if stages is not None else [])
         
-        # self.new_ball_pos = self._compute_velos(self.ball_pos_df, ["play_id"], ["timestamp", "smoothed_ball_position_x", "smoothed_ball_position_y", "smoothed_ball_position_z"])
+        else:
+            self.precompute(stages)
         
-        # check whether we should bother with the timestamp lining up thing (and data rewriting?)
-        self.avg_ball_and_player_dist = self._check_positions_when_acquired(
-            self.game_events_df, 
-            self.player_pos_df, 
-            self.ball_pos_df
+        # the resampled tables are cheap to make from the prepped ones, so they don't get cached
+        if resample_hz is not None:
+            self.resample_to_clock(resample_hz)
+    
+    
+    def __getattr__(self, name):
+        """
+        only gets called when name hasn't been set yet, if one of the stages makes it, run that stage
+        
+        """
+        
+        stage = ATTRIBUTE_TO_STAGE.get(name)
+        
+        # stages_run isn't there yet while unpickling
+        if stage is None or "stages_run" not in self.__dict__ or self.debug_mode or stage in self.stages_run:
+            raise AttributeError("'Game' object has no attribute '{}'".format(name))
+        
+        self._run_stage(stage)
+        
+        return self.__dict__[name]
+    
+    
+    def precompute(self, stages=None):
+        """
+        runs stages now, instead of waiting for one of their attributes to get looked up
+        
+        Params:
+            stages: (str, list of str or None)
+                - names from GAME_STAGES, the stages they need get run too, None runs all of them
+        
+        Returns:
+            the Game, so it can be chained
+        
+        """
+        
+        if stages is None:
+            stages = list(GAME_STAGES)
+        
+        elif isinstance(stages, str):
+            stages = [stages]
+        
+        for stage in stages:
+            self._run_stage(stage)
+        
+        return self
+    
+    
+    def _stage_dependencies(self, stage):
+        """
+        the stages that need to run before stage
+        
+        """
+        
+        # without outs at first to fill in, game_info_df is done once the info is prepped
+        if stage == "outs_at_first" and "at_first" not in self.which_outs:
+            return ["info"]
+        
+        return GAME_STAGES[stage]
+    
+    
+    def _run_stage(self, stage):
+        """
+        runs a stage (and everything it needs) if it hasn't been run yet
+        
+        """
+        
+        if stage not in GAME_STAGES:
+            raise ValueError("{} is not a stage, the stages are {}".format(stage, list(GAME_STAGES)))
+        
+        if stage in self.stages_run:
+            return
+        
+        for needed_stage in self._stage_dependencies(stage):
+            self._run_stage(needed_stage)
+        
+        getattr(self, "_stage_" + stage)()
+        
+        for table in STAGE_CONSUMED_TABLES.get(stage, []):
+            self._stage_tables.pop(table, None)
+        
+        self.stages_run.add(stage)
+    
+    
+    def _stage_read(self):
+        """
+        read in all my data
+        
+        """
+        
+        for which in ["game_info", "game_events", "ball_pos", "player_pos"]:
+            self._stage_tables[which] = self._read_table(which)
+        
+        # play per game and play_id are not the same, make a mapper between the two
+        self.play_id_to_per_game_mapper = self._stage_tables["game_events"][["play_id" , "play_per_game"]].drop_duplicates()
+        self._build_play_mappers()
+    
+    
+    def _stage_events(self):
+        """
+        add a bunch of fields to events to make my life easier
+        
+        """
+        
+        self._stage_tables["events"] = self._prep_events_df(self._stage_tables["game_events"])
+    
+    
+    def _stage_alignment(self):
+        """
+        check whether we should bother with the timestamp lining up thing, and line them up if so
+        
+        """
+        
+        game_events = self._stage_tables["events"]
+        player_pos = self._stage_tables["player_pos"]
+        ball_pos = self._stage_tables["ball_pos"]
+        
+        self.acquired_dist_df = self._check_positions_when_acquired(game_events, player_pos, ball_pos)
+        
+        # the closest the ball gets to the player that acquires it in each play, averaged over the plays
+        self.avg_ball_and_player_dist = self.acquired_dist_df["min_dist"].mean()
+        
+        # only the plays where some acquisition looks off get lined up, the rest are left alone
+        misaligned_plays = self.acquired_dist_df.loc[
+            self.acquired_dist_df["max_dist"] > REALIGN_MIN_DIST_FT, "play_id"
+        ].values
+        
+        if len(misaligned_plays):
+            print("Distance between ball and player is large on {} of {} plays, lining them up"\
+                  .format(len(misaligned_plays), len(self.acquired_dist_df)))
+        
+        # the lags get found for every play (see ts_lag_df), but only the misaligned ones get shifted
+        self.player_pos_df = self._align_ball_and_player_ts(game_events, player_pos, ball_pos, play_ids=misaligned_plays)
+    
+    
+    def _stage_player_pos(self):
+        """
+        compute some velos, descs, etc for the players
+        
+        """
+        
+        # sort by play and timestamp and keep track of where each play lives, 
+        # so play level lookups never have to scan (or leak into) the rest of the game
+        self.new_player_pos, self.player_pos_play_index = self._build_play_index(
+            self._prep_player_pos_df(self.player_pos_df)
         )
+    
+    
+    def _stage_ball_pos(self):
+        """
+        fill the gaps in the ball_pos data and smooth it
         
-        if self.avg_ball_and_player_dist > 5:
-            print("Distance between ball and player is large on average, should maybe clean up {}"\
-                  .format(self.avg_ball_and_player_dist))
-            
-            self.player_pos_df = self._align_ball_and_player_ts(
-                self.game_events_df, 
-                self.player_pos_df, 
-                self.ball_pos_df
-            )
-            
-        # compute some velos, descs, etc
-        self.new_player_pos = self._prep_player_pos_df(self.player_pos_df)   
+        """
         
-        # fill the gaps in the ball_pos data
-        self.ball_pos_df = self._fill_ball_pos_when_acquired(
-            self.game_events_df, 
+        ball_pos = self._fill_ball_pos_when_acquired(
+            self._stage_tables["events"], 
             self.player_pos_df, 
-            self.ball_pos_df)
-
-        # smoothing should go here
-        self.ball_pos_df = self._smooth_ball_position(self.ball_pos_df)
+            self._stage_tables["ball_pos"]
+        )
+        
+        self.ball_pos_df = self._smooth_ball_position(ball_pos)
+    
+    
+    def _stage_ball_velos(self):
+        """
+        compute velocities so I have that for further analysis and plotting
+        
+        """
         
-        # compute velocities so I have that for further analysis and plotting
         # these should get smoothed and the names and times should maybe change the name from new lol
-        self.new_ball_pos = self._compute_velos(
-            self.ball_pos_df, 
-            ["play_id"], 
-            ["timestamp",
-             "ball_position_x", 
-             "ball_position_y", 
-             "ball_position_z",
-             "smoothed_ball_position_x", 
-             "smoothed_ball_position_y", 
-             "smoothed_ball_position_z"
-            ]
-        )
-
+        velo_cols = ["timestamp", "ball_position_x", "ball_position_y", "ball_position_z"]
+        
+        # the kalman smoother already gives the smoothed velos
+        if self.smoothing != "kalman":
+            velo_cols += ["smoothed_ball_position_x", "smoothed_ball_position_y", "smoothed_ball_position_z"]
+        
+        new_ball_pos = self._compute_velos(self.ball_pos_df, ["play_id"], velo_cols)
+        
+        self.new_ball_pos, self.ball_pos_play_index = self._build_play_index(new_ball_pos)
+    
     
-        # fill in the missing players in game_info with player_pos data
-        self.game_info_df = self._prep_info_df(self.game_info_df)
+    def _stage_info(self):
+        """
+        fill in the missing players in game_info with player_pos data, and the full sequence outs
+        
+        """
         
-        # compute features at the event level!
-        # add in angle of throw to first, elevation angle, norminal velo
-        self.game_events_df = self._add_throw_details_to_events(self.game_events_df)
+        # only gets filled in with the full sequence outs
+        self.which_half_innings_are_valid = {}
         
-        # add more features for the thrower, batter, ball at event level
-        self.game_events_df = self._add_player_details_to_events(
-            self.game_events_df,
+        self._stage_tables["info"] = self._prep_info_df(self._stage_tables["game_info"], self._stage_tables["events"])
+    
+    
+    def _stage_event_features(self):
+        """
+        compute features at the event level, the angle of throw to first, elevation angle, norminal velo, 
+        and more features for the thrower, batter, ball
+        
+        """
+        
+        game_events = self._add_throw_details_to_events(self._stage_tables["events"])
+        
+        game_events = self._add_player_details_to_events(
+            game_events,
             self.new_ball_pos, 
             self.new_player_pos,
-            self.game_info_df
+            self._stage_tables["info"]
         )
         
+        # a stable sort, so events with the same timestamp stay in event_code order
+        self.game_events_df, self.game_events_play_index = self._build_play_index(game_events)
+    
+    
+    def _stage_outs_at_first(self):
+        """
+        Need to do this at the end because it relies on throw and player details computed above!
+        
+        """
         
-        ## Need to do this at the end because it relies on throw and player details computed above!
+        game_info = self._stage_tables["info"]
         
         if "at_first" in self.which_outs:
+            game_info = self._fill_outs_at_first(game_info)
         
-            self.game_info_df  = self._fill_outs_at_first(self.game_info_df)
-
+        self.game_info_df = game_info
+    
+    
+    def _stage_timestamps(self):
+        """
+        every timestamp in each play, across the ball, player, and events tables
+        
+        """
         
-        self.timestamp_df = self.collect_all_timestamps(
+        self.timestamp_df, self.timestamp_play_index = self.collect_all_timestamps(
             self.new_ball_pos, 
             self.new_player_pos, 
-            self.game_events_df
+            self.game_events_df, 
+            return_index=True
         )
-
-        
-        self.this_ts_fielders = None
-        self.this_ts_batters = None
-        self.this_ts_ball = None
         
         
     def __repr__(self):
         
+        # printing shouldn't run the stages that haven't been run yet
+        def shape(frame_name):
+            return str(self.__dict__[frame_name].shape) if frame_name in self.__dict__ else "not computed yet"
+        
         game_string = self.which_game + "\n"
-        game_string += "game_info shape: " + str(self.game_info_df.shape) + "\n"
+        game_string += "game_info shape: " + shape("game_info_df") + "\n"
         game_string += "\t\tNumber of invalid half inning"
-        game_string += "game_events shape: " + str(self.game_events_df.shape) + "\n"
-        game_string += "ball_pos shape: " + str(self.ball_pos_df.shape) + "\n"
-        game_string += "player_pos shape: " + str(self.player_pos_df.shape) + "\n"
+        game_string += "game_events shape: " + shape("game_events_df") + "\n"
+        game_string += "ball_pos shape: " + shape("ball_pos_df") + "\n"
+        game_string += "player_pos shape: " + shape("player_pos_df") + "\n"
+        game_string += "stages run: " + ", ".join(stage for stage in GAME_STAGES if stage in self.stages_run) + "\n"
+        
+        game_string += "memory (MB):\n"
+        
+        for frame_name, frame_mb in self.memory_usage_mb().items():
+            game_string += "\t" + frame_name + ": " + "{:.2f}".format(frame_mb) + "\n"
         
         return game_string
     
     
+    def memory_usage_mb(self):
+        """
+        how much memory each of the tables on this game take up, in MB, 
+        only the tables that have been computed so far are in here
+        
+        """
+        
+        all_frames = ["game_info_df", "game_events_df", "ball_pos_df", "player_pos_df", "new_ball_pos", "new_player_pos", "timestamp_df"]
+        
+        return {
+            frame_name : getattr(self, frame_name).memory_usage(deep=True).sum() / 1e6 
+            for frame_name in all_frames if isinstance(self.__dict__.get(frame_name), pd.DataFrame)
+        }
+    
+    
+    def _read_table(self, which):
+        """
+        reads one of the csvs with the dtypes in LOAD_DTYPES, and only the columns in self.usecols[which] if it is there
+        
+        """
+        
+        table_dtypes = LOAD_DTYPES[which]
+        table_usecols = self.usecols.get(which)
+        
+        # ints can't have nans, so those get read in as is and cast after
+        read_dtypes = {col : dtype for col, dtype in table_dtypes.items() if not dtype.startswith("int")}
+        
+        df = pd.read_csv(
+            self.source_paths[which], 
+            index_col=0,
+            dtype=read_dtypes,
+            # the unnamed first column is the index
+            usecols=None if table_usecols is None else (lambda col: col == "" or col.startswith("Unnamed") or col in table_usecols)
+        )
+        
+        for col, dtype in table_dtypes.items():
+            if col not in df.columns or not dtype.startswith("int"):
+                continue
+            
+            # astype wraps values that don't fit (255 -> -1 in an int8), so check first
+            dtype_info = np.iinfo(dtype)
+            col_min, col_max = df[col].min(), df[col].max()
+            
+            if (col_min < dtype_info.min) or (col_max > dtype_info.max):
+                raise ValueError("{} in {} goes from {} to {}, which doesn't fit in {}".format(col, which, col_min, col_max, dtype))
+            
+            # float64 holds every id and timestamp exactly, and keeps the nans
+            if df[col].isnull().any():
+                df[col] = df[col].astype("float64")
+            else:
+                df[col] = df[col].astype(dtype)
+        
+        return df
+    
+    
+    def _cache_prefix(self):
+        """
+        every cache file for this game, which_outs, smoothing and usecols starts with this, 
+        so the only other files with it are ones from older csvs or an older CACHE_VERSION
+        
+        """
+        
+        config = json.dumps([sorted(self.which_outs), self.smoothing, sorted((which, sorted(cols)) for which, cols in self.usecols.items())])
+        
+        return self.which_game + "-" + hashlib.sha1(config.encode()).hexdigest()[:8] + "-"
+    
+    
+    def _cache_key(self):
+        """
+        a hash of the source csvs and the cache version, so stale caches never get loaded
+        
+        """
+        
+        hasher = hashlib.sha1()
+        hasher.update((str(CACHE_VERSION) + self.which_game).encode())
+        
+        for which in ["game_info", "game_events", "ball_pos", "player_pos"]:
+            with open(self.source_paths[which], "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    hasher.update(chunk)
+        
+        return hasher.hexdigest()[:16]
+    
+    
+    def _source_stats(self):
+        """
+        the size and modified time of each source csv, if these match the cache's the csvs don't get hashed again
+        
+        """
+        
+        source_stats = []
+        
+        for which in ["game_info", "game_events", "ball_pos", "player_pos"]:
+            stat = os.stat(self.source_paths[which])
+            source_stats.append([stat.st_size, stat.st_mtime_ns])
+        
+        return source_stats
+    
+    
+    def _find_cache(self, cache_dir):
+        """
+        looks for this game's cache file, first by the csvs' sizes and modified times, 
+        then by hashing the csvs (see _cache_key) if those changed
+        
+        Returns:
+            the path to the cache file, and how it was found ("stats", "hash", or None if it needs to be made)
+        
+        """
+        
+        source_stats = self._source_stats()
+        
+        if os.path.isdir(cache_dir):
+            for file in os.listdir(cache_dir):
+                if not file.startswith(self._cache_prefix()) or not file.endswith(".npz") or file.endswith(".tmp.npz"):
+                    continue
+                
+                meta = self._read_cache_meta(os.path.join(cache_dir, file))
+                
+                if meta.get("cache_version") == CACHE_VERSION and meta.get("source_stats") == source_stats:
+                    return os.path.join(cache_dir, file), "stats"
+        
+        cache_path = os.path.join(cache_dir, self._cache_prefix() + self._cache_key() + ".npz")
+        
+        return cache_path, ("hash" if os.path.exists(cache_path) else None)
+    
+    
+    @staticmethod
+    def _read_cache_meta(cache_path):
+        """
+        just the meta data of a cache file, an empty dict if it can't be read
+        
+        """
+        
+        try:
+            with np.load(cache_path) as cached:
+                return json.loads(str(cached["__meta__"]))
+        
+        except (OSError, ValueError, KeyError):
+            return {}
+    
+    
+    def _save_to_cache(self, cache_path):
+        """
+        write the prepped tables to a single .npz file, one array per column
+        
+        anything else with the same _cache_prefix in the cache dir is from older csvs or an older CACHE_VERSION, so clean it up
+        
+        """
+        
+        cache_dir = os.path.dirname(cache_path) or "."
+        os.makedirs(cache_dir, exist_ok=True)
+        
+        arrays = {}
+        meta = {
+            "cache_version" : CACHE_VERSION,
+            "source_stats" : self._source_stats(),
+            "frames" : {},
+            "which_half_innings_are_valid" : self.which_half_innings_are_valid,
+            "winner" : self.winner,
+            "avg_ball_and_player_dist" : float(self.avg_ball_and_player_dist),
+            "ball_pos_cols" : list(self.ball_pos_df.columns),
+            "player_pos_cols" : list(self.player_pos_df.columns),
+        }
+        
+        for frame_name in CACHED_FRAMES:
+            df = getattr(self, frame_name)
+            
+            if df is None:
+                continue
+            
+            meta["frames"][frame_name] = {
+                "columns" : [str(col) for col in df.columns],
+                "dtypes" : [str(dtype) for dtype in df.dtypes],
+                # categories get saved as their codes, so they need their categories to come back the same
+                "categories" : {
+                    str(ii) : df[col].cat.categories.tolist() for ii, col in enumerate(df.columns) if isinstance(df[col].dtype, pd.CategoricalDtype)
+                },
+                # object columns (a few small ones, like top_bottom_inning) go in the meta, so loading never has to unpickle
+                "objects" : {
+                    str(ii) : df[col].tolist() for ii, col in enumerate(df.columns) if df[col].dtype == object
+                }
+            }
+            
+            arrays[frame_name + "::__index__"] = df.index.to_numpy()
+            
+            for ii, col in enumerate(df.columns):
+                if isinstance(df[col].dtype, pd.CategoricalDtype):
+                    arrays[frame_name + "::" + str(ii)] = df[col].cat.codes.to_numpy()
+                elif df[col].dtype != object:
+                    arrays[frame_name + "::" + str(ii)] = df[col].to_numpy()
+        
+        # the raw tables are the new ones' columns in their own row order, 
+        # save where each of their rows ended up after _build_play_index's sort so they come back the same
+        for raw_name in ["ball_pos_df", "player_pos_df"]:
+            raw_df = getattr(self, raw_name)
+            
+            arrays[raw_name + "::__order__"] = raw_df[["play_id", "timestamp"]].reset_index(drop=True).sort_values(
+                ["play_id", "timestamp"], kind="mergesort"
+            ).index.to_numpy()
+            arrays[raw_name + "::__index__"] = raw_df.index.to_numpy()
+        
+        # numpy ints and floats can end up in the object columns
+        arrays["__meta__"] = np.array(json.dumps(meta, default=lambda value: value.item()))
+        
+        # write then rename, so a half written file never looks like a valid cache
+        temp_path = cache_path + ".tmp.npz"
+        np.savez(temp_path, **arrays)
+        os.replace(temp_path, cache_path)
+        
+        for file in os.listdir(cache_dir):
+            if file.startswith(self._cache_prefix()) and file.endswith(".npz") and not file.endswith(".tmp.npz") and \
+                os.path.join(cache_dir, file) != cache_path:
+                os.remove(os.path.join(cache_dir, file))
+    
+    
+    def _load_from_cache(self, cache_path):
+        """
+        read the prepped tables back from _save_to_cache
+        
+        """
+        
+        with np.load(cache_path) as cached:
+            meta = json.loads(str(cached["__meta__"]))
+            
+            for frame_name in CACHED_FRAMES:
+                if frame_name not in meta["frames"]:
+                    setattr(self, frame_name, None)
+                    continue
+                
+                frame_meta = meta["frames"][frame_name]
+                
+                df = pd.DataFrame(
+                    {
+                        col : (
+                            pd.Series(frame_meta["objects"][str(ii)], dtype=object).values if str(ii) in frame_meta["objects"] 
+                            else cached[frame_name + "::" + str(ii)]
+                        )
+                        for ii, col in enumerate(frame_meta["columns"])
+                    }, 
+                    index=cached[frame_name + "::__index__"]
+                )
+                
+                # put back the dtypes numpy doesn't know about (like categories)
+                for ii, (col, dtype) in enumerate(zip(frame_meta["columns"], frame_meta["dtypes"])):
+                    if str(ii) in frame_meta["objects"]:
+                        continue
+                    elif str(ii) in frame_meta["categories"]:
+                        df[col] = pd.Categorical.from_codes(df[col].values, frame_meta["categories"][str(ii)])
+                    elif str(df[col].dtype) != dtype:
+                        df[col] = df[col].astype(dtype)
+                
+                setattr(self, frame_name, df)
+            
+            # the raw tables are just a subset of the columns of the new ones, put back in their own order
+            for raw_name, new_name in [("ball_pos_df", "new_ball_pos"), ("player_pos_df", "new_player_pos")]:
+                sort_order = cached[raw_name + "::__order__"]
+                
+                raw_rows = np.empty_like(sort_order)
+                raw_rows[sort_order] = np.arange(len(sort_order))
+                
+                raw_df = getattr(self, new_name)[meta[raw_name.replace("_df", "_cols")]].iloc[raw_rows]
+                raw_df.index = cached[raw_name + "::__index__"]
+                
+                setattr(self, raw_name, raw_df)
+        
+        self.which_half_innings_are_valid = meta["which_half_innings_are_valid"]
+        self.winner = meta["winner"]
+        self.avg_ball_and_player_dist = meta["avg_ball_and_player_dist"]
+        
+        _, self.ball_pos_play_index = self._build_play_index(self.new_ball_pos)
+        _, self.player_pos_play_index = self._build_play_index(self.new_player_pos)
+        
+        self._build_play_mappers()
+        self._build_play_indexes()
+        
+        self.stages_run = set(GAME_STAGES)
+    
+    
     def _check_positions_when_acquired(self, game_events, player_pos, ball_pos):
         """
         This will let me know whether I need to write that function to correct the ts, I think I won't mostly
+        
+        each time the ball is acquired gets paired with where that player and the ball are at that exact timestamp of that play
+        
+        Returns:
+            a df with a row for each play_id, the number of acquisitions that could be paired up, and the min, median, and max
+            distance between the ball and the player that acquired it
 
         """
         # events when the ball is acquired by not the catcher, gets rid of pitches
-        ball_acq_ts = game_events.loc[
+        ball_acq = game_events.loc[
             (game_events["event"] == "ball acquired") & 
             (game_events["player_position"] != 2)
             ,
             ["play_id", "timestamp", "player_position"]
         ]
 
-        # where the ball is when it is acquired
-        ball_pos_when_acquired = ball_pos.loc[
-            ball_pos["timestamp"].isin(ball_acq_ts.timestamp.values), 
-            ["play_id", "ball_position_x", "ball_position_y"]
-        ]
-
-        # merge them so we can compute the dist
-        merged_pos_df = player_pos.loc[
-            (player_pos["timestamp"].isin(ball_acq_ts.timestamp.values)) &
-            (player_pos["player_position"].isin(ball_acq_ts.player_position.values)),
-            ["play_id", "field_x", "field_y"]
-        ].merge(ball_pos_when_acquired, how="left", on="play_id")
+        # where the player that acquired the ball and the ball are right then
+        acq_pos = ball_acq.merge(
+            player_pos[["play_id", "timestamp", "player_position", "field_x", "field_y"]], 
+            how="inner", 
+            on=["play_id", "timestamp", "player_position"]
+        ).merge(
+            ball_pos[["play_id", "timestamp", "ball_position_x", "ball_position_y"]], 
+            how="inner", 
+            on=["play_id", "timestamp"]
+        )
 
-        merged_pos_df["dist"] = merged_pos_df.apply(
-            lambda row: 
-            np.sqrt((row["field_x"] - row["ball_position_x"]) ** 2 + 
-                    (row["field_y"] - row["ball_position_y"]) ** 2),
-            axis = 1 
+        acq_pos["dist"] = np.hypot(
+            acq_pos["field_x"] - acq_pos["ball_position_x"], 
+            acq_pos["field_y"] - acq_pos["ball_position_y"]
         )
 
-        return merged_pos_df.groupby("play_id")["dist"].min().mean()
+        return acq_pos.groupby("play_id")["dist"].agg(
+            n_acquired="count", 
+            min_dist="min", 
+            median_dist="median", 
+            max_dist="max"
+        ).reset_index()
     
     
-    def _align_ball_and_player_ts(self, game_events, player_pos, ball_pos, margin=3):
+    def _align_ball_and_player_ts(self, game_events, player_pos, ball_pos, margin=3, play_ids=None):
         """
         There are many instances where it seems like the ball and player are lagged in someway
         
@@ -265,10 +898,15 @@ class Game:
              how far we allow the ball to be away from the player and still say acquired in feet
              3 is roughly an arms length, could do better with limb data
         
+        play_ids (array or None) defaults to None
+             the lag is computed for every play, but only these plays get shifted, None shifts all of them
+        
+        the lags end up in self.ts_lag_df, with a row for every play: 
+            found_offset is the lag that was found (nan if there wasn't one), 
+            time_offset is how much the play was actually shifted by (0 if it wasn't), and shifted
+        
         """
-        game_events = game_events.copy()
         player_pos = player_pos.copy()
-        ball_pos = ball_pos.copy()
         
         # get all of the players and times when the ball was acquired
         ball_acq_event = game_events.loc[
@@ -302,63 +940,66 @@ class Game:
         # I think the raw min won't work because you could reach for the ball and 
         # then run over to where you picked it so have a margin and pick the first
         # time you get close enough
-        when_within_margin = combined_acq[
-            combined_acq["delta_dist"] < margin
-        ].groupby(["play_id", "player_position"]).min("delta_dist")
         
-        when_within_margin["time_offset"] = (when_within_margin["timestamp"] - when_within_margin["timestamp_ball_acq"])
+        # pick a looser margin (2x) for the plays that never get within the margin
+        # so we at least have coverage, both get computed in this one pass
+        combined_acq = combined_acq.loc[
+            combined_acq["delta_dist"] < (2 * margin), 
+            ["play_id", "player_position", "timestamp", "timestamp_ball_acq", "delta_dist"]
+        ]
+        
+        is_within_margin = combined_acq["delta_dist"] < margin
+        
+        combined_acq["timestamp_within"] = combined_acq["timestamp"].where(is_within_margin)
+        combined_acq["timestamp_ball_acq_within"] = combined_acq["timestamp_ball_acq"].where(is_within_margin)
+        
+        acq_by_player = combined_acq.groupby(["play_id", "player_position"])[
+            ["timestamp", "timestamp_ball_acq", "timestamp_within", "timestamp_ball_acq_within"]
+        ].min()
+        
+        acq_by_player["time_offset_within"] = acq_by_player["timestamp_within"] - acq_by_player["timestamp_ball_acq_within"]
+        acq_by_player["time_offset_not_within"] = acq_by_player["timestamp"] - acq_by_player["timestamp_ball_acq"]
         
         # self.ts_lag_df = when_within_margin
         # this step picks corrects for the case where the first acquiring player
         # doesn't have to move (and thus is already in the correct spot too early)
-        when_within_margin =  when_within_margin.loc[
-            when_within_margin.groupby("play_id")["time_offset"].idxmax()
-        ]
- 
-        plays_within_margin = when_within_margin.reset_index()["play_id"].unique()
-
-        # pick a looser margin for the other ones that don't work
-        # so we at least have coverage
-        plays_that_not_within_margin = set(combined_acq["play_id"].unique()) - \
-            set(plays_within_margin)
-
-        not_within_margin = combined_acq.loc[
-            (combined_acq["play_id"].isin(plays_that_not_within_margin)) &
-            (combined_acq["delta_dist"] < (2 * margin))
-        ].groupby(["play_id", "player_position"]).min()
+        when_within_margin = acq_by_player.loc[
+            acq_by_player["time_offset_within"].notnull()
+        ].groupby("play_id")["time_offset_within"].max()
         
-        not_within_margin["time_offset"] = (not_within_margin["timestamp"] - not_within_margin["timestamp_ball_acq"])
-
-        not_within_margin =  not_within_margin.loc[
-            not_within_margin.groupby("play_id")["time_offset"].idxmax()
-        ]
+        not_within_margin = acq_by_player.loc[
+            ~acq_by_player.index.get_level_values("play_id").isin(when_within_margin.index)
+        ].groupby("play_id")["time_offset_not_within"].max()
         
-        all_plays = pd.concat([not_within_margin, when_within_margin]).sort_values("play_id")        
+        all_plays = pd.concat([not_within_margin, when_within_margin]).sort_index()
             
         # we already computed the lags needed for each play to line up the ball with the player + margin
-        ts_lag_df = all_plays.reset_index()[["play_id", "time_offset"]]
+        ts_lag_df = pd.DataFrame({"play_id" : np.unique(player_pos["play_id"].values)})
+        ts_lag_df["found_offset"] = ts_lag_df["play_id"].map(all_plays)
+        
+        # which TS to anchor to? ball makes the gif work, but ruins the events on screen
+        # its minus if merging with player pos, addition if ball
+        
+        # only use the positive lags, because the others are probs 
+        # just the ball getting to the front of someone
+        ts_lag_df["shifted"] = ts_lag_df["found_offset"] > 0
+        
+        if play_ids is not None:
+            ts_lag_df["shifted"] = ts_lag_df["shifted"] & ts_lag_df["play_id"].isin(play_ids)
+        
+        ts_lag_df["time_offset"] = ts_lag_df["found_offset"].where(ts_lag_df["shifted"], 0).astype(player_pos["timestamp"].dtype)
 
         # put this into a df, so I can inspect later
         self.ts_lag_df = ts_lag_df
 
         player_pos["old_ts"] = player_pos["timestamp"]
-
-        # which TS to anchor to? ball makes the gif work, but ruins the events on screen
-        # its minus if merging with player pos, addition if ball
         
-        # merge only the positive, because the others are probs 
-        # just the ball getting to the front of someone
-        new_player_pos = player_pos.merge(ts_lag_df[ts_lag_df > 0], 
-                               how = "left", 
-                               left_on="play_id",
-                               right_on="play_id"
+        new_player_pos = player_pos.reset_index(drop=True)
+        new_player_pos["time_offset"] = new_player_pos["play_id"].map(
+            pd.Series(ts_lag_df["time_offset"].values, index=ts_lag_df["play_id"].values)
         )
         
-        new_player_pos["timestamp"] = new_player_pos.apply(
-            lambda row:                                           
-            row["old_ts"] - (row["time_offset"] if pd.notnull(row["time_offset"]) else 0),
-            axis=1
-        )
+        new_player_pos["timestamp"] = (new_player_pos["old_ts"] - new_player_pos["time_offset"]).astype(new_player_pos["old_ts"].dtype)
 
         return new_player_pos
 
@@ -367,54 +1008,83 @@ class Game:
         """
         This is making an assumption that (1) the ball data is missing when a ball is acquired and (2) that the fielder's position
         is the best proxy for where the ball is when it is missing (we can't see limbs!)
+        
+        Each window is found with a searchsorted on that player's sorted timestamps, 
+        and all of the new ball rows get added at once
 
         """
-        game_events = game_events.copy()
-        player_pos = player_pos.copy()
         ball_pos = ball_pos.copy()
 
         # get the windows in the game where a ball is in someone's glove or hand
         ball_acquired_windows = game_events.loc[
             (game_events["event_code"] == 2) & 
-            (game_events["next_event_code"] != 5)
+            (game_events["next_event_code"] != 5) &
+            (game_events["next_event_ts"].notnull())
             ,
-            :
+            ["player_position", "timestamp", "next_event_ts"]
         ]
-
-        for player, this_ts, next_ts in zip(ball_acquired_windows["player_position"], ball_acquired_windows["timestamp"],\
-                                            ball_acquired_windows["next_event_ts"]):
-
-            play_pos_during_window = player_pos.loc[
-                (player_pos["player_position"] == player) & 
-                (player_pos["timestamp"] > this_ts) & 
-                (player_pos["timestamp"] < next_ts),
-                :
-            ]
-
-            # I might mess with this assumption later -- you could jump and be scooping or whatever here
-            play_pos_during_window["ball_position_z"] = 5
-
-            play_pos_during_window = play_pos_during_window.loc[
-                :, 
-                ["game_str",
-                 "play_id", 
-                 "timestamp",
-                 "field_x",
-                 "field_y",
-                 "ball_position_z"]
-            ]
+        
+        # sort by player then time, so each player's timestamps are one sorted block
+        player_pos = player_pos.sort_values(["player_position", "timestamp"], kind="mergesort")
+        
+        player_positions = player_pos["player_position"].values
+        player_ts = player_pos["timestamp"].values
+        
+        window_players = ball_acquired_windows["player_position"].values
+        
+        # the rows of player_pos strictly inside each window
+        start = np.zeros(ball_acquired_windows.shape[0], dtype=int)
+        stop = np.zeros(ball_acquired_windows.shape[0], dtype=int)
+        
+        for player in np.unique(window_players):
+            is_this_player = window_players == player
             
-            play_pos_during_window.columns = [
-                "game_str", 
-                "play_id", 
-                "timestamp", 
-                "ball_position_x", 
-                "ball_position_y", 
-                "ball_position_z"
-            ]
+            player_start = np.searchsorted(player_positions, player, side="left")
+            player_stop = np.searchsorted(player_positions, player, side="right")
+            
+            this_player_ts = player_ts[player_start:player_stop]
+            
+            start[is_this_player] = player_start + np.searchsorted(
+                this_player_ts, ball_acquired_windows["timestamp"].values[is_this_player], side="right"
+            )
+            stop[is_this_player] = player_start + np.searchsorted(
+                this_player_ts, ball_acquired_windows["next_event_ts"].values[is_this_player], side="left"
+            )
+        
+        window_lengths = np.maximum(stop - start, 0)
+        
+        # turn the (start, stop) of every window into one array of row numbers, in window order
+        window_offsets = np.cumsum(window_lengths) - window_lengths
+        rows_in_windows = np.repeat(start, window_lengths) + \
+            (np.arange(window_lengths.sum()) - np.repeat(window_offsets, window_lengths))
 
-            ball_pos = pd.concat([ball_pos, play_pos_during_window])
+        play_pos_during_windows = player_pos.iloc[rows_in_windows].loc[
+            :, 
+            ["game_str",
+             "play_id", 
+             "timestamp",
+             "field_x",
+             "field_y"]
+        ]
+        
+        # I might mess with this assumption later -- you could jump and be scooping or whatever here
+        play_pos_during_windows["ball_position_z"] = 5
+        
+        # so the smoother knows which rows aren't really the ball
+        play_pos_during_windows["ball_in_glove"] = True
+        ball_pos["ball_in_glove"] = False
+
+        play_pos_during_windows.columns = [
+            "game_str", 
+            "play_id", 
+            "timestamp", 
+            "ball_position_x", 
+            "ball_position_y", 
+            "ball_position_z",
+            "ball_in_glove"
+        ]
 
+        ball_pos = pd.concat([ball_pos, play_pos_during_windows])
 
         ball_pos.sort_values(["play_id", "timestamp"], inplace=True)
 
@@ -430,7 +1100,7 @@ class Game:
         """
         
         player_pos = self.player_pos_df.copy()
-        player_pos["player_position_desc"] = player_pos["player_position"].map(PLAYER_POSITION_CODE_TO_DESC)
+        player_pos["player_position_desc"] = player_pos["player_position"].map(PLAYER_POSITION_CODE_TO_DESC).astype(PLAYER_POSITION_DESC_DTYPE)
         
         player_pos = self._compute_velos(
             player_pos, 
@@ -441,10 +1111,12 @@ class Game:
         return player_pos
     
     
-    def _prep_info_df(self, game_info_df):
+    def _prep_info_df(self, game_info_df, game_events_df=None):
         """
         A utility for adding relevant fields to game info table, like at_bat and outs, etc.
         
+        game_events_df is passed along to impute_outs
+        
         """
         
         game_info = game_info_df.copy()
@@ -453,7 +1125,7 @@ class Game:
 
 
         # the number of baserunners on a given play
-        game_info["n_br"] = game_info[["first_baserunner", "second_baserunner", "third_baserunner"]].apply(lambda row: sum(row.apply(lambda x: 0 if x == 0 else 1)), axis=1)
+        game_info["n_br"] = (game_info[["first_baserunner", "second_baserunner", "third_baserunner"]] != 0).sum(axis=1)
 
         # placeholder columns that will get filled in
         game_info["prev_outs"] = np.nan
@@ -482,7 +1154,7 @@ class Game:
     
     
             # TODO: maybe do something with which_innings_are_valid
-            game_info, self.which_half_innings_are_valid = self.impute_outs(game_info)
+            game_info, self.which_half_innings_are_valid = self.impute_outs(game_info, game_events_df=game_events_df)
 
             game_info = self._fill_whether_to_trust_half_inning(game_info)
                 
@@ -500,17 +1172,15 @@ class Game:
         """
         game_info = game_info.copy()
         
-        cols = ["play_id", "player_position_desc"]
-
-        which_brs_present_which_play = self.new_player_pos.loc[
-            self.new_player_pos["player_position"].isin([10, 11, 12, 13])
-        ].groupby(cols).size().unstack(fill_value=0)
+        runner_positions = [10, 11, 12, 13]
         
-        which_brs_present_which_play = which_brs_present_which_play.apply(
-            lambda row: 
-            row.apply(lambda x: x if x == 0 else 1)
-            , axis=1
-        )
+        runners = player_pos.loc[player_pos["player_position"].isin(runner_positions), ["play_id", "player_position"]]
+        
+        # 1 if the batter/runner shows up in the player_pos data for the play at all
+        which_brs_present_which_play = (pd.crosstab(runners["play_id"], runners["player_position"]) > 0)\
+            .reindex(columns=runner_positions, fill_value=False)\
+            .astype(np.int64)\
+            .rename(columns=PLAYER_POSITION_CODE_TO_DESC)
 
         # do the mapping between play per game and play id here
         which_brs_present_which_play = which_brs_present_which_play.merge(
@@ -527,48 +1197,24 @@ class Game:
 
         # TODO: fill in when batters are 0?
         # I think the first thing is the 0 batter fill in, then then the br thing
-
-        # make a col assuming these two sources agree
-        filled_info["player_pos_and_info_agree"] = 1
         
-        # make a flag for when they don't agree
-        filled_info.loc[
-            ((filled_info["first_baserunner"] > 0) ^ (filled_info["Runner 1st"] > 0)) |
-            ((filled_info["second_baserunner"] > 0) ^ (filled_info["Runner 2nd"] > 0)) |
-            ((filled_info["third_baserunner"] > 0) ^ (filled_info["Runner 3rd"] > 0))
-            ,
-            "player_pos_and_info_agree"
-        ] = 0
+        info_cols = ["first_baserunner", "second_baserunner", "third_baserunner"]
         
+        info_has_runner = filled_info[info_cols].values > 0
+        player_pos_has_runner = filled_info[["Runner 1st", "Runner 2nd", "Runner 3rd"]].values > 0
+        
+        # the plays where the two sources don't agree on some base
+        disagree = (info_has_runner ^ player_pos_has_runner).any(axis=1)
+
+        # make a flag for when they don't agree
+        filled_info["player_pos_and_info_agree"] = np.where(disagree, 0, 1)
         
         # track that something is fishy with this play
-        filled_info.loc[
-            ((filled_info["first_baserunner"] > 0) ^ (filled_info["Runner 1st"] > 0)) |
-            ((filled_info["second_baserunner"] > 0) ^ (filled_info["Runner 2nd"] > 0)) |
-            ((filled_info["third_baserunner"] > 0) ^ (filled_info["Runner 3rd"] > 0))
-            ,
-            "trust_this_play"
-        ] = 0
+        filled_info.loc[disagree, "trust_this_play"] = 0
 
         ## ASSUMPTION: the player_pos data is generally more accurate?
         ## just fill in a 1 where there is a 0 in game info
-        filled_info.loc[
-            ((filled_info["first_baserunner"] == 0) &
-             (filled_info["Runner 1st"] > 0))
-            , "first_baserunner"
-        ] = 1
-        
-        filled_info.loc[
-            ((filled_info["second_baserunner"] == 0) &
-             (filled_info["Runner 2nd"] > 0))
-            , "second_baserunner"
-        ] = 1
-        
-        filled_info.loc[
-            ((filled_info["third_baserunner"] == 0) &
-             (filled_info["Runner 3rd"] > 0))
-            , "third_baserunner"
-        ] = 1
+        filled_info[info_cols] = filled_info[info_cols].mask((filled_info[info_cols].values == 0) & player_pos_has_runner, 1)
         
         return filled_info
     
@@ -617,7 +1263,7 @@ class Game:
         game_events = game_events.sort_values(["timestamp", "event_code"], ascending=[True, True])
 
         
-        game_events["event"] = game_events["event_code"].map(lambda x: EVENT_CODE_TO_DESC[x])
+        game_events["event"] = game_events["event_code"].map(lambda x: EVENT_CODE_TO_DESC[x]).astype(EVENT_DTYPE)
         
         game_events["next_event_code"] =  game_events.groupby("play_per_game")["event_code"].shift(-1)
         game_events["next_event"] =  game_events.groupby("play_per_game")["event"].shift(-1)
@@ -642,114 +1288,538 @@ class Game:
         
         See exploration in SmoothingAnalysis notebook
         
+        self.smoothing picks how, "rolling" is a centered 3 sample mean, 
+        "kalman" is _kalman_smooth, which also fills in smoothed_ball_velo_x/y/z (in ft/s)
+        
+        """
+        
+        # the easiest would be like a moving average 
+        # with more effort, could do a Kalman filter?
+        
+        # I am not actually sure I need this
+        
+        smoothed_pos_df = df.copy()
+        
+        if self.smoothing == "rolling":
+            smoothed_xy = df.groupby("play_id")[["timestamp", "ball_position_x", "ball_position_y", "ball_position_z"]]\
+                .rolling(3, center=True, closed="both").mean()
+            
+            smoothed_pos_df["smoothed_ball_position_x"] = smoothed_xy["ball_position_x"].values
+            smoothed_pos_df["smoothed_ball_position_y"] = smoothed_xy["ball_position_y"].values
+            smoothed_pos_df["smoothed_ball_position_z"] = smoothed_xy["ball_position_z"].values
+        
+        else:
+            # the smoother needs each play's rows in time order
+            smoothed_pos_df = smoothed_pos_df.sort_values(["play_id", "timestamp"], kind="mergesort")
+            
+            measurement_std = np.where(smoothed_pos_df["ball_in_glove"].values, KALMAN_GLOVE_STD_FT, KALMAN_MEASUREMENT_STD_FT)
+            
+            smoothed_xyz, smoothed_velo_xyz = self._kalman_smooth(
+                smoothed_pos_df["play_id"].values, 
+                smoothed_pos_df["timestamp"].values, 
+                smoothed_pos_df[["ball_position_x", "ball_position_y", "ball_position_z"]].values.astype(float), 
+                measurement_std
+            )
+            
+            for ii, axis in enumerate(["x", "y", "z"]):
+                smoothed_pos_df["smoothed_ball_position_" + axis] = smoothed_xyz[:, ii]
+            
+            for ii, axis in enumerate(["x", "y", "z"]):
+                smoothed_pos_df["smoothed_ball_velo_" + axis] = smoothed_velo_xyz[:, ii]
+        
+        return smoothed_pos_df
+    
+    
+    def _kalman_smooth(self, play_ids, timestamps, positions, measurement_std):
+        """
+        A constant acceleration Kalman filter and Rauch-Tung-Striebel smoother, run on every play at once
+        
+        The rows have to be sorted by play and then timestamp. The steps between rows can be any length (even 0), 
+        and rows with a nan position just get predicted through
+        
+        Each axis has the state (position, velo, accel), and they all share the same time steps and measurement noise, 
+        so the covariances are the same for every axis and only get computed once. 
+        The loop is over the step within the play, each step does that step of every play at once
+        
+        Params:
+            play_ids: (np.array)
+            timestamps: (np.array)
+                - in ms
+            positions: (np.array)
+                - n x 3 of the x, y, z, in ft
+            measurement_std: (np.array)
+                - how far off (in ft) each row could be
+        
+        Returns:
+            the smoothed positions (n x 3, ft) and velos (n x 3, ft/s)
+        
+        """
+        n_rows = len(play_ids)
+        
+        is_play_start = np.r_[True, play_ids[1:] != play_ids[:-1]] if n_rows else np.zeros(0, dtype=bool)
+        play_starts = np.flatnonzero(is_play_start)
+        
+        # which step of its play each row is, and the rows grouped by step
+        step_in_play = np.arange(n_rows) - np.repeat(play_starts, np.diff(np.r_[play_starts, n_rows]))
+        rows_by_step = np.argsort(step_in_play, kind="stable")
+        step_bounds = np.searchsorted(step_in_play[rows_by_step], np.arange(step_in_play.max(initial=-1) + 2))
+        
+        dt = np.r_[0, np.diff(timestamps.astype(float))] / 1000
+        dt[is_play_start] = 0
+        
+        has_measurement = ~np.isnan(positions).any(axis=1)
+        measurement_var = measurement_std.astype(float) ** 2
+        
+        def transition(dt):
+            # x_next = F x, Q is the noise from a random jerk over dt
+            F = np.zeros((len(dt), 3, 3))
+            F[:, 0, 0] = F[:, 1, 1] = F[:, 2, 2] = 1
+            F[:, 0, 1] = F[:, 1, 2] = dt
+            F[:, 0, 2] = dt ** 2 / 2
+            
+            Q = KALMAN_JERK_STD ** 2 * np.stack([
+                np.stack([dt ** 5 / 20, dt ** 4 / 8, dt ** 3 / 6], axis=-1),
+                np.stack([dt ** 4 / 8, dt ** 3 / 3, dt ** 2 / 2], axis=-1),
+                np.stack([dt ** 3 / 6, dt ** 2 / 2, dt], axis=-1)
+            ], axis=1)
+            
+            return F, Q
+        
+        # row, axis, (position, velo, accel)
+        predicted_state = np.zeros((n_rows, 3, 3))
+        filtered_state = np.zeros((n_rows, 3, 3))
+        
+        # row, (position, velo, accel), (position, velo, accel)
+        predicted_cov = np.zeros((n_rows, 3, 3))
+        filtered_cov = np.zeros((n_rows, 3, 3))
+        
+        ## the forward pass, the filter
+        for step in range(len(step_bounds) - 1):
+            rows = rows_by_step[step_bounds[step]:step_bounds[step + 1]]
+            
+            if step == 0:
+                # the prior for each play, the position is basically unknown until the first measurement
+                predicted_cov[rows] = np.diag([1e6, KALMAN_INITIAL_VELO_STD ** 2, KALMAN_INITIAL_ACCEL_STD ** 2])
+            
+            else:
+                F, Q = transition(dt[rows])
+                
+                predicted_state[rows] = np.einsum("rij,raj->rai", F, filtered_state[rows - 1])
+                predicted_cov[rows] = F @ filtered_cov[rows - 1] @ F.transpose(0, 2, 1) + Q
+            
+            # the measurement update, only the position is measured
+            innovation_var = predicted_cov[rows, 0, 0] + measurement_var[rows]
+            gain = np.where(has_measurement[rows, None], predicted_cov[rows, :, 0] / innovation_var[:, None], 0)
+            
+            innovation = np.nan_to_num(positions[rows] - predicted_state[rows, :, 0])
+            
+            filtered_state[rows] = predicted_state[rows] + gain[:, None, :] * innovation[:, :, None]
+            filtered_cov[rows] = predicted_cov[rows] - gain[:, :, None] * predicted_cov[rows, 0, :][:, None, :]
+        
+        ## the backward pass, the smoother, the last row of each play is already as smooth as it gets
+        smoothed_state = filtered_state.copy()
+        
+        for step in range(len(step_bounds) - 3, -1, -1):
+            # the rows of this step that aren't the last of their play
+            rows = rows_by_step[step_bounds[step + 1]:step_bounds[step + 2]] - 1
+            
+            F, _ = transition(dt[rows + 1])
+            
+            smoother_gain = filtered_cov[rows] @ F.transpose(0, 2, 1) @ np.linalg.pinv(predicted_cov[rows + 1], hermitian=True)
+            
+            smoothed_state[rows] = filtered_state[rows] + np.einsum(
+                "rij,raj->rai", smoother_gain, smoothed_state[rows + 1] - predicted_state[rows + 1]
+            )
+        
+        return smoothed_state[:, :, 0], smoothed_state[:, :, 1]
+    
+    
+    def _compute_velos(self, df, group_by_cols, cols):
+        """
+        A utility to compute velocities at the row level
+        
+        I suggest smoothing and resampling the data before this gets called
+        
+        """
+        
+        lagged_df = df.groupby(group_by_cols)[cols].shift(1)
+        lagged_df.columns = ["lag_1_" + s for s in cols]
+        
+        diff_df = df.groupby(group_by_cols)[cols].diff()
+        diff_df.columns = ["diff_" + s for s in cols]
+        
+        velo_df = diff_df[["diff_" + s for s in cols]].div(diff_df["diff_timestamp"] / 1000, axis=0)
+        cols.remove("timestamp")
+        
+        velo_df = velo_df.loc[:, ["diff_" + s for s in cols]]
+        velo_df.columns = [s.replace("position", "velo").replace("field", "velo") for s in cols]
+        
+        return pd.concat([df, lagged_df, diff_df, velo_df], axis=1)
+    
+    def _resample_to_clock(self, df, group_by_cols, value_cols, play_starts, step_ms, max_gap_ms=RESAMPLE_MAX_GAP_MS):
+        """
+        Linearly interpolates value_cols of each group (a play, or a player in a play) onto a fixed clock, all at once
+        
+        Each play's clock starts at play_starts[play_id] and ticks every step_ms. A group only gets the ticks 
+        between its first and last timestamp, and ticks in a gap longer than max_gap_ms get dropped instead of made up
+        
+        Returns:
+            a df of group_by_cols, timestamp, and value_cols, sorted by group_by_cols and timestamp
+        
+        """
+        
+        df = df.sort_values(group_by_cols + ["timestamp"], kind="mergesort")
+        
+        if df.shape[0] == 0:
+            return df[group_by_cols + ["timestamp"] + value_cols].reset_index(drop=True)
+        
+        # df is sorted, so the group ids go up
+        group_ids = df.groupby(group_by_cols, sort=False).ngroup().values
+        ts = df["timestamp"].values.astype(np.int64)
+        
+        group_starts = np.r_[0, np.flatnonzero(np.diff(group_ids)) + 1]
+        group_stops = np.r_[group_starts[1:], df.shape[0]]
+        
+        first_ts = ts[group_starts]
+        last_ts = ts[group_stops - 1]
+        clock_start = play_starts.reindex(df["play_id"].values[group_starts]).values.astype(float)
+        
+        # the first and last tick that land in each group
+        first_tick = np.ceil((first_ts - clock_start) / step_ms).astype(np.int64)
+        n_ticks = np.clip(np.floor((last_ts - clock_start) / step_ms).astype(np.int64) - first_tick + 1, 0, None)
+        
+        tick_group = np.repeat(np.arange(group_starts.shape[0]), n_ticks)
+        tick_num = np.repeat(first_tick, n_ticks) + np.arange(n_ticks.sum()) - np.repeat(np.cumsum(n_ticks) - n_ticks, n_ticks)
+        tick_ts = np.round(clock_start[tick_group] + tick_num * step_ms).astype(np.int64)
+        
+        # rounding can push a tick just outside of the group
+        in_group = (tick_ts >= first_ts[tick_group]) & (tick_ts <= last_ts[tick_group])
+        
+        # one sorted key for every group, so all of the ticks can be found with one searchsorted
+        ts_span = ts.max() - ts.min() + 1
+        sample_key = group_ids * ts_span + (ts - ts.min())
+        tick_key = tick_group * ts_span + (tick_ts - ts.min())
+        
+        after = np.minimum(np.searchsorted(sample_key, tick_key, side="left"), df.shape[0] - 1)
+        before = np.where(sample_key[after] == tick_key, after, after - 1)
+        
+        gap = ts[after] - ts[before]
+        keep = in_group & (gap <= max_gap_ms)
+        
+        before, after, gap, tick_group, tick_ts = before[keep], after[keep], gap[keep], tick_group[keep], tick_ts[keep]
+        
+        weight = np.divide(tick_ts - ts[before], gap, out=np.zeros(gap.shape[0]), where=gap > 0)
+        
+        values = df[value_cols].to_numpy(dtype=float)
+        clock_values = values[before] + weight[:, None] * (values[after] - values[before])
+        
+        clock_df = pd.DataFrame(df[group_by_cols].values[group_starts][tick_group], columns=group_by_cols)
+        clock_df = clock_df.astype(df[group_by_cols].dtypes.to_dict())
+        
+        clock_df["timestamp"] = tick_ts
+        clock_df[value_cols] = clock_values
+        
+        return clock_df
+    
+    
+    def _snap_to_clock(self, play_ids, timestamps, play_starts, step_ms):
+        """
+        moves each timestamp to the nearest tick of its play's clock, see _resample_to_clock
+        
+        """
+        clock_start = play_starts.reindex(play_ids).values.astype(float)
+        
+        tick_num = np.round((np.asarray(timestamps) - clock_start) / step_ms)
+        
+        return np.round(clock_start + tick_num * step_ms).astype(np.int64)
+    
+    
+    def resample_to_clock(self, hz=30, max_gap_ms=RESAMPLE_MAX_GAP_MS):
+        """
+        Puts the ball and player data of every play onto the same fixed clock, so each frame has both the ball and players
+        
+        Each play's clock starts at the play's first timestamp. The ball and players are linearly interpolated 
+        onto the ticks (velos are recomputed on the clock, 
+        except the kalman smoothed velos, those get interpolated too), and events are moved to the nearest tick
+        
+        Sets:
+            clock_ball_pos, clock_player_pos, clock_game_events and clock_timestamp (and their play indexes),
+            use them with get_this_play(..., on_clock=True), get_this_play_ts(..., on_clock=True) and get_play_window
+        
+        """
+        step_ms = 1000 / hz
+        
+        play_starts = self.timestamp_df.groupby("play_id")["timestamp"].min()
+        
+        ball_cols = [
+            "ball_position_x", "ball_position_y", "ball_position_z", 
+            "smoothed_ball_position_x", "smoothed_ball_position_y", "smoothed_ball_position_z"
+        ]
+        velo_cols = ["timestamp"] + ball_cols
+        
+        # the kalman velos get interpolated like the positions, only the raw positions need to be diffed
+        if self.smoothing == "kalman":
+            ball_cols = ball_cols + ["smoothed_ball_velo_x", "smoothed_ball_velo_y", "smoothed_ball_velo_z"]
+            velo_cols = ["timestamp", "ball_position_x", "ball_position_y", "ball_position_z"]
+        
+        clock_ball_pos = self._resample_to_clock(self.new_ball_pos, ["play_id"], ball_cols, play_starts, step_ms, max_gap_ms)
+        clock_ball_pos = self._compute_velos(clock_ball_pos, ["play_id"], velo_cols)
+        clock_ball_pos.insert(0, "game_str", self.which_game)
+        
+        clock_player_pos = self._resample_to_clock(
+            self.new_player_pos, ["play_id", "player_position"], ["field_x", "field_y"], play_starts, step_ms, max_gap_ms
+        )
+        clock_player_pos["player_position_desc"] = clock_player_pos["player_position"].map(PLAYER_POSITION_CODE_TO_DESC).astype(PLAYER_POSITION_DESC_DTYPE)
+        clock_player_pos = self._compute_velos(clock_player_pos, ["play_id", "player_position"], ["timestamp", "field_x", "field_y"])
+        clock_player_pos.insert(0, "game_str", self.which_game)
+        
+        clock_game_events = self.game_events_df.copy()
+        clock_game_events["raw_timestamp"] = clock_game_events["timestamp"]
+        clock_game_events["timestamp"] = self._snap_to_clock(
+            clock_game_events["play_id"].values, clock_game_events["timestamp"].values, play_starts, step_ms
+        )
+        
+        self.clock_ball_pos, self.clock_ball_pos_play_index = self._build_play_index(clock_ball_pos)
+        self.clock_player_pos, self.clock_player_pos_play_index = self._build_play_index(clock_player_pos)
+        self.clock_game_events, self.clock_game_events_play_index = self._build_play_index(clock_game_events)
+        self.clock_timestamp, self.clock_timestamp_play_index = self.collect_all_timestamps(
+            clock_ball_pos, clock_player_pos, clock_game_events, return_index=True
+        )
+        
+        self.resample_hz = hz
+    
+    
+    def _add_throw_details_to_events(self, df):
+        """
+        needs the new_ball_pos to work, needs to be a separate function
+        
+        all of the throws get computed at once, see _compute_all_throw_details
+        """
+        
+        game_events = df.copy()
+
+        
+        # a column for the xy_throw_angle, will be na if the event is not a throw
+        game_events["xy_throw_angle"] = np.nan
+        game_events["elevation_throw_angle"] = np.nan
+        game_events["throw_velo"] = np.nan
+        game_events["throw_bounced"] = 0
+
+        is_throw = game_events["event"] == "throw (ball-in-play)"
+
+        # fill in xy, elevation, and velo in one pass
+        throw_details = self._compute_all_throw_details(
+            game_events.loc[is_throw, "play_id"].values,
+            game_events.loc[is_throw, "timestamp"].values, 
+            self.new_ball_pos
+        )
+        
+        for which, col in [("xy", "xy_throw_angle"), ("elevation", "elevation_throw_angle"), ("velo", "throw_velo")]:
+            game_events.loc[is_throw, col] = throw_details[which]
+
+        # fill in whether the throw bounced
+        game_events.loc[
+            is_throw,
+            "throw_bounced"
+        ] = (game_events.loc[is_throw, "next_event"] == "ball bounce").astype(int)
+        
+        
+        return game_events
+    
+    
+    def _build_play_index(self, df):
+        """
+        A utility to sort a df by play_id and timestamp and find where each play starts and stops
+        
+        Returns:
+            the sorted df, and a dict of play_id -> (start, stop) so that df.iloc[start:stop] is that play
+        
+        """
+        
+        df = df.sort_values(["play_id", "timestamp"], kind="mergesort")
+        
+        play_ids, starts, counts = np.unique(df["play_id"].values, return_index=True, return_counts=True)
+        
+        play_index = {
+            play_id : (start, start + count) for play_id, start, count in zip(play_ids.tolist(), starts.tolist(), counts.tolist())
+        }
+        
+        return df, play_index
+    
+    
+    def _build_play_indexes(self):
         """
+        sorts game_events_df and timestamp_df by play and timestamp and builds their play indexes, 
+        for after loading from the cache, the stages build them as each table is done
+        
+        """
+        
+        # a stable sort, so events with the same timestamp stay in event_code order
+        self.game_events_df, self.game_events_play_index = self._build_play_index(self.game_events_df)
+        self.timestamp_df, self.timestamp_play_index = self._build_play_index(self.timestamp_df)
+    
+    
+    def _build_play_mappers(self):
+        """
+        dicts for going between play_id and play_per_game, from play_id_to_per_game_mapper
+        
+        """
+        
+        self.pid_to_ppg = dict(zip(
+            self.play_id_to_per_game_mapper["play_id"].tolist(), 
+            self.play_id_to_per_game_mapper["play_per_game"].tolist()
+        ))
+        
+        self.ppg_to_pid = dict(zip(
+            self.play_id_to_per_game_mapper["play_per_game"].tolist(), 
+            self.play_id_to_per_game_mapper["play_id"].tolist()
+        ))
+    
+    
+    def _get_play_index(self, df):
+        """
+        returns the play index for df, the cached ones for the ball, player, events and timestamp tables or a new one otherwise
+        
+        """
+        
+        for frame_name, index_name in [
+            ("new_ball_pos", "ball_pos_play_index"), 
+            ("new_player_pos", "player_pos_play_index"), 
+            ("game_events_df", "game_events_play_index"),
+            ("timestamp_df", "timestamp_play_index"),
+            ("clock_ball_pos", "clock_ball_pos_play_index"),
+            ("clock_player_pos", "clock_player_pos_play_index"),
+            ("clock_game_events", "clock_game_events_play_index"),
+            ("clock_timestamp", "clock_timestamp_play_index")
+        ]:
+            # only the tables that are already computed, so this never runs a stage
+            if df is self.__dict__.get(frame_name) and index_name in self.__dict__:
+                return df, self.__dict__[index_name]
+        
+        return self._build_play_index(df)
+    
+    
+    def _find_play_windows(self, play_ids, start_ts, end_ts, sorted_ts, play_index):
+        """
+        A utility to find the (start, stop) rows of each play where start_ts <= timestamp <= end_ts
+        
+        sorted_ts is the timestamp column of a df sorted with _build_play_index, 
+        the window for event i is sorted_ts[start[i]:stop[i]], and it never goes outside of play_ids[i]
+        
+        """
+        
+        play_ids = np.asarray(play_ids)
+        start_ts = np.asarray(start_ts, dtype=float)
+        end_ts = np.asarray(end_ts, dtype=float)
+        
+        start = np.zeros(len(play_ids), dtype=int)
+        stop = np.zeros(len(play_ids), dtype=int)
+        
+        if len(play_ids) == 0 or len(play_index) == 0:
+            return start, stop
+        
+        # the plays in the order they are in sorted_ts
+        index_plays = np.array(list(play_index.keys()))
+        play_bounds = np.array(list(play_index.values()), dtype=int).reshape(-1, 2)
+        
+        play_order = np.argsort(play_bounds[:, 0], kind="mergesort")
+        index_plays, play_bounds = index_plays[play_order], play_bounds[play_order]
+        
+        # each row gets a (play, timestamp) key, the play as its rank in sorted_ts, 
+        # the keys are sorted across the whole table so one searchsorted finds every window
+        key_dtype = [("rank", "i8"), ("timestamp", "f8")]
+        
+        row_keys = np.empty(play_bounds[-1, 1] - play_bounds[0, 0], dtype=key_dtype)
+        row_keys["rank"] = np.repeat(np.arange(len(index_plays)), play_bounds[:, 1] - play_bounds[:, 0])
+        row_keys["timestamp"] = sorted_ts[play_bounds[0, 0]:play_bounds[-1, 1]]
+        
+        # plays that aren't in play_index keep an empty (0, 0) window
+        plays_sorter = np.argsort(index_plays, kind="mergesort")
+        rank = plays_sorter[np.clip(np.searchsorted(index_plays, play_ids, sorter=plays_sorter), 0, len(index_plays) - 1)]
+        in_index = index_plays[rank] == play_ids
+        
+        lo_keys = np.empty(in_index.sum(), dtype=key_dtype)
+        lo_keys["rank"] = rank[in_index]
+        lo_keys["timestamp"] = start_ts[in_index]
         
-        # the easiest would be like a moving average 
-        # with more effort, could do a Kalman filter?
+        hi_keys = lo_keys.copy()
+        hi_keys["timestamp"] = end_ts[in_index]
         
-        # I am not actually sure I need this
+        # nan times sort to the end of their play, same as searching the play on its own
+        this_start = play_bounds[0, 0] + np.searchsorted(row_keys, lo_keys, side="left")
+        this_stop = play_bounds[0, 0] + np.searchsorted(row_keys, hi_keys, side="right")
         
-        smoothed_pos_df = df.copy()
-
-        smoothed_xy = df.groupby("play_id")[["timestamp", "ball_position_x", "ball_position_y", "ball_position_z"]]\
-            .rolling(3, center=True, closed="both").mean()
- 
-        smoothed_pos_df["smoothed_ball_position_x"] = smoothed_xy["ball_position_x"].values
-        smoothed_pos_df["smoothed_ball_position_y"] = smoothed_xy["ball_position_y"].values
-        smoothed_pos_df["smoothed_ball_position_z"] = smoothed_xy["ball_position_z"].values
+        start[in_index] = this_start
+        stop[in_index] = np.maximum(this_start, this_stop)
         
-        return smoothed_pos_df
+        return start, stop
     
     
-    def _compute_velos(self, df, group_by_cols, cols):
+    def _compute_all_throw_details(self, play_ids, timestamps, ball_pos_df, target_point=FIRST_BASE_COORDS):
         """
-        A utility to compute velocities at the row level
+        A vectorized version of _fill_throw_details, does xy, elevation and velo for every throw at once
         
-        I suggest smoothing and resampling the data before this gets called
+        This should give the same numbers as _compute_throw_details (nans included), 
+        it just looks up all of the windows within each play with a searchsorted instead of filtering the whole df each time
         
-        """
+        Returns:
+            dict of np.arrays with keys "xy", "elevation", "velo"
         
-        lagged_df = df.groupby(group_by_cols)[cols].shift(1)
-        lagged_df.columns = ["lag_1_" + s for s in cols]
+        """
         
-        diff_df = df.groupby(group_by_cols)[cols].diff()
-        diff_df.columns = ["diff_" + s for s in cols]
+        ball_pos_df, play_index = self._get_play_index(ball_pos_df)
         
-        velo_df = diff_df[["diff_" + s for s in cols]].div(diff_df["diff_timestamp"] / 1000, axis=0)
-        cols.remove("timestamp")
+        ball_ts = ball_pos_df["timestamp"].values
+        ball_xyz = ball_pos_df[["ball_position_x", "ball_position_y", "ball_position_z"]].values.astype(float)
         
-        velo_df = velo_df.loc[:, ["diff_" + s for s in cols]]
-        velo_df.columns = [s.replace("position", "velo").replace("field", "velo") for s in cols]
+        start, stop = self._find_play_windows(
+            play_ids, 
+            np.asarray(timestamps) - THROW_BUFFER_MS, 
+            np.asarray(timestamps) + THROW_SNAPSHOT_MS, 
+            ball_ts, 
+            play_index
+        )
         
-        return pd.concat([df, lagged_df, diff_df, velo_df], axis=1)
+        return self._compute_throw_details_from_windows(ball_ts, ball_xyz, start, stop, target_point=target_point)
     
-    def _add_throw_details_to_events(self, df):
+    
+    def _compute_throw_details_from_windows(self, ball_ts, ball_xyz, start, stop, target_point=FIRST_BASE_COORDS):
         """
-        needs the new_ball_pos to work, needs to be a separate function
+        the vectorized math from _compute_throw_details, the window for each throw is ball_xyz[start:stop]
+        
+        empty windows are nan, same as the try/except in _compute_throw_details
+        
         """
+        n_throws = len(start)
+        has_data = stop > start
         
-        game_events = df.copy()
-
+        first_xyz = np.full((n_throws, 3), np.nan)
+        last_xyz = np.full((n_throws, 3), np.nan)
+        flight_time_sec = np.full(n_throws, np.nan)
         
-        # a column for the xy_throw_angle, will be na if the event is not a throw
-        game_events["xy_throw_angle"] = np.nan
-        game_events["elevation_throw_angle"] = np.nan
-        game_events["throw_velo"] = np.nan
-        game_events["throw_bounced"] = 0
-
-
-        # fill in xy
-        game_events.loc[
-            game_events["event"] == "throw (ball-in-play)", 
-            "xy_throw_angle"
-        ] = game_events.loc[
-            game_events["event"] == "throw (ball-in-play)"
-            , :
-        ].apply(
-            lambda row: \
-            self._fill_throw_details(row["timestamp"], self.new_ball_pos, which="xy")
-            , axis = 1
-        )
+        first_xyz[has_data] = ball_xyz[start[has_data]]
+        last_xyz[has_data] = ball_xyz[stop[has_data] - 1]
+        flight_time_sec[has_data] = (ball_ts[stop[has_data] - 1] - ball_ts[start[has_data]]) / 1000
         
-        # fill in elevation
-        game_events.loc[
-            game_events["event"] == "throw (ball-in-play)", 
-            "elevation_throw_angle"
-        ] = \
-            game_events.loc[
-            game_events["event"] == "throw (ball-in-play)",
-            :
-        ].apply(lambda row: \
-                self._fill_throw_details(row["timestamp"], self.new_ball_pos, which="elevation")
-                , axis = 1
-               )
-        
-         # fill in velo
-        game_events.loc[
-            game_events["event"] == "throw (ball-in-play)",
-            "throw_velo"
-        ] = game_events.loc[
-            game_events["event"] == "throw (ball-in-play)"
-            , :
-        ].apply(lambda row: \
-                self._fill_throw_details(row["timestamp"], self.new_ball_pos, which="velo")
-                , axis = 1
-               )
-
-        # fill in whether the throw bounced
-        game_events.loc[
-            game_events["event"] == "throw (ball-in-play)",
-            "throw_bounced"
-        ] = game_events.loc[
-            (game_events["event"] == "throw (ball-in-play)"),
-            :
-        ].apply(lambda row: \
-               1 if row["next_event"] == "ball bounce" else 0
-               , axis = 1
-               )
+        # the throw vector over the whole window
+        throw_vect = last_xyz - first_xyz
         
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # unit vector from the first point to the target point
+            xy_vect_to_target = target_point - first_xyz[:, :2]
+            unit_xy_vect_to_target = xy_vect_to_target / np.sqrt((xy_vect_to_target ** 2).sum(axis=1))[:, None]
+            
+            xy_cos = (throw_vect[:, :2] * unit_xy_vect_to_target).sum(axis=1) / np.sqrt((throw_vect[:, :2] ** 2).sum(axis=1))
+            xy_angle_to_first_deg = np.arccos(xy_cos) * 180 / np.pi
+            
+            # (PI/2 - radians from straight up)
+            throw_dist = np.sqrt((throw_vect ** 2).sum(axis=1))
+            elevation_angle_deg = (np.pi/2 - np.arccos(throw_vect[:, 2] / throw_dist)) * 180 / np.pi
+            
+            # this is feet per (ball_flight_time) / 1.467 [fps to mph]
+            velo = throw_dist / flight_time_sec / 1.467
         
-        return game_events
+        return {"xy" : xy_angle_to_first_deg, "elevation" : elevation_angle_deg, "velo" : velo}
     
     
     def _compute_throw_details(self, a, which = "xy", target_point = np.array([63.63961031, 63.63961031])):
@@ -818,24 +1888,33 @@ class Game:
                 return np.nan
             
     
-    def _fill_throw_details(self, timestamp, ball_pos_df, which = "xy", target_point = np.array([63.63961031, 63.63961031])): 
+    def _fill_throw_details(self, timestamp, ball_pos_df, which = "xy", target_point = np.array([63.63961031, 63.63961031]), play_id=None): 
         """
         the helper function to actual fill in a given throw's angle to the target point
         
+        if play_id is given, only the ball data from that play is used
     
         """
 
         # ball_pos_df = new_ball_pos_df.copy()
 
-        buffer_ms = -10
-        snapshot_time = 250
+        buffer_ms = THROW_BUFFER_MS
+        snapshot_time = THROW_SNAPSHOT_MS
 
         # find when the ball is in the air with a buffer or not
-        ball_in_air_df = ball_pos_df.loc[(ball_pos_df["timestamp"] >= (timestamp - buffer_ms)) &\
-                                           (ball_pos_df["timestamp"] <= (timestamp + snapshot_time)),
-                                           # (ball_pos_1903_01["timestamp"] <= temp_throws["next_event_ts"].values[0] + buffer_ms), # this is for the whole throw
-                                           :
-                                          ] 
+        if play_id is not None:
+            ball_in_air_df = self.get_play_window(
+                play_id, 
+                ball_pos_df, 
+                timestamp - buffer_ms, 
+                timestamp + snapshot_time
+            )
+        else:
+            ball_in_air_df = ball_pos_df.loc[(ball_pos_df["timestamp"] >= (timestamp - buffer_ms)) &\
+                                               (ball_pos_df["timestamp"] <= (timestamp + snapshot_time)),
+                                               # (ball_pos_1903_01["timestamp"] <= temp_throws["next_event_ts"].values[0] + buffer_ms), # this is for the whole throw
+                                               :
+                                              ] 
 
         # print(ball_in_air_df["play_id"].describe())
         angle = self._compute_throw_details(ball_in_air_df, which=which, target_point=target_point)
@@ -864,12 +1943,17 @@ class Game:
         except:
             return np.nan
     
-    def _fill_player_details_at_throw(self, timestamp, player_pos_df, which=None, thrower_position=None, target_point = np.array([63.63961031, 63.63961031])): 
+    def _fill_player_details_at_throw(self, timestamp, player_pos_df, which=None, thrower_position=None, target_point = np.array([63.63961031, 63.63961031]), play_id=None): 
         """
         a helper for filling in player details
+        
+        if play_id is given, only the player data from that play is used
         """
         player_stat = np.nan
         
+        if play_id is not None:
+            player_pos_df = self.get_play_window(play_id, player_pos_df, timestamp, timestamp)
+        
         if which == "batter_dist":
             batter_data = player_pos_df.loc[
                 (player_pos_df["timestamp"] == timestamp) &\
@@ -949,59 +2033,36 @@ class Game:
 
         """
         
+        # the (first) position of every player at every timestamp in each play, so we can do this with merges
+        player_at_ts = player_pos[["play_id", "timestamp", "player_position", "field_x", "field_y"]]\
+            .drop_duplicates(["play_id", "timestamp", "player_position"])
+        
         # fill in batter dist from first for all events
-        game_events.loc[
-            # If I do this for all events I will have deltas that I can mess with in event to compute velo after the fact!
-            :,
-            #game_events["event"] == "throw (ball-in-play)", 
-            "batter_dist_to_first"
-        ] = game_events.loc[
-            : # game_events["event"] == "throw (ball-in-play)"
-            , :
-        ].apply(
-            lambda row: \
-            self._fill_player_details_at_throw(row["timestamp"], self.new_player_pos, which="batter_dist")
-            , axis = 1
+        # If I do this for all events I will have deltas that I can mess with in event to compute velo after the fact!
+        batter_at_event = game_events[["play_id", "timestamp"]].assign(player_position=10).merge(
+            player_at_ts,
+            how="left",
+            on=["play_id", "timestamp", "player_position"]
         )
-
-
-        # fill in thrower x for all throws
-        # can't just be a merge because we don't know the thrower a priori
-        game_events.loc[
-           game_events["event"] == "throw (ball-in-play)", 
-            "thrower_x"
-        ] = game_events.loc[
-            game_events["event"] == "throw (ball-in-play)"
-            , :
-        ].apply(
-            lambda row: \
-            self._fill_player_details_at_throw(
-                row["timestamp"], 
-                self.new_player_pos, 
-                which="thrower_x", 
-                thrower_position=row["player_position"]
-            )
-            , axis = 1
+        
+        game_events["batter_dist_to_first"] = np.hypot(
+            FIRST_BASE_COORDS[0] - batter_at_event["field_x"].values,
+            FIRST_BASE_COORDS[1] - batter_at_event["field_y"].values
         )
+
+        # fill in thrower x and y for all throws
+        # the thrower is whoever made the throw, so this is a merge on the event's player_position
+        is_throw = game_events["event"] == "throw (ball-in-play)"
         
-        # thrower y for all throws
-        game_events.loc[
-           game_events["event"] == "throw (ball-in-play)", 
-            "thrower_y"
-        ] = game_events.loc[
-            game_events["event"] == "throw (ball-in-play)"
-            , :
-        ].apply(
-            lambda row: \
-            self._fill_player_details_at_throw(
-                row["timestamp"], 
-                self.new_player_pos, 
-                which="thrower_y", 
-                thrower_position=row["player_position"]
-            )
-            , axis = 1
+        thrower_at_event = game_events.loc[is_throw, ["play_id", "timestamp", "player_position"]].merge(
+            player_at_ts,
+            how="left",
+            on=["play_id", "timestamp", "player_position"]
         )
         
+        game_events.loc[is_throw, "thrower_x"] = thrower_at_event["field_x"].values
+        game_events.loc[is_throw, "thrower_y"] = thrower_at_event["field_y"].values
+        
 
         # everything that doesn't need to be computed can just be a merge!
 
@@ -1049,207 +2110,199 @@ class Game:
                
         return game_events
    
-    def _is_out_at_first(self, half_inning_df, seq, empty_cell_index, allowable_throw_angle = 7, allowable_first_base_dist=15):
+    def _get_outs_at_first_features(self, allowable_throw_angle=7, allowable_first_base_dist=15):
         """
-        an alt way to compute outs
-
-
+        The per play things that go into whether a play is an out at first, from one pass over game_events_df
+        
+        Returns:
+            a df indexed by play_per_game with a bool column for each feature
+        
         """
-        # Assuming we have consecutive indices in half_inning_df!
-
-        # define some lists for convenience
-        all_batting_team = ["batter", "first_baserunner", "second_baserunner", "third_baserunner"]
-        all_br = ["first_baserunner", "second_baserunner", "third_baserunner"]
-
-        seq_len = seq.shape[0]
-
-        old_set_batting_team = set()
+        game_events = self.game_events_df
         
-        if empty_cell_index != 0:
-            # you need to set and check all of the things that look at the prev row 
-            old_set_batting_team = set(half_inning_df.iloc[empty_cell_index - 1][all_batting_team])
-            #prev_total_outs = sum(seq[empty_cell_index - 1, :])
-
-        # importantly, the data here are ints or sets of ints
-        next_batter = None
-        next_set_batting_team = set()
-        next_set_br = set()
-        next_second_br = None
-        next_third_br = None
-
-        # the play_per_game of HRs within this game
-        hr_play_per_games = self.get_play_id_and_ppg_for_event("home run")["play_per_game"].values
-
-
-         # if there is a next play to pick from
-        if empty_cell_index < seq_len - 1:
-            next_batter = half_inning_df.iloc[empty_cell_index + 1]["batter"]
-            next_set_batting_team = set(half_inning_df.iloc[empty_cell_index + 1][all_batting_team])
-            next_set_br = set(half_inning_df.iloc[empty_cell_index + 1][all_br])
-
-            next_second_br = half_inning_df.iloc[empty_cell_index + 1]["second_baserunner"]
-            next_third_br = half_inning_df.iloc[empty_cell_index + 1]["third_baserunner"]
-
-        # again, the data here are ints or sets of ints
-        this_batter = half_inning_df.iloc[empty_cell_index]["batter"]
-        this_set_br = set(half_inning_df.iloc[empty_cell_index][all_br])
-        this_first_br = half_inning_df.iloc[empty_cell_index]["first_baserunner"]
-        this_second_br = half_inning_df.iloc[empty_cell_index]["second_baserunner"]
-        this_third_br = half_inning_df.iloc[empty_cell_index]["third_baserunner"]
-        this_set_batting_team = set(half_inning_df.iloc[empty_cell_index][all_batting_team])
-
-        # do we have the same batter on the next play
-        same_batter_next_play = this_batter == next_batter
-
-        # how many outs we would have if we assigned this_play_outs to this index
-        # does_this_make_3 = prev_total_outs + this_play_outs
-        this_play_per_game = half_inning_df.iloc[empty_cell_index]["play_per_game"]
-
-
-        this_play_events = self.game_events_df.loc[
-            (self.game_events_df["play_per_game"] == this_play_per_game),
-            :
-        ]
-        # to make a useful spot for breakpoints
-        pass 
-
-
-        if same_batter_next_play:
-            return 0
-
-        if this_play_per_game in hr_play_per_games:
-            return 0
-
-
-        ## compute the distance the ball is away from first when acquire
-        any_acqs_near_first = any(this_play_events.loc[
-            (this_play_events["event"] == "ball acquired") &
-            (this_play_events["player_position"] == 3),
-            ["ball_position_x", "ball_position_y"]
-        ].apply(lambda row: np.sqrt((row["ball_position_x"] - FIRST_BASE_COORDS[0])**2 +
-                                    (row["ball_position_y"] - FIRST_BASE_COORDS[1])**2)
-                                    , axis=1) < allowable_first_base_dist
-        )    
-
-
-        # maybe need something for player position and event at the same time?
-        if ("ball hit into play" in this_play_events["event"].values) and\
-            ("ball bounce" in this_play_events["event"].values) and\
-            ("throw (ball-in-play)" in this_play_events["event"].values) and\
-            ("ball acquired" in this_play_events["event"].values) and\
-            any(this_play_events["xy_throw_angle"] < allowable_throw_angle) and\
-            any_acqs_near_first and\
-            (this_batter not in next_set_batting_team):
-
-            return 1
-
-
-        # not outs at first, throws towards first
-        if ("ball hit into play" in this_play_events["event"].values) and\
-            ("ball bounce" in this_play_events["event"].values) and\
-            ("throw (ball-in-play)" in this_play_events["event"].values) and\
-            ("ball acquired" in this_play_events["event"].values) and\
-            any(this_play_events["xy_throw_angle"] < allowable_throw_angle) and\
-            any_acqs_near_first and\
-            (this_batter in next_set_batting_team):
-
-            return -1
-
-
-        return 0
+        ## compute the distance the ball is away from first when acquired
+        dist_to_first = np.hypot(
+            game_events["ball_position_x"] - FIRST_BASE_COORDS[0], 
+            game_events["ball_position_y"] - FIRST_BASE_COORDS[1]
+        )
+        
+        play_features = pd.DataFrame({
+            "play_per_game" : game_events["play_per_game"],
+            "has_hit" : game_events["event"] == "ball hit into play",
+            "has_bounce" : game_events["event"] == "ball bounce",
+            "has_throw" : game_events["event"] == "throw (ball-in-play)",
+            "has_acq" : game_events["event"] == "ball acquired",
+            "has_throw_towards_first" : game_events["xy_throw_angle"] < allowable_throw_angle,
+            "has_acq_near_first" : (game_events["event"] == "ball acquired") & 
+                (game_events["player_position"] == 3) & 
+                (dist_to_first < allowable_first_base_dist),
+        }).groupby("play_per_game").any()
+        
+        play_features["is_hr"] = play_features.index.isin(list(self._get_outs_event_sets()["hr_play_per_games"]))
+        
+        return play_features
+    
     
-    def _fill_outs_at_first(self, game_info):
+    def _fill_outs_at_first(self, game_info, allowable_throw_angle=7, allowable_first_base_dist=15):
         """
+        an alt way to compute outs, 1 is an out at first, -1 is a throw to first that wasn't an out, and 0 is everything else
         
         """
         
         game_info = game_info.copy()
         
-        game_info["is_out_at_first"] = np.nan
+        self._get_outs_event_sets(recompute=True)
         
-        running_outs_seq = np.full((game_info.shape[0], 1), -99)
-
-        for ii in range(game_info.shape[0]):
-            running_outs_seq[ii] = self._is_out_at_first(game_info, game_info["is_out_at_first"], ii)
-
-        game_info["is_out_at_first"] = running_outs_seq
+        play_features = self._get_outs_at_first_features(allowable_throw_angle, allowable_first_base_dist)
+        
+        # plays without any events don't have any of the features
+        this_play = play_features.reindex(game_info["play_per_game"].values, fill_value=False)
+        
+        # "next" is the next row of game_info, the last play doesn't have one
+        all_batting_team = ["batter", "first_baserunner", "second_baserunner", "third_baserunner"]
+        next_batting_team = game_info[all_batting_team].shift(-1)
+        
+        same_batter_next_play = (game_info["batter"] == next_batting_team["batter"]).values
+        
+        batter_on_next_play = next_batting_team.eq(game_info["batter"], axis=0).any(axis=1).values
+        
+        # maybe need something for player position and event at the same time?
+        throw_to_first = (
+            this_play["has_hit"] & 
+            this_play["has_bounce"] & 
+            this_play["has_throw"] & 
+            this_play["has_acq"] & 
+            this_play["has_throw_towards_first"] & 
+            this_play["has_acq_near_first"]
+        ).values
+        
+        # same batter and HRs are never outs at first
+        could_be_out = throw_to_first & ~same_batter_next_play & ~this_play["is_hr"].values
+        
+        game_info["is_out_at_first"] = np.select(
+            [could_be_out & ~batter_on_next_play, could_be_out & batter_on_next_play],
+            [1, -1], 
+            default=0
+        )
         
         return game_info
     
         
-    def _find_empty_cell(self, seq):
+    def _get_outs_event_sets(self, recompute=False, game_events_df=None):
         """
-        a util that takes an (n, 2) np.array() object and finds the index of the next nan value
+        the sets of play_per_games the outs solvers check over and over, 
+        these only depend on game_events_df, so only look them up once per game
+        
+        game_events_df defaults to self.game_events_df, the info stage passes the prepped events 
+        since the full game_events_df needs the info to be done
         
-        this is used to solve the outs sequence
         """
-        index = None
-
-        # this play outs is in the second column!
-        for i, val in enumerate(seq[:, 1]):
-            if np.isnan(val):
-                return i
-
-        return index
+        
+        if game_events_df is None and (recompute or self.outs_event_sets is None):
+            game_events_df = self.game_events_df
+        
+        if recompute or self.outs_event_sets is None:
+            self.outs_event_sets = {
+                # the play_per_game of HRs within this game
+                "hr_play_per_games" : frozenset(
+                    self._find_plays_with_event(game_events_df, "home run")["play_per_game"].values
+                ),
+                
+                # technically, these aren't all flyouts that end the play (e.g. it could be a single, that an outfielder eats)
+                # but every flyout should be here (unless, there are many plays that end after an outfielder throws it in)
+                "flyouts_that_end_play" : frozenset(
+                    self._find_plays_with_event(game_events_df, 
+                                                "ball acquired", 
+                                                player_position=[7, 8, 9],
+                                                next_event="end of play")["play_per_game"].values
+                ),
+            }
+        
+        return self.outs_event_sets
     
-
-    def _is_valid_outs_assignment(self, half_inning_df, seq, this_play_outs, empty_cell_index):
+    
+    def _get_half_inning_state(self, half_inning_df):
+        """
+        pulls the batter and baserunners out of a half inning (or a whole game) once, 
+        so the outs checks can just index into lists instead of making a Series for every row they look at
+        
+        Returns:
+            a dict of per row lists, the sets are frozensets of player ids
+        
+        """
+        
+        all_batting_team = ["batter", "first_baserunner", "second_baserunner", "third_baserunner"]
+        
+        batting_team = half_inning_df[all_batting_team].to_numpy()
+        
+        if not pd.isnull(batting_team).any():
+            batting_team = batting_team.astype(np.int64)
+        
+        batting_team_rows = batting_team.tolist()
+        
+        half_inning_state = {
+            "batting_team" : batting_team,
+            "batter" : batting_team[:, 0].tolist(),
+            "first_baserunner" : batting_team[:, 1].tolist(),
+            "second_baserunner" : batting_team[:, 2].tolist(),
+            "third_baserunner" : batting_team[:, 3].tolist(),
+            "set_batting_team" : [frozenset(row) for row in batting_team_rows],
+            "set_br" : [frozenset(row[1:]) for row in batting_team_rows],
+            "set_nonzero_br" : [frozenset(br for br in row[1:] if br != 0) for row in batting_team_rows],
+            "play_per_game" : half_inning_df["play_per_game"].tolist(),
+            "n_br" : half_inning_df["n_br"].tolist()
+        }
+        
+        return half_inning_state
+    
+    
+    def _is_valid_outs_assignment(self, half_inning_df, seq, this_play_outs, empty_cell_index, half_inning_state=None, check_total=True):
         """
         The meat of the outs sequence solver -- given a game state and a proposed number of outs, 
         this function returns a bool for whether this arrangement is possible
         
+        half_inning_state is from _get_half_inning_state, it gets made here if you don't pass it
+        
+        check_total=False skips the "the last play has to make it 3 outs" rule, 
+        which is the only rule that looks at the other plays in seq
         
         """
         # Assuming we have consecutive indices in half_inning_df!
-        
-        # define some lists for convenience
-        all_batting_team = ["batter", "first_baserunner", "second_baserunner", "third_baserunner"]
-        all_br = ["first_baserunner", "second_baserunner", "third_baserunner"]
+        if half_inning_state is None:
+            half_inning_state = self._get_half_inning_state(half_inning_df)
 
         seq_len = seq.shape[0]
 
-        this_row = half_inning_df.iloc[empty_cell_index]
-
-        old_set_batting_team = set()
         prev_total_outs = 0
 
         if empty_cell_index != 0:
             # you need to set and check all of the things that look at the prev row 
-            old_set_batting_team = set(half_inning_df.iloc[empty_cell_index - 1][all_batting_team])
-            prev_total_outs = sum(seq[empty_cell_index - 1, :])
+            prev_total_outs = seq[empty_cell_index - 1, 0] + seq[empty_cell_index - 1, 1]
 
         # importantly, the data here are ints or sets of ints
         next_batter = None
-        next_set_batting_team = set()
-        next_set_br = set()
-        next_second_br = None
-        next_third_br = None
-
-        # the play_per_game of HRs within this game
-        hr_play_per_games = self.get_play_id_and_ppg_for_event("home run")["play_per_game"].values
+        next_set_batting_team = frozenset()
+        next_set_br = frozenset()
+        next_set_nonzero_br = frozenset()
 
-        # technically, these aren't all flyouts that end the play (e.g. it could be a single, that an outfielder eats)
-        # but every flyout should be here (unless, there are many plays that end after an outfielder throws it in)
-        flyouts_that_end_play = self.get_play_id_and_ppg_for_event("ball acquired", 
-                                                                   player_position=[7, 8, 9],
-                                                                   next_event="end of play")["play_per_game"].values
+        # the play_per_game of HRs and flyouts within this game, see _get_outs_event_sets
+        hr_play_per_games = self._get_outs_event_sets()["hr_play_per_games"]
+        flyouts_that_end_play = self._get_outs_event_sets()["flyouts_that_end_play"]
 
         # if there is a next play to pick from
         if empty_cell_index < seq_len - 1:
-            next_batter = half_inning_df.iloc[empty_cell_index + 1]["batter"]
-            next_set_batting_team = set(half_inning_df.iloc[empty_cell_index + 1][all_batting_team])
-            next_set_br = set(half_inning_df.iloc[empty_cell_index + 1][all_br])
-
-            next_second_br = half_inning_df.iloc[empty_cell_index + 1]["second_baserunner"]
-            next_third_br = half_inning_df.iloc[empty_cell_index + 1]["third_baserunner"]
+            next_batter = half_inning_state["batter"][empty_cell_index + 1]
+            next_set_batting_team = half_inning_state["set_batting_team"][empty_cell_index + 1]
+            next_set_br = half_inning_state["set_br"][empty_cell_index + 1]
+            next_set_nonzero_br = half_inning_state["set_nonzero_br"][empty_cell_index + 1]
 
         # again, the data here are ints or sets of ints
-        this_batter = half_inning_df.iloc[empty_cell_index]["batter"]
-        this_set_br = set(half_inning_df.iloc[empty_cell_index][all_br])
-        this_first_br = half_inning_df.iloc[empty_cell_index]["first_baserunner"]
-        this_second_br = half_inning_df.iloc[empty_cell_index]["second_baserunner"]
-        this_third_br = half_inning_df.iloc[empty_cell_index]["third_baserunner"]
-        this_set_batting_team = set(half_inning_df.iloc[empty_cell_index][all_batting_team])
+        this_batter = half_inning_state["batter"][empty_cell_index]
+        this_set_nonzero_br = half_inning_state["set_nonzero_br"][empty_cell_index]
+        this_first_br = half_inning_state["first_baserunner"][empty_cell_index]
+        this_second_br = half_inning_state["second_baserunner"][empty_cell_index]
+        this_third_br = half_inning_state["third_baserunner"][empty_cell_index]
+        this_set_batting_team = half_inning_state["set_batting_team"][empty_cell_index]
 
         # do we have the same batter on the next play
         same_batter_next_play = this_batter == next_batter
@@ -1257,7 +2310,7 @@ class Game:
 
         # how many outs we would have if we assigned this_play_outs to this index
         does_this_make_3 = prev_total_outs + this_play_outs
-        this_play_per_game = half_inning_df.iloc[empty_cell_index]["play_per_game"]
+        this_play_per_game = half_inning_state["play_per_game"][empty_cell_index]
 
         # to make a useful spot for breakpoints
         pass
@@ -1287,7 +2340,7 @@ class Game:
             # this is a fielders choice out at second
             return False
 
-        if this_play_outs != 1 and set([br for br in this_set_br if br != 0 ]) == set([br for br in next_set_br if br != 0 ]) \
+        if this_play_outs != 1 and this_set_nonzero_br == next_set_nonzero_br \
             and this_batter != next_batter:
             # It must be 1 out if there are non zero BRs that stay the same, and there is a new batter -- this is a strikeout
             # Assumption this goes wrong for mid at bat PH, but that might be rare -- ignore that
@@ -1297,7 +2350,7 @@ class Game:
             # Outs can't go up is there is the same batter and baserunners
             return False
 
-        if this_play_outs > (1 + half_inning_df.iloc[empty_cell_index]["n_br"]):
+        if this_play_outs > (1 + half_inning_state["n_br"][empty_cell_index]):
             # Outs can't go up by more than the number of baserunners + 1
             return False
 
@@ -1312,7 +2365,7 @@ class Game:
             # len(this_set_batting_team) == 2 is because the set will be batter_num and 0
             return False
 
-        if ((seq_len - 1) == (empty_cell_index)) \
+        if check_total and ((seq_len - 1) == (empty_cell_index)) \
             and (does_this_make_3 != 3):
             # if we are on the last index, then this_play_outs and prev_outs must sum to three
             return False
@@ -1320,50 +2373,177 @@ class Game:
         return True
  
 
-    def _solve_outs_sequence(self, half_inning_df, seq):
+    def _get_outs_domains(self, half_inning_df, seq, half_inning_state):
         """
-        A recursive function that solves an outs sequence
+        For each play, the number of outs (0-3) that pass every rule in _is_valid_outs_assignment except the total
+
+        Forced plays (HRs, strikeouts, etc) just end up with one option here
         
         """
-        empty_cell_index = self._find_empty_cell(seq)
+        return [
+            [
+                this_play_outs for this_play_outs in range(4) 
+                if self._is_valid_outs_assignment(half_inning_df, seq, this_play_outs, ii, half_inning_state=half_inning_state, check_total=False)
+            ]
+            for ii in range(seq.shape[0])
+        ]
 
-        if empty_cell_index is None:
-            # you have found a valid solution and this is what makes your thing return
-            return True
 
-        # in a vacuum, each play can have 0, 1, 2, or 3 outs
-        for this_play_outs in range(4):
+    def _count_outs_sequences(self, outs_domains):
+        """
+        Counts the valid outs sequences for a half inning with a DP over (play, outs so far)
 
-            if self._is_valid_outs_assignment(half_inning_df, seq, this_play_outs, empty_cell_index):
-                seq[empty_cell_index, 1] = this_play_outs
+        Params:
+            outs_domains: (list of lists)
+                - from _get_outs_domains
+        
+        Returns:
+            forward_counts, backward_counts -- both (n_plays + 1, 4) arrays, 
+            forward_counts[ii, outs] is the number of ways the plays before ii add up to outs,
+            backward_counts[ii, outs] is the number of ways play ii and on add up to outs.
+            So backward_counts[0, 3] is the number of valid sequences for the half inning
+        
+        """
+        seq_len = len(outs_domains)
+        
+        forward_counts = np.zeros((seq_len + 1, 4), dtype=np.int64)
+        backward_counts = np.zeros((seq_len + 1, 4), dtype=np.int64)
+        
+        forward_counts[0, 0] = 1
+        backward_counts[seq_len, 0] = 1
+        
+        for ii in range(seq_len):
+            for this_play_outs in outs_domains[ii]:
+                # you can't go over 3 outs
+                forward_counts[ii + 1, this_play_outs:] += forward_counts[ii, :4 - this_play_outs]
+        
+        for ii in range(seq_len - 1, -1, -1):
+            for this_play_outs in outs_domains[ii]:
+                backward_counts[ii, this_play_outs:] += backward_counts[ii + 1, :4 - this_play_outs]
+        
+        return forward_counts, backward_counts
+    
+    
+    def _get_outs_options_per_play(self, outs_domains, forward_counts, backward_counts):
+        """
+        For each play, the number of valid sequences where that play has 0, 1, 2, or 3 outs
+        
+        Returns:
+            a (n_plays, 4) array, a play's outs are uniquely determined when only one of its columns isn't 0
+        
+        """
+        seq_len = len(outs_domains)
+        
+        outs_options = np.zeros((seq_len, 4), dtype=np.int64)
+        
+        for ii in range(seq_len):
+            for this_play_outs in outs_domains[ii]:
+                # the plays before make prev_outs, the plays after make up the rest
+                outs_options[ii, this_play_outs] = sum(
+                    forward_counts[ii, prev_outs] * backward_counts[ii + 1, 3 - prev_outs - this_play_outs] 
+                    for prev_outs in range(4 - this_play_outs)
+                )
+        
+        return outs_options
+    
+    
+    def _enumerate_outs_sequences(self, outs_domains, backward_counts, limit=None):
+        """
+        Yields every valid sequence of this_play_outs for a half inning, in the order the solver would find them
+        
+        Only steps into a play's option when backward_counts says the rest of the half can still make 3 outs,
+        so it never hits a dead end
+        
+        """
+        seq_len = len(outs_domains)
+        
+        if backward_counts[0, 3] == 0:
+            return
+        
+        n_yielded = 0
+        
+        # each entry is (play index, outs left, the sequence so far)
+        to_visit = [(0, 3, [])]
+        
+        while len(to_visit):
+            ii, outs_left, this_seq = to_visit.pop()
+            
+            if ii == seq_len:
+                yield this_seq
+                
+                n_yielded += 1
                 
-                # the next prev_play_outs is the sum of all previous this_play_outs
-                temp_sum = 0 if empty_cell_index == 0 else sum(seq[empty_cell_index - 1, :])
-                seq[empty_cell_index, 0] = temp_sum
+                if limit is not None and n_yielded >= limit:
+                    return
+                
+                continue
+            
+            # reversed so the fewest outs comes off the stack first
+            for this_play_outs in reversed(outs_domains[ii]):
+                if this_play_outs <= outs_left and backward_counts[ii + 1, outs_left - this_play_outs] > 0:
+                    to_visit.append((ii + 1, outs_left - this_play_outs, this_seq + [this_play_outs]))
+    
+    
+    def _solve_outs_sequence(self, half_inning_df, seq, half_inning_state=None, outs_domains=None):
+        """
+        Solves an outs sequence, filling seq in place 
+
+        The options for each play don't depend on the other plays, only the total does (it has to be 3), 
+        so first find the options for each play, then count backwards how many ways the rest of the half can make each total.
+        Then walk forwards taking the fewest outs that can still get to 3 -- this is the same answer the old
+        recursive search found, but it can't back itself into a corner so it is at most 4 checks per play
+        
+        Returns:
+            True if it found a valid sequence, False if there isn't one (and seq is left as nans)
+        
+        """
+        if outs_domains is None:
+            if half_inning_state is None:
+                # pull everything out of the df once, not at every step
+                half_inning_state = self._get_half_inning_state(half_inning_df)
+
+            outs_domains = self._get_outs_domains(half_inning_df, seq, half_inning_state)
 
-                if self._solve_outs_sequence(half_inning_df, seq):
-                    # you did it! you have a valid sequence of outs
-                    return True
+        _, backward_counts = self._count_outs_sequences(outs_domains)
 
-                seq[empty_cell_index, 0] = np.nan
-                seq[empty_cell_index, 1] = np.nan
+        # the first valid sequence
+        first_seq = next(self._enumerate_outs_sequences(outs_domains, backward_counts, limit=1), None)
 
-        return False
+        if first_seq is None:
+            # no way to assign outs to this half inning
+            seq[:, :] = np.nan
+            
+            return False
+
+        # the prev_outs is the sum of all previous this_play_outs
+        seq[:, 1] = first_seq
+        seq[:, 0] = np.cumsum([0] + first_seq[:-1])
+
+        return True
 
     
-    def impute_outs(self, game_info_df, verbose = False):
+    def impute_outs(self, game_info_df, verbose = False, game_events_df=None):
         """
         The function that actually invokes the outs sequence solver
         
+        game_events_df is where the HRs and flyouts come from, defaults to self.game_events_df
         
         """
         # TODO: consider making this a part of the game_info_table
         which_innings_are_valid = {}
+        
+        # look these up once, not at every step of the search
+        self._get_outs_event_sets(recompute=True, game_events_df=game_events_df)
 
         full_game = game_info_df.copy()
         
         # make an array to store all of these
         running_outs_seq = np.full((full_game.shape[0], 2), -99)
+        
+        # how many valid outs sequences each half has, and whether each play has the same outs in all of them
+        running_n_outs_seqs = np.zeros(full_game.shape[0], dtype=np.int64)
+        running_outs_are_unique = np.zeros(full_game.shape[0], dtype=np.int64)
+        
         running_index = 0
         
         # there could be a different amounts of innings in a game 
@@ -1397,7 +2577,16 @@ class Game:
                 if verbose:
                     print(outs_seq.shape)
 
-                self._solve_outs_sequence(this_half, outs_seq)
+                this_half_state = self._get_half_inning_state(this_half)
+                outs_domains = self._get_outs_domains(this_half, outs_seq, this_half_state)
+
+                forward_counts, backward_counts = self._count_outs_sequences(outs_domains)
+                outs_options = self._get_outs_options_per_play(outs_domains, forward_counts, backward_counts)
+
+                is_solved = self._solve_outs_sequence(this_half, outs_seq, outs_domains=outs_domains)
+
+                if verbose and not is_solved:
+                    print("No valid outs sequence for the {} of {}".format(which_half, inning))
 
                 try: 
                     assert sum(outs_seq[:, 1]) == 3
@@ -1417,32 +2606,121 @@ class Game:
 
                 # fill in this sequence into the array
                 running_outs_seq[(running_index): (running_index + outs_seq.shape[0]), :] = outs_seq
+                running_n_outs_seqs[(running_index): (running_index + outs_seq.shape[0])] = backward_counts[0, 3]
+                running_outs_are_unique[(running_index): (running_index + outs_seq.shape[0])] = (
+                    (is_solved) & ((outs_options > 0).sum(axis=1) == 1)
+                )
 
                 running_index += outs_seq.shape[0]
-                which_innings_are_valid[str(inning) + "_" + which_half] = True
+                # an inning that couldn't be solved is left as False
+                which_innings_are_valid[str(inning) + "_" + which_half] = is_solved
 
         # assign the array back to those cols in the df
         full_game.loc[:, ["prev_outs", "this_play_outs"]] = running_outs_seq
+        full_game["n_outs_seqs"] = running_n_outs_seqs
+        full_game["outs_are_unique"] = running_outs_are_unique
 
         return full_game, which_innings_are_valid
 
         
-    def collect_all_timestamps(self, ball_df, player_df, game_events_df, cols = ["play_id", "timestamp"]):
+    def get_all_outs_sequences(self, inning, top_bottom_inning, limit=None):
+        """
+        Every outs sequence for a half inning that passes the outs solver's rules, the first one is the one in game_info_df
+        
+        Params:
+            inning: (int)
+            top_bottom_inning: (str)
+                - "Top" or "Bottom"
+            limit: (int or None)
+                - stop after this many sequences, there can be a lot on a half inning with bad data
+        
+        Returns:
+            a (n_seqs, n_plays) np.array of this_play_outs, in the same order as the half inning in game_info_df
+        
+        """
+        this_half = self.game_info_df.loc[
+            (self.game_info_df["inning"] == inning) & (self.game_info_df["top_bottom_inning"] == top_bottom_inning), :
+        ]
+        
+        # the seq only gets used for its shape here
+        outs_seq = np.full((this_half.shape[0], 2), np.nan)
+        
+        outs_domains = self._get_outs_domains(this_half, outs_seq, self._get_half_inning_state(this_half))
+        
+        _, backward_counts = self._count_outs_sequences(outs_domains)
+        
+        all_seqs = list(self._enumerate_outs_sequences(outs_domains, backward_counts, limit=limit))
+        
+        return np.array(all_seqs, dtype=np.int64).reshape(len(all_seqs), this_half.shape[0])
+    
+    
+    def collect_all_timestamps(self, ball_df, player_df, game_events_df, cols = ["play_id", "timestamp"], return_index=False):
         """
         A utility function for identifying all the timestamps across the different files
         for convenience when making a gif, etc
         
+        each play's timestamps are the sorted union of that play's timestamps in ball_df, player_df and game_events_df, 
+        the dfs don't have to be sorted
         
         can be used outside of the obejct too
+        
+        Returns:
+            a df of cols sorted by play and timestamp, 
+            with return_index=True it also returns a dict of play_id -> (start, stop) like _build_play_index
         """
-
-        timestamp_df = pd.concat([
-            self.new_ball_pos[cols],
-            self.new_player_pos[cols], 
-            self.game_events_df[cols]
-        ]).groupby("play_id").value_counts().reset_index() 
-
-        timestamp_df = timestamp_df[cols].drop_duplicates().sort_values(cols)
+        play_col, ts_col = cols
+        
+        # the (play, timestamp) pairs of each df, sorted by play and then timestamp
+        sorted_pairs = []
+        
+        for df in [ball_df, player_df, game_events_df]:
+            plays = df[play_col].values
+            timestamps = df[ts_col].values
+            
+            has_both = ~(pd.isnull(plays) | pd.isnull(timestamps))
+            plays, timestamps = plays[has_both], timestamps[has_both]
+            
+            # the prepped tables are already sorted, so only sort the ones that aren't
+            play_steps = np.diff(plays)
+            
+            if not ((play_steps > 0) | ((play_steps == 0) & (np.diff(timestamps) >= 0))).all():
+                order = np.lexsort((timestamps, plays))
+                plays, timestamps = plays[order], timestamps[order]
+            
+            sorted_pairs.append((plays, timestamps))
+        
+        all_plays = np.unique(np.concatenate([plays for plays, _ in sorted_pairs]))
+        
+        # where each play starts and stops in each df
+        play_bounds = [
+            (np.searchsorted(plays, all_plays, side="left"), np.searchsorted(plays, all_plays, side="right")) 
+            for plays, _ in sorted_pairs
+        ]
+        
+        play_timestamps = []
+        
+        for ii in range(len(all_plays)):
+            # a stable sort of sorted runs is just a merge of them
+            this_play_ts = np.sort(np.concatenate([
+                timestamps[starts[ii]:stops[ii]] for (_, timestamps), (starts, stops) in zip(sorted_pairs, play_bounds)
+            ]), kind="stable")
+            
+            play_timestamps.append(this_play_ts[np.r_[True, this_play_ts[1:] != this_play_ts[:-1]]])
+        
+        counts = np.array([len(this_play_ts) for this_play_ts in play_timestamps], dtype=np.int64)
+        stops = np.cumsum(counts)
+        
+        timestamp_df = pd.DataFrame({
+            play_col : np.repeat(all_plays, counts), 
+            ts_col : np.concatenate(play_timestamps) if len(play_timestamps) else sorted_pairs[0][1][:0]
+        })
+        
+        play_index = {
+            play_id : (stop - count, stop) for play_id, count, stop in zip(all_plays.tolist(), counts.tolist(), stops.tolist())
+        }
+        
+        if return_index:
+            return timestamp_df, play_index
         
         return timestamp_df
         
@@ -1452,7 +2730,7 @@ class Game:
         returns the play_per_game value from a play_id
         """
         
-        return self.play_id_to_per_game_mapper.loc[self.play_id_to_per_game_mapper["play_id"] == play_id, "play_per_game"].values[0]
+        return self.pid_to_ppg[play_id]
     
     
     def get_pid_from_ppg(self, play_per_game):
@@ -1460,7 +2738,7 @@ class Game:
         returns the play_id value from a play_per_game
         """
         
-        return self.play_id_to_per_game_mapper.loc[self.play_id_to_per_game_mapper["play_per_game"] == play_per_game, "play_id"].values[0]
+        return self.ppg_to_pid[play_per_game]
      
         
     def get_play_id_and_ppg_for_event(self, event, **kwargs):
@@ -1476,35 +2754,60 @@ class Game:
         # all balls that are acquired by outfielders and end the play
         self.get_play_id_and_ppg_for_event("ball acquired", player_position=[7, 8, 9], next_event="end of play")
         """
-        event_indices = self.game_events_df["event"] == event
+        
+        return self._find_plays_with_event(self.game_events_df, event, **kwargs)
+    
+    
+    def _find_plays_with_event(self, game_events_df, event, **kwargs):
+        """
+        get_play_id_and_ppg_for_event, on any game_events_df
+        
+        """
+        event_indices = game_events_df["event"] == event
 
         if len(kwargs) != 0:
 
             for k,v in kwargs.items():
 
                 if type(v) is list:                
-                    event_indices = (event_indices) & (self.game_events_df[k].isin(v))
+                    event_indices = (event_indices) & (game_events_df[k].isin(v))
 
                 else:
-                    event_indices = (event_indices) & (self.game_events_df[k] == v)
+                    event_indices = (event_indices) & (game_events_df[k] == v)
 
-        return self.game_events_df.loc[event_indices, ["play_id", "play_per_game"]].drop_duplicates()
+        return game_events_df.loc[event_indices, ["play_id", "play_per_game"]].drop_duplicates()
     
         
-    def get_this_play_ts(self, play_id):
+    def get_this_play_ts(self, play_id, on_clock=False):
         """
         a util for returning a specific play's timestamps
+        
+        on_clock=True gives the ticks from resample_to_clock instead
         """
         
-        return self.timestamp_df.loc[self.timestamp_df["play_id"] == play_id, "timestamp"].values
+        if on_clock:
+            start, stop = self.clock_timestamp_play_index.get(play_id, (0, 0))
+            
+            return self.clock_timestamp["timestamp"].values[start:stop]
+        
+        start, stop = self.timestamp_play_index.get(play_id, (0, 0))
+        
+        return self.timestamp_df["timestamp"].values[start:stop]
 
     
-    def get_this_play(self, play_id, which):
+    def get_this_play(self, play_id, which, on_clock=False):
+        
+        if on_clock and which in ["ball_pos", "player_pos", "game_events"]:
+            # the tables from resample_to_clock
+            start, stop = getattr(self, "clock_" + which + "_play_index").get(play_id, (0, 0))
+            return getattr(self, "clock_" + which).iloc[start:stop]
         
         if which == "ball_pos":
-            return self.new_ball_pos.loc[self.new_ball_pos["play_id"] == play_id, :]
+            start, stop = self.ball_pos_play_index.get(play_id, (0, 0))
+            return self.new_ball_pos.iloc[start:stop]
         elif which == "player_pos":
-            return self.new_player_pos.loc[self.new_player_pos["play_id"] == play_id, :]
+            start, stop = self.player_pos_play_index.get(play_id, (0, 0))
+            return self.new_player_pos.iloc[start:stop]
         elif which == "game_info":
             
             # play per game, and play_id are different! 
@@ -1512,5 +2815,26 @@ class Game:
             return self.game_info_df.loc[self.game_info_df["play_per_game"] == self.get_ppg_from_pid(play_id), :]
         
         elif which == "game_events":
-            return self.game_events_df.loc[self.game_events_df["play_id"] == play_id, :]
-        
\ No newline at end of file
+            start, stop = self.game_events_play_index.get(play_id, (0, 0))
+            return self.game_events_df.iloc[start:stop]
+    
+    
+    def get_play_window(self, play_id, df, start_ts, end_ts):
+        """
+        returns the rows of a play where start_ts <= timestamp <= end_ts
+        
+        df can be "ball_pos", "player_pos", "game_events", the same with "clock_" in front for the resample_to_clock tables, 
+        or a df with play_id and timestamp cols
+        """
+        
+        if isinstance(df, str):
+            if df.startswith("clock_"):
+                df = getattr(self, df)
+            else:
+                df = {"ball_pos" : self.new_ball_pos, "player_pos" : self.new_player_pos, "game_events" : self.game_events_df}[df]
+        
+        df, play_index = self._get_play_index(df)
+        
+        start, stop = self._find_play_windows([play_id], [start_ts], [end_ts], df["timestamp"].values, play_index)
+        
+        return df.iloc[start[0]:stop[0]]
@@ -5,26 +5,226 @@ import matplotlib.patches as patches
 import matplotlib.pyplot as plt
 from matplotlib.patches import Circle, PathPatch
 from matplotlib.animation import FuncAnimation, PillowWriter
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from mpl_toolkits.mplot3d import Axes3D 
 import mpl_toolkits.mplot3d.art3d as art3d
 import matplotlib as mpl
 import numpy as np 
 import pandas as pd 
+import os
+import shutil
+import subprocess
+import tempfile
+from PIL import Image, GifImagePlugin
+
+try:
+    # only used to write videos when ffmpeg isn't on the path (imageio-ffmpeg comes with its own)
+    import imageio.v2 as imageio
+except ImportError:
+    imageio = None
 
 from src.game import Game
 
+
+# the ffmpeg output args for each kind of file FrameEncoder can write
+# mp4 and webm need even widths and heights for yuv420p
+# gifs use a palette picked from the first frame (the second input, see FrameEncoder._open), 
+# palettegen would have ffmpeg hold onto every frame until it saw the last one
+ENCODER_ARGS = {
+    "mp4" : ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-c:v", "libx264", "-pix_fmt", "yuv420p"],
+    "webm" : ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-c:v", "libvpx-vp9", "-pix_fmt", "yuv420p", "-b:v", "0", "-crf", "32"],
+    "gif" : ["-lavfi", "[0:v][1:v]paletteuse=dither=none", "-loop", "0"],
+}
+
+
+def _gif_palette(frame):
+    """
+    the 256 colors every frame of a gif gets drawn with, picked from the first frame 
+    (the field, players, ball, and event text are all on it), so the gif can be written a frame at a time
+    
+    Returns:
+        a "P" mode PIL Image to quantize the frames with
+    
+    """
+    return Image.fromarray(np.ascontiguousarray(frame[:, :, :3], dtype=np.uint8)).quantize(colors=256)
+
+
+class FrameEncoder:
+    """
+    Writes RGBA frames (like the ones from Baseball_Field.iter_frames) to a gif, mp4, or webm one at a time, 
+    so memory doesn't grow with the length of the play
+    
+    Uses an ffmpeg subprocess if ffmpeg is on the path, then imageio if it is installed. 
+    If neither is around gifs still get written a frame at a time with Pillow. 
+    Gifs use one palette picked from the first frame (see _gif_palette)
+    
+    Use it like:
+        with FrameEncoder("play.mp4", fps=20) as encoder:
+            for frame in bf.iter_frames(play_id):
+                encoder.write(frame)
+    
+    """
+    def __init__(self, file_name, fps=20):
+        
+        self.file_name = file_name
+        self.fps = fps
+        
+        self.fmt = os.path.splitext(file_name)[1].lstrip(".").lower()
+        
+        if self.fmt not in ENCODER_ARGS:
+            raise ValueError("Can only write {} files, not {}".format(sorted(ENCODER_ARGS), file_name))
+        
+        self._ffmpeg_process = None
+        self._imageio_writer = None
+        self._pillow_file = None
+        
+        self._gif_palette = None
+        self._palette_path = None
+        
+    def _open(self, frame):
+        """
+        starts the encoder, this waits for the first frame to know how big the frames are
+        
+        """
+        height, width = frame.shape[:2]
+        
+        if self.fmt == "gif":
+            self._gif_palette = _gif_palette(frame)
+        
+        if shutil.which("ffmpeg") is not None:
+            ffmpeg_cmd = [
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-f", "rawvideo", "-pix_fmt", "rgba", "-s", "{}x{}".format(width, height), "-r", str(self.fps),
+                "-i", "-"
+            ]
+            
+            if self.fmt == "gif":
+                # paletteuse wants the palette as a 16x16 image
+                palette_colors = np.zeros((256, 3), dtype=np.uint8)
+                used_colors = np.array(self._gif_palette.getpalette()[:768], dtype=np.uint8).reshape(-1, 3)
+                palette_colors[:len(used_colors)] = used_colors
+                
+                palette_fd, self._palette_path = tempfile.mkstemp(suffix=".png")
+                os.close(palette_fd)
+                
+                Image.fromarray(palette_colors.reshape(16, 16, 3), "RGB").save(self._palette_path)
+                
+                ffmpeg_cmd += ["-i", self._palette_path]
+            
+            ffmpeg_cmd += ENCODER_ARGS[self.fmt] + [self.file_name]
+            
+            self._ffmpeg_process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE)
+        
+        elif imageio is not None and self.fmt != "gif":
+            self._imageio_writer = imageio.get_writer(self.file_name, fps=self.fps, macro_block_size=1)
+        
+        elif self.fmt == "gif":
+            # write the header now, then each frame gets added to the end of the file as it comes in
+            self._pillow_file = open(self.file_name, "wb")
+            
+            header, _ = GifImagePlugin.getheader(self._quantize(frame), info={"loop" : 0, "optimize" : False})
+            
+            for block in header:
+                self._pillow_file.write(block)
+        
+        else:
+            raise RuntimeError("Need ffmpeg or imageio to write {} files".format(self.fmt))
+    
+    def _quantize(self, frame):
+        """
+        a frame as a "P" mode PIL Image drawn with the gif's palette
+        
+        """
+        frame_image = Image.fromarray(np.ascontiguousarray(frame[:, :, :3], dtype=np.uint8))
+        
+        return frame_image.quantize(palette=self._gif_palette, dither=Image.Dither.NONE)
+        
+    def write(self, frame):
+        """
+        adds an (height, width, 4) RGBA np.array to the end of the file
+        
+        """
+        if self._ffmpeg_process is None and self._imageio_writer is None and self._pillow_file is None:
+            self._open(frame)
+        
+        if self._ffmpeg_process is not None:
+            self._ffmpeg_process.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+        
+        elif self._imageio_writer is not None:
+            self._imageio_writer.append_data(frame[:, :, :3])
+        
+        else:
+            for block in GifImagePlugin.getdata(self._quantize(frame), duration=int(1000 / self.fps)):
+                self._pillow_file.write(block)
+    
+    def close(self):
+        """
+        finishes the file
+        
+        """
+        ffmpeg_process, self._ffmpeg_process = self._ffmpeg_process, None
+        
+        try:
+            if ffmpeg_process is not None:
+                try:
+                    ffmpeg_process.stdin.close()
+                
+                except BrokenPipeError:
+                    # ffmpeg already quit, the return code says why
+                    pass
+                
+                if ffmpeg_process.wait() != 0:
+                    raise RuntimeError("ffmpeg failed writing {}".format(self.file_name))
+            
+            if self._imageio_writer is not None:
+                imageio_writer, self._imageio_writer = self._imageio_writer, None
+                imageio_writer.close()
+            
+            if self._pillow_file is not None:
+                pillow_file, self._pillow_file = self._pillow_file, None
+                
+                # the gif trailer
+                pillow_file.write(b";")
+                pillow_file.close()
+        
+        finally:
+            if self._palette_path is not None:
+                os.remove(self._palette_path)
+                self._palette_path = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+            
+            return
+        
+        # something already went wrong, don't swap that error out for one about the half written file
+        try:
+            self.close()
+        
+        except Exception:
+            pass
+
+
 class Baseball_Field:
     # originally inspired by this!
     # https://www.kaggle.com/code/debojit23/baseball-field-structure-matplotlib
-    def __init__(self, which_game, figsize=(12,12), which_outs=["full_seq", "at_first"]):
+    def __init__(self, which_game, figsize=(12,12), which_outs=["full_seq", "at_first"], cache_dir=None, file_path="data/", game_obj=None, verbose=False):
         
         plt.ioff()
+        self.verbose = verbose
         self.figsize = figsize
         self.fig, self.ax = self.plot_2d_field()
         
         # a Game object takes all of the data for a given game
         # and does common data cleaning tasks
-        self.game_obj = Game(which_game, which_outs=which_outs)
+        if game_obj is None:
+            game_obj = Game(which_game, file_path=file_path, which_outs=which_outs, cache_dir=cache_dir)
+        
+        self.game_obj = game_obj
         
         
         # these are needed so you can clear some of the figure, but not all
@@ -215,21 +415,281 @@ class Baseball_Field:
         return self.fig 
         
         
-    def create_gif(self, play_id, file_path="image_outputs/", tag=""):
+    def create_gif(self, play_id, file_path="image_outputs/", tag="", show_velos=False, blit=False, on_clock=False):
+        """
+        Makes a gif of a play
+        
+        Params:
+            blit: (bool)
+                - draw the field once and only draw the players, ball and events on top of it for each frame (see iter_frames), 
+                  this is a lot faster, but the players and ball end up on top of the grid lines instead of under them
+            on_clock: (bool)
+                - use the data resampled onto a fixed clock (see Game.resample_to_clock) so every frame has the ball and players
+        
+        Returns:
+            the file name it was saved to
+        
+        """
         
         # Need to gather all of the timestamps (in a way that is robust to smoothing/snapping)
-        # create a function? I think this should be plot_all_components
+        # slice the play up once, then each frame just moves the artists around
         
-        frames = self.game_obj.get_this_play_ts(play_id)
+        file_name = file_path + self.game_obj.which_game + "_play" + str(play_id) + tag + ".gif"
+        
+        if blit:
+            # 20 fps is the same as the 50 ms interval below
+            return self.create_video(play_id, file_path=file_path, tag=tag, fmt="gif", fps=20, show_velos=show_velos, on_clock=on_clock)
+        
+        play_frames = self._get_play_frames(play_id, on_clock=on_clock)
+        
+        self._init_gif_artists(play_frames, show_velos=show_velos)
 
-        ani = FuncAnimation(self.fig, self._gif_writer, fargs=(play_id,), frames=len(frames),
+        ani = FuncAnimation(self.fig, self._gif_frame_writer, fargs=(play_frames, show_velos), frames=len(play_frames["frames"]),
                     interval=50, repeat=True, repeat_delay = 1500)
-            
-        file_name = file_path + self.game_obj.which_game + "_play" + str(play_id) + tag + ".gif"
         
         ani.save(file_name, dpi=100)
         
+        return file_name
         
+    
+    def create_video(self, play_id, file_path="image_outputs/", tag="", fmt="mp4", fps=20, dpi=100, show_velos=False, on_clock=False):
+        """
+        Streams a play's frames (from iter_frames) straight into a gif, mp4, or webm with a FrameEncoder
+        
+        Params:
+            fmt: (str)
+                - "gif", "mp4", or "webm"
+            fps, dpi: (int)
+                - frames per second and resolution, the default figsize and dpi give 1200x1200 frames
+        
+        Returns:
+            the file name it was saved to
+        
+        """
+        file_name = file_path + self.game_obj.which_game + "_play" + str(play_id) + tag + "." + fmt
+        
+        with FrameEncoder(file_name, fps=fps) as encoder:
+            for frame in self.iter_frames(play_id, show_velos=show_velos, dpi=dpi, on_clock=on_clock):
+                encoder.write(frame)
+        
+        return file_name
+    
+    
+    def iter_frames(self, play_id, show_velos=False, dpi=100, on_clock=False):
+        """
+        Yields each frame of a play as an (height, width, 4) RGBA np.array
+        
+        The field never changes, so it gets drawn once and saved as a background,
+        then each frame is the background with just the players, ball, and event text drawn on top
+        
+        The frames get drawn on an Agg canvas of their own, the figure gets its canvas (and dpi) back when it's done
+        
+        """
+        play_frames = self._get_play_frames(play_id, on_clock=on_clock)
+        
+        self._init_gif_artists(play_frames, show_velos=show_velos)
+        
+        moving_artists = [self.fielders_artist, self.batters_artist, self.ball_artist] + self.event_annotation_artist
+        
+        if show_velos:
+            moving_artists += [self.fielders_velo_artist, self.batters_velo_artist]
+        
+        # making the Agg canvas swaps it into the figure, so hold onto what the figure had
+        old_canvas = self.fig.canvas
+        old_dpi = self.fig.dpi
+        old_original_dpi = getattr(self.fig, "_original_dpi", old_dpi)
+        
+        # an Agg canvas of our own can save the background, and drawing on it doesn't touch the caller's window, 
+        # it has no window, so changing the dpi doesn't resize anything either
+        canvas = FigureCanvasAgg(self.fig)
+        self.fig.set_dpi(dpi)
+        
+        # animated artists get skipped by draw, so this only draws the field
+        for artist in moving_artists:
+            artist.set_animated(True)
+        
+        try:
+            canvas.draw()
+            background = canvas.copy_from_bbox(self.fig.bbox)
+            
+            for i in range(len(play_frames["frames"])):
+                self._gif_frame_writer(i, play_frames, show_velos)
+                
+                canvas.restore_region(background)
+                
+                for artist in moving_artists:
+                    self.ax.draw_artist(artist)
+                
+                yield np.asarray(canvas.buffer_rgba()).copy()
+                
+        finally:
+            for artist in moving_artists:
+                artist.set_animated(False)
+            
+            self.fig.set_dpi(old_dpi)
+            self.fig.set_canvas(old_canvas)
+            
+            # the Agg canvas reset this, GUI backends use it to scale the dpi for hi-res screens
+            self.fig._original_dpi = old_original_dpi
+        
+    
+    def _get_play_frames(self, play_id, on_clock=False):
+        """
+        slices a play up into what gets drawn on each frame, so making a gif only looks at this play's data once
+        
+        on_clock=True uses the tables from Game.resample_to_clock (at 30 hz if the game hasn't been resampled yet)
+        
+        Returns:
+            a dict with the frames (timestamps), and for each frame the fielders, batters and ball as arrays 
+            (views into the play's data) and the event text (None if there isn't an event)
+        
+        """
+        if on_clock and self.game_obj.resample_hz is None:
+            self.game_obj.resample_to_clock()
+        
+        frames = self.game_obj.get_this_play_ts(play_id, on_clock=on_clock)
+        
+        this_play_pos_data = self.game_obj.get_this_play(play_id, "player_pos", on_clock=on_clock)
+        this_play_ball_data = self.game_obj.get_this_play(play_id, "ball_pos", on_clock=on_clock)
+        this_play_events = self.game_obj.get_this_play(play_id, "game_events", on_clock=on_clock)
+        
+        play_frames = {"frames" : frames}
+        
+        for which, is_these_players in [
+            ("fielders", this_play_pos_data["player_position"] <= 9), 
+            ("batters", (this_play_pos_data["player_position"] >= 10) & (this_play_pos_data["player_position"] <= 13))
+        ]:
+            these_players = this_play_pos_data.loc[is_these_players]
+            
+            # everything is sorted by timestamp within a play, so each frame is one slice
+            starts = np.searchsorted(these_players["timestamp"].values, frames, side="left")
+            stops = np.searchsorted(these_players["timestamp"].values, frames, side="right")
+            
+            xy = these_players[["field_x", "field_y"]].to_numpy(dtype=float)
+            velo = these_players[["velo_x", "velo_y"]].to_numpy(dtype=float)
+            
+            play_frames[which + "_xy"] = [xy[start:stop] for start, stop in zip(starts, stops)]
+            play_frames[which + "_velo"] = [velo[start:stop] for start, stop in zip(starts, stops)]
+            
+            if which == "fielders" and self.verbose:
+                for ts, start, stop in zip(frames, starts, stops):
+                    if 0 < stop - start < 9:
+                        print("missing fielders data at timestamp")
+                        print(str(these_players.iloc[start:stop].loc[:, ["timestamp", "player_position"]]))
+        
+        # the ball is only ever the first row at a timestamp
+        ball_starts = np.searchsorted(this_play_ball_data["timestamp"].values, frames, side="left")
+        has_ball = ball_starts < np.searchsorted(this_play_ball_data["timestamp"].values, frames, side="right")
+        
+        ball_xyz = this_play_ball_data[["ball_position_x", "ball_position_y", "ball_position_z"]].to_numpy(dtype=float)
+        
+        ball_scale_factor = 1
+        
+        play_frames["ball_xy"] = [ball_xyz[start:start + 1, :2] if any_ball else ball_xyz[:0, :2] for start, any_ball in zip(ball_starts, has_ball)]
+        play_frames["ball_size"] = [
+            (ball_xyz[start, 2] ** 2 * ball_scale_factor if ball_xyz[start, 2] > 5 else 5 ** 2 * ball_scale_factor) if any_ball else None 
+            for start, any_ball in zip(ball_starts, has_ball)
+        ]
+        
+        # same for the events
+        event_starts = np.searchsorted(this_play_events["timestamp"].values, frames, side="left")
+        has_event = event_starts < np.searchsorted(this_play_events["timestamp"].values, frames, side="right")
+        
+        event_texts = (
+            this_play_events["timestamp"].astype(str) + ": " + 
+            this_play_events["event"].astype(str) + " by " + 
+            this_play_events["player_position"].astype(str)
+        ).values
+        
+        play_frames["event_text"] = [event_texts[start] if any_event else None for start, any_event in zip(event_starts, has_event)]
+        
+        return play_frames
+    
+    
+    def _init_gif_artists(self, play_frames, show_velos=False):
+        """
+        makes the (empty) artists that _gif_frame_writer moves around, instead of making new ones every frame
+        
+        """
+        self.clear_plot()
+        
+        empty_xy = np.empty((0, 2))
+        
+        # the same order as plot_all_components so the layering is the same
+        for which, color in [("fielders", "yellow"), ("batters", "black")]:
+            setattr(self, which + "_artist", self.ax.scatter(empty_xy[:, 0], empty_xy[:, 1], color=color, marker='o', s=80))
+            
+            if show_velos:
+                # quivers can't change how many arrows they have, so make enough for the busiest frame and hide the extras with nans
+                max_players = max([1] + [xy.shape[0] for xy in play_frames[which + "_xy"]])
+                all_nans = np.full(max_players, np.nan)
+                
+                setattr(self, which + "_velo_artist", self.ax.quiver(all_nans, all_nans, all_nans, all_nans, color=color, angles="xy"))
+        
+        self.ball_artist = self.ax.scatter(empty_xy[:, 0], empty_xy[:, 1], color="white", marker='o', s=25)
+        
+        self.event_annotation_artist = [self.ax.annotate("", (100, 10))]
+        
+        
+    def _gif_frame_writer(self, i, play_frames, show_velos=False):
+        """
+        moves the artists from _init_gif_artists to frame i
+        
+        """
+        velo_scale_factor = 0.2
+        
+        for which in ["fielders", "batters"]:
+            this_ts_xy = play_frames[which + "_xy"][i]
+            
+            getattr(self, which + "_artist").set_offsets(this_ts_xy)
+            
+            if show_velos:
+                velo_artist = getattr(self, which + "_velo_artist")
+                
+                n_arrows = velo_artist.N
+                n_players = this_ts_xy.shape[0]
+                
+                padded_xy = np.full((n_arrows, 2), np.nan)
+                padded_velo = np.full((n_arrows, 2), np.nan)
+                
+                padded_xy[:n_players] = this_ts_xy
+                padded_velo[:n_players] = velo_scale_factor * play_frames[which + "_velo"][i]
+                
+                velo_artist.set_offsets(padded_xy)
+                velo_artist.set_UVC(padded_velo[:, 0], padded_velo[:, 1])
+                
+                # autoscale the arrows again on the next draw, like the new quiver add_fielders_to_plot makes each frame
+                # (the nan arrows get left out of the autoscale)
+                velo_artist.scale = None
+        
+        self.ball_artist.set_offsets(play_frames["ball_xy"][i])
+        
+        if play_frames["ball_size"][i] is not None:
+            self.ball_artist.set_sizes([play_frames["ball_size"][i]])
+        
+        # the last event stays up until there is a new one
+        if i == 0 or play_frames["event_text"][i] is not None:
+            self.event_annotation_artist[0].set_text(play_frames["event_text"][i] or "")
+        
+        return self.fig 
+        
+
+    def _get_fielders_at_ts(self, play_id, timestamp):
+        """
+        the fielders at a given timestamp, only looks inside this play
+        """
+        this_ts_players = self.game_obj.get_play_window(play_id, "player_pos", timestamp, timestamp)
+        
+        return this_ts_players.loc[this_ts_players["player_position"] <= 9, ["timestamp", "player_position", "field_x", "field_y", "velo_x", "velo_y"]]
+    
+    def _get_batters_at_ts(self, play_id, timestamp):
+        """
+        the batter and baserunners at a given timestamp, only looks inside this play
+        """
+        this_ts_players = self.game_obj.get_play_window(play_id, "player_pos", timestamp, timestamp)
+        
+        return this_ts_players.loc[(this_ts_players["player_position"] >= 10) &\
+                                   (this_ts_players["player_position"] <= 13), ["timestamp", "player_position", "field_x", "field_y", "velo_x", "velo_y"]]
 
     def remove_fielders_from_plot(self):
         
@@ -266,32 +726,26 @@ class Baseball_Field:
         if play_id and (type(frame_index) != int) and (not timestamp):
             # this means to plot the whole play
             # this will ignore show_vectors and show_trails
-            this_play_pos_data = self.game_obj.new_player_pos.loc[(self.game_obj.new_player_pos["play_id"] == play_id) &\
-                                                                  (self.game_obj.new_player_pos["player_position"] <= 9), ["timestamp", "player_position", "field_x", "field_y", "velo_x", "velo_y"]].copy()
+            this_play_pos_data = self.game_obj.get_this_play(play_id, "player_pos")
+            this_play_pos_data = this_play_pos_data.loc[this_play_pos_data["player_position"] <= 9, ["timestamp", "player_position", "field_x", "field_y", "velo_x", "velo_y"]]
             
             # make the size smaller if plotting all
             self.fielders_artist = self.ax.scatter(this_play_pos_data["field_x"], this_play_pos_data["field_y"], color=color, marker='o', s=30)
             return
         elif timestamp:
-            this_play_pos_data = self.game_obj.new_player_pos.loc[(self.game_obj.new_player_pos["play_id"] == play_id) &\
-                                                                  (self.game_obj.new_player_pos["player_position"] <= 9), ["timestamp", "player_position", "field_x", "field_y", "velo_x", "velo_y"]].copy()
-            
-            this_ts_fielders = this_play_pos_data.loc[this_play_pos_data["timestamp"] == timestamp]
+            this_ts_fielders = self._get_fielders_at_ts(play_id, timestamp)
             
         elif type(frame_index) == int:
             frames = self.game_obj.get_this_play_ts(play_id)
             
-            this_play_pos_data = self.game_obj.new_player_pos.loc[(self.game_obj.new_player_pos["play_id"] == play_id) &\
-                                                                  (self.game_obj.new_player_pos["player_position"] <= 9), ["timestamp", "player_position", "field_x", "field_y", "velo_x", "velo_y"]].copy()
-            
-            this_ts_fielders = this_play_pos_data.loc[this_play_pos_data["timestamp"] == frames[frame_index]]
+            this_ts_fielders = self._get_fielders_at_ts(play_id, frames[frame_index])
 
             
         # if there is nothing in this timestamp, just quit and leave it
         if this_ts_fielders.shape[0] == 0:    
             return
         
-        elif this_ts_fielders.shape[0] < 9:
+        elif this_ts_fielders.shape[0] < 9 and self.verbose:
             print("missing fielders data at timestamp")
             print(str(this_ts_fielders.loc[:, ["timestamp", "player_position"]]))
         
@@ -341,29 +795,20 @@ class Baseball_Field:
             # this means to plot the whole play
             # this will ignore show_vectors and show_trails
             
-            this_play_pos_data = self.game_obj.new_player_pos.loc[(self.game_obj.new_player_pos["play_id"] == play_id) &\
-                                                                  (self.game_obj.new_player_pos["player_position"] >= 10) &\
-                                                                  (self.game_obj.new_player_pos["player_position"] <= 13), ["timestamp", "player_position", "field_x", "field_y", "velo_x", "velo_y"]].copy()
+            this_play_pos_data = self.game_obj.get_this_play(play_id, "player_pos")
+            this_play_pos_data = this_play_pos_data.loc[(this_play_pos_data["player_position"] >= 10) &\
+                                                        (this_play_pos_data["player_position"] <= 13), ["timestamp", "player_position", "field_x", "field_y", "velo_x", "velo_y"]]
             
             # make the size smaller if plotting all
             self.batters_artist = self.ax.scatter(this_play_pos_data["field_x"], this_play_pos_data["field_y"], color=color, marker='o', s=30)
             return
         elif timestamp:
-            this_play_pos_data = self.game_obj.new_player_pos.loc[(self.game_obj.new_player_pos["play_id"] == play_id) &\
-                                                                  (self.game_obj.new_player_pos["player_position"] >= 10) &\
-                                                                  (self.game_obj.new_player_pos["player_position"] <= 13), ["timestamp", "player_position", "field_x", "field_y", "velo_x", "velo_y"]].copy()
-            
-            this_ts_batters = this_play_pos_data.loc[this_play_pos_data["timestamp"] == timestamp]
+            this_ts_batters = self._get_batters_at_ts(play_id, timestamp)
             
         elif type(frame_index) == int:
             frames = self.game_obj.get_this_play_ts(play_id)
-
             
-            this_play_pos_data = self.game_obj.new_player_pos.loc[(self.game_obj.new_player_pos["play_id"] == play_id) &\
-                                                                  (self.game_obj.new_player_pos["player_position"] >= 10) &\
-                                                                  (self.game_obj.new_player_pos["player_position"] <= 13), ["timestamp", "player_position", "field_x", "field_y", "velo_x", "velo_y"]].copy()
-            
-            this_ts_batters = this_play_pos_data.loc[this_play_pos_data["timestamp"] == frames[frame_index]]
+            this_ts_batters = self._get_batters_at_ts(play_id, frames[frame_index])
         
         
         # if there is nothing in this timestamp, just quit and leave it
@@ -416,9 +861,7 @@ class Baseball_Field:
             # this will ignore show_vectors and show_trails
             
             
-            this_play_ball_data = self.game_obj.new_ball_pos.loc[(self.game_obj.new_ball_pos["play_id"] == play_id),
-                                                                 ["timestamp", "ball_position_x", "ball_position_y",
-                                                                  "ball_position_z", "ball_velo_x", "ball_velo_y", "ball_velo_z",]].copy()
+            this_play_ball_data = self.game_obj.get_this_play(play_id, "ball_pos")
             
             z_coords = this_play_ball_data["ball_position_z"].values
             ball_scale_factor = 2
@@ -433,20 +876,12 @@ class Baseball_Field:
                                               )
             return
         elif timestamp:
-            this_play_ball_data = self.game_obj.new_ball_pos.loc[(self.game_obj.new_ball_pos["play_id"] == play_id),
-                                                                 ["timestamp", "ball_position_x", "ball_position_y",
-                                                                  "ball_position_z", "ball_velo_x", "ball_velo_y", "ball_velo_z",]].copy()
-            
-            this_ts_ball_pos = this_play_ball_data.loc[this_play_ball_data["timestamp"] == timestamp]
+            this_ts_ball_pos = self.game_obj.get_play_window(play_id, "ball_pos", timestamp, timestamp)
             
         elif type(frame_index) == int:
             frames = self.game_obj.get_this_play_ts(play_id)
-                        
-            this_play_ball_data = self.game_obj.new_ball_pos.loc[(self.game_obj.new_ball_pos["play_id"] == play_id),
-                                                                 ["timestamp", "ball_position_x", "ball_position_y",
-                                                                  "ball_position_z", "ball_velo_x", "ball_velo_y", "ball_velo_z",]].copy()
             
-            this_ts_ball_pos = this_play_ball_data.loc[this_play_ball_data["timestamp"] == frames[frame_index]]
+            this_ts_ball_pos = self.game_obj.get_play_window(play_id, "ball_pos", frames[frame_index], frames[frame_index])
         
         
         # if there is nothing in this timestamp, just quit and leave it
@@ -490,10 +925,7 @@ class Baseball_Field:
             # this means to plot the whole play
             
             
-            this_play_events = self.game_obj.game_events_df.loc[
-                (self.game_obj.game_events_df["play_id"] == play_id),
-                :
-            ].copy()
+            this_play_events = self.game_obj.get_this_play(play_id, "game_events")
             
             event_descs = this_play_events.apply(
                 lambda row: 
@@ -509,20 +941,14 @@ class Baseball_Field:
             
             
         elif timestamp:
-            this_play_events = self.game_obj.game_events_df.loc[
-                (self.game_obj.game_events_df["play_id"] == play_id),
-                :
-            ].copy()
+            this_play_events = self.game_obj.get_this_play(play_id, "game_events")
             
             this_ts_event = this_play_events.loc[this_play_events["timestamp"] == timestamp]
             
         elif type(frame_index) == int:
             frames = self.game_obj.get_this_play_ts(play_id)
             
-            this_play_events = self.game_obj.game_events_df.loc[
-                (self.game_obj.game_events_df["play_id"] == play_id),
-                :
-            ].copy()
+            this_play_events = self.game_obj.get_this_play(play_id, "game_events")
             
             this_ts_event = this_play_events.loc[
                 this_play_events["timestamp"] == frames[frame_index]
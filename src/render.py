@@ -0,0 +1,177 @@
+# This file contains functions for making gifs of lots of plays at once
+
+import matplotlib.pyplot as plt
+import pandas as pd
+import math
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src.game import Game
+from src.plotting import Baseball_Field
+
+
+# each process keeps one Baseball_Field around, so the figure and field only get made once per process
+_worker_field = None
+
+# and the last Game it built, a game's plays get split into chunks that often land on the same process one after another
+_worker_game = None
+
+
+def _init_render_worker():
+    """
+    runs once in each process, the workers don't have a screen so make sure they use Agg
+    
+    """
+    plt.switch_backend("Agg")
+
+
+def _render_plays(which_game, plays, data_path, file_path, which_outs, cache_dir):
+    """
+    The work that gets done for each chunk of a game's plays, it never raises so one bad game or play can't kill the whole batch
+    
+    Params:
+        plays: (list of tuples)
+            - (play_id, tag) for each gif to make from this game
+    
+    Returns:
+        a list of dicts, one for each play, with how long it took and the traceback if it failed
+    
+    """
+    global _worker_field, _worker_game
+    
+    start_time = time.time()
+    
+    try:
+        if _worker_game is None or _worker_game.which_game != which_game:
+            # let go of the last game before building the next one
+            _worker_game = None
+            _worker_game = Game(which_game, file_path=data_path, which_outs=which_outs, cache_dir=cache_dir)
+        
+    except Exception:
+        error = traceback.format_exc()
+        
+        return [
+            {"game_str" : which_game, "play_id" : play_id, "tag" : tag, "file_name" : None, "secs" : time.time() - start_time, "error" : error}
+            for play_id, tag in plays
+        ]
+    
+    if _worker_field is None:
+        _worker_field = Baseball_Field(which_game, game_obj=_worker_game)
+    elif _worker_field.game_obj is not _worker_game:
+        # reuse the figure, just swap in this game
+        _worker_field.clear_plot()
+        _worker_field.game_obj = _worker_game
+    
+    rendered = []
+    
+    for play_id, tag in plays:
+        play_start_time = time.time()
+        
+        file_name = None
+        error = None
+        
+        try:
+            file_name = _worker_field.create_gif(play_id, file_path=file_path, tag=tag)
+            
+        except Exception:
+            error = traceback.format_exc()
+        
+        rendered.append(
+            {"game_str" : which_game, "play_id" : play_id, "tag" : tag, "file_name" : file_name, "secs" : time.time() - play_start_time, "error" : error}
+        )
+    
+    return rendered
+    
+
+def _chunk_plays(plays, chunk_size):
+    """
+    groups the plays by game (keeping the order they came in) and splits each game's plays into chunks of at most chunk_size
+    
+    Returns:
+        a list of (game_str, list of (play_id, tag)), the chunks of a game are next to each other 
+        so a process often gets the same game again
+    
+    """
+    plays_by_game = {}
+    
+    for which_game, play_id, tag in plays:
+        plays_by_game.setdefault(which_game, []).append((play_id, tag))
+    
+    return [
+        (which_game, game_plays[start:start + chunk_size]) 
+        for which_game, game_plays in plays_by_game.items() 
+        for start in range(0, len(game_plays), chunk_size)
+    ]
+
+
+def render_gifs(plays, file_path="image_outputs/", data_path="data/", workers=None, which_outs=["at_first"], cache_dir=None, verbose=True, chunk_size=None):
+    """
+    Makes a gif for each play, with the plays spread across processes
+    
+    Each game's plays get split into chunks, so a list that is mostly one game still uses all of the processes. 
+    Each process keeps the last game it built, so a game gets built about once per process that works on it
+    
+    Params:
+        plays: (list of tuples)
+            - (game_str, play_id, tag), tag gets added to the end of the file name like in Baseball_Field.create_gif
+        file_path: (str)
+            - where the gifs go
+        data_path: (str)
+            - where your data lives
+        workers: (int or None)
+            - how many processes to use, None uses all of the cores, 1 does everything in this process
+        chunk_size: (int or None)
+            - the most plays from one game a process gets at a time, 
+              None splits the plays evenly across the processes
+        which_outs, cache_dir:
+            - passed to each Game, see Game.__init__
+    
+    Returns:
+        a df with a row for each play, with the file it was saved to, how long it took, and the traceback if it failed
+    
+    """
+    
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(len(plays) / (workers or os.cpu_count() or 1)))
+    
+    chunks = _chunk_plays(plays, chunk_size)
+    
+    rendered = []
+    
+    def collect(game_rendered):
+        rendered.extend(game_rendered)
+        
+        if verbose:
+            for row in game_rendered:
+                print("{} play {} {} in {:.1f}s".format(row["game_str"], row["play_id"], "done" if row["error"] is None else "FAILED", row["secs"]))
+    
+    if workers == 1:
+        for which_game, chunk_plays in chunks:
+            collect(_render_plays(which_game, chunk_plays, data_path, file_path, which_outs, cache_dir))
+    
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker) as executor:
+            futures = [
+                executor.submit(_render_plays, which_game, chunk_plays, data_path, file_path, which_outs, cache_dir) 
+                for which_game, chunk_plays in chunks
+            ]
+            
+            for future in as_completed(futures):
+                collect(future.result())
+    
+    render_report = pd.DataFrame(rendered, columns=["game_str", "play_id", "tag", "file_name", "secs", "error"])
+    
+    # put the report back in the order the plays came in
+    play_order = {(which_game, play_id, tag) : ii for ii, (which_game, play_id, tag) in enumerate(plays)}
+    
+    render_report["play_order"] = [play_order[key] for key in zip(render_report["game_str"], render_report["play_id"], render_report["tag"])]
+    render_report = render_report.sort_values("play_order").drop(columns="play_order").reset_index(drop=True)
+    
+    n_failed = render_report["error"].notnull().sum()
+    
+    if verbose and n_failed:
+        print("{} of {} plays failed".format(n_failed, render_report.shape[0]))
+    
+    return render_report
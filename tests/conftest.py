@@ -0,0 +1,133 @@
+# This file contains the made up games the tests share
+
+import numpy as np
+import pandas as pd
+import os
+
+import pytest
+
+
+def _write_game_csvs(file_path, which_game, tables):
+    """
+    writes a game's csvs where Game looks for them, tables is table name -> df
+    
+    """
+    home_team = which_game.split("_")[-1]
+    season = which_game.split("_")[0]
+    
+    paths = {
+        "game_info" : os.path.join(file_path, "game_info", "game_info-" + which_game + ".csv"),
+        "game_events" : os.path.join(file_path, "game_events", "game_events-" + which_game + ".csv"),
+        "ball_pos" : os.path.join(file_path, "ball_pos", "ball_pos-" + which_game + ".csv"),
+        "player_pos" : os.path.join(
+            file_path, "player_pos", home_team, "player_pos-" + season + "_" + home_team, "player_pos-" + which_game + ".csv"
+        )
+    }
+    
+    for which, df in tables.items():
+        os.makedirs(os.path.dirname(paths[which]), exist_ok=True)
+        df.to_csv(paths[which])
+
+
+def _tiny_game_tables(player_position=255, batter=None):
+    """
+    one play of made up data, just enough to read in
+    
+    """
+    game_info = pd.DataFrame({
+        "game_str" : ["1999_01_TeamXA_TeamXB"], "home_team" : ["TeamXB"], "away_team" : ["TeamXA"],
+        "at_bat" : [1], "play_per_game" : [1], "top_bottom_inning" : ["Top"], "inning" : [1],
+        "pitcher" : [2001], "catcher" : [2002], "first_base" : [2003], "second_base" : [2004], "third_base" : [2005],
+        "shortstop" : [2006], "left_field" : [2007], "center_field" : [2008], "right_field" : [2009],
+        "batter" : [batter], "first_baserunner" : [0], "second_baserunner" : [0], "third_baserunner" : [0]
+    })
+    
+    game_events = pd.DataFrame({
+        "game_str" : "1999_01_TeamXA_TeamXB", "play_id" : [1, 1, 1], "at_bat" : [1, 1, 1], "play_per_game" : [1, 1, 1],
+        "timestamp" : [20000000, 20000500, 20001000], "player_position" : [1, player_position, 0], "event_code" : [1, 16, 5]
+    })
+    
+    ball_pos = pd.DataFrame({
+        "game_str" : "1999_01_TeamXA_TeamXB", "play_id" : [1, 1], "timestamp" : [20000000, 20000500],
+        "ball_position_x" : [0.5, 10.25], "ball_position_y" : [60.5, 30.0], "ball_position_z" : [5.0, 0.5]
+    })
+    
+    player_pos = pd.DataFrame({
+        "game_str" : "1999_01_TeamXA_TeamXB", "play_id" : [1, 1], "timestamp" : [20000000, 20000500],
+        "player_position" : [1, 3], "field_x" : [0.0, 63.6], "field_y" : [60.5, 63.6]
+    })
+    
+    return {"game_info" : game_info, "game_events" : game_events, "ball_pos" : ball_pos, "player_pos" : player_pos}
+
+
+def _lagged_acquisition_tables(lag_ms=300):
+    """
+    one play where the SS runs in, fields the ball and throws to a 1B who doesn't move,
+    the SS's tracking is lag_ms behind, so the SS is far from the ball but the 1B is right on it
+    
+    """
+    tables = _tiny_game_tables(player_position=6, batter=3001)
+    start = 20000000
+    ts = np.arange(0, 2001, 20)
+    first_base = np.array([63.6, 63.6])
+    
+    def ss_x(t):
+        return 10 + 0.03 * (t - 1000)
+    
+    # the ball is with the SS until the throw, then goes straight to the 1B
+    frac = np.clip((ts - 1200) / 400, 0, 1)
+    ball_x = np.where(ts <= 1200, ss_x(ts), ss_x(1200) + frac * (first_base[0] - ss_x(1200)))
+    ball_y = np.where(ts <= 1200, 100, 100 + frac * (first_base[1] - 100))
+    
+    tables["game_events"] = pd.DataFrame({
+        "game_str" : "1999_01_TeamXA_TeamXB", "play_id" : 1, "at_bat" : 1, "play_per_game" : 1,
+        "timestamp" : start + np.array([0, 100, 1000, 1200, 1600, 1800]), 
+        "player_position" : [1, 10, 6, 6, 3, 0], "event_code" : [1, 4, 2, 3, 2, 5]
+    })
+    
+    tables["ball_pos"] = pd.DataFrame({
+        "game_str" : "1999_01_TeamXA_TeamXB", "play_id" : 1, "timestamp" : start + ts,
+        "ball_position_x" : ball_x, "ball_position_y" : ball_y, "ball_position_z" : 3.0
+    })
+    
+    ss_ts = ts[ts + lag_ms <= ts[-1]]
+    
+    tables["player_pos"] = pd.concat([
+        pd.DataFrame({
+            "game_str" : "1999_01_TeamXA_TeamXB", "play_id" : 1, "timestamp" : start + ss_ts + lag_ms,
+            "player_position" : 6, "field_x" : ss_x(ss_ts), "field_y" : 100.0
+        }),
+        pd.DataFrame({
+            "game_str" : "1999_01_TeamXA_TeamXB", "play_id" : 1, "timestamp" : start + ts,
+            "player_position" : 3, "field_x" : first_base[0], "field_y" : first_base[1]
+        })
+    ], ignore_index=True)
+    
+    return tables
+
+
+@pytest.fixture
+def write_game_csvs():
+    """
+    _write_game_csvs, for tests that make up their own game
+    
+    """
+    return _write_game_csvs
+
+
+@pytest.fixture
+def tiny_game_tables():
+    """
+    _tiny_game_tables, call it to get a fresh copy of the tables
+    
+    """
+    return _tiny_game_tables
+
+
+@pytest.fixture
+def lagged_acquisition_tables():
+    """
+    _lagged_acquisition_tables, call it to get a fresh copy of the tables
+    
+    """
+    return _lagged_acquisition_tables
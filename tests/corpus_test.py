@@ -0,0 +1,34 @@
+# This file contains tests on building the dataset across games
+
+import numpy as np
+import pandas as pd
+
+from src.corpus import build_corpus
+
+import pytest
+
+pd.options.mode.chained_assignment = None  # default='warn'
+
+
+def test_parallel_build_matches_serial_build():
+    """
+    spreading the games across processes shouldn't change the dataset
+    
+    """
+    games = ["1903_30_TeamNB_TeamA1", "1903_01_TeamNE_TeamA2"]
+    
+    serial_dataset, _ = build_corpus(games=games, workers=1, verbose=False)
+    parallel_dataset, _ = build_corpus(games=games, workers=2, verbose=False)
+    
+    pd.testing.assert_frame_equal(serial_dataset, parallel_dataset)
+
+
+def test_bad_game_does_not_kill_the_build():
+    """
+    a game that can't be built should be reported, and the rest of the games should still be there
+    
+    """
+    dataset, failed_games = build_corpus(games=["1903_30_TeamNB_TeamA1", "not_a_real_game"], workers=2, verbose=False)
+    
+    assert list(failed_games.keys()) == ["not_a_real_game"]
+    assert (dataset["game_str"] == "1903_30_TeamNB_TeamA1").all()
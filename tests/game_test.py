@@ -3,10 +3,11 @@
 import numpy as np
 import pandas as pd
 import os
+import itertools
 
 from src.utils import *
 from src.plotting import Baseball_Field
-from src.game import Game
+from src.game import Game, REALIGN_MIN_DIST_FT, LOAD_DTYPES, THROW_BUFFER_MS, THROW_SNAPSHOT_MS, FIRST_BASE_COORDS
 
 import pytest
 
@@ -77,3 +78,890 @@ def test_double_plays():
 
     assert bf_1903_17.game_obj.get_ppg_from_pid(114) in this_game_dp
     
+
+
+def test_unsolvable_half_innings_are_reported():
+    """
+    the halves the outs solver says are valid have to add up to 3 outs, 
+    the ones it couldn't solve are filled with -99 and marked as not valid
+    
+    """
+    game_1903_30 = Game("1903_30_TeamNB_TeamA1")
+    game_info_1903_30 = game_1903_30.game_info_df.copy()
+    
+    for (inning, which_half), this_half in game_info_1903_30.groupby(["inning", "top_bottom_inning"]):
+        if game_1903_30.which_half_innings_are_valid[str(inning) + "_" + which_half]:
+            assert this_half["this_play_outs"].sum() == 3
+        else:
+            assert (this_half["this_play_outs"] == -99).all()
+
+
+def test_outs_sequence_counts():
+    """
+    the outs in game_info_df are the first of all the valid sequences, 
+    and a play is only unique when every sequence agrees on it
+    
+    """
+    game_1903_30 = Game("1903_30_TeamNB_TeamA1")
+    game_info_1903_30 = game_1903_30.game_info_df.copy()
+    
+    for (inning, which_half), this_half in game_info_1903_30.groupby(["inning", "top_bottom_inning"]):
+        all_seqs = game_1903_30.get_all_outs_sequences(inning, which_half)
+        
+        assert all_seqs.shape[0] == this_half["n_outs_seqs"].iloc[0]
+        
+        if all_seqs.shape[0]:
+            assert (all_seqs[0] == this_half["this_play_outs"].values).all()
+            assert ((all_seqs == all_seqs[0]).all(axis=0) == (this_half["outs_are_unique"].values == 1)).all()
+
+
+def _brute_force_outs_sequences(outs_domains):
+    """
+    every way to pick one option per play that adds up to 3 outs, in order
+    
+    """
+    return [list(seq) for seq in itertools.product(*outs_domains) if sum(seq) == 3]
+
+
+def test_outs_sequence_counts_match_brute_force():
+    """
+    the DP counts and the sequences it walks are the same as trying every combination, on made up options for small half innings
+    
+    """
+    rng = np.random.default_rng(9)
+    # nothing gets read, the counting doesn't look at the game
+    game_obj = Game("1903_30_TeamNB_TeamA1", lazy=True)
+    
+    for _ in range(300):
+        outs_domains = [
+            [outs for outs in range(4) if rng.random() < 0.6] for _ in range(rng.integers(1, 8))
+        ]
+        
+        all_seqs = _brute_force_outs_sequences(outs_domains)
+        
+        forward_counts, backward_counts = game_obj._count_outs_sequences(outs_domains)
+        outs_options = game_obj._get_outs_options_per_play(outs_domains, forward_counts, backward_counts)
+        
+        assert backward_counts[0, 3] == len(all_seqs)
+        assert forward_counts[-1, 3] == len(all_seqs)
+        
+        # the solver takes the fewest outs it can on each play, so they come out in sorted order
+        assert list(game_obj._enumerate_outs_sequences(outs_domains, backward_counts)) == all_seqs
+        assert list(game_obj._enumerate_outs_sequences(outs_domains, backward_counts, limit=2)) == all_seqs[:2]
+        
+        for ii in range(len(outs_domains)):
+            for outs in range(4):
+                assert outs_options[ii, outs] == sum(seq[ii] == outs for seq in all_seqs)
+
+
+def test_outs_sequences_match_brute_force_on_real_plays():
+    """
+    on the first few plays of each half, the sequences the solver finds are all of the ones that pass
+    _is_valid_outs_assignment on every play, and the half inning state is the same as reading the rows
+    
+    """
+    game_1903_30 = Game("1903_30_TeamNB_TeamA1")
+    
+    for _, this_half in game_1903_30.game_info_df.groupby(["inning", "top_bottom_inning"]):
+        half_inning_state = game_1903_30._get_half_inning_state(this_half)
+        
+        for ii in range(this_half.shape[0]):
+            row = this_half.iloc[ii]
+            batting_team = [row["batter"], row["first_baserunner"], row["second_baserunner"], row["third_baserunner"]]
+            
+            assert half_inning_state["batter"][ii] == row["batter"]
+            assert half_inning_state["set_batting_team"][ii] == set(batting_team)
+            assert half_inning_state["set_nonzero_br"][ii] == set(br for br in batting_team[1:] if br != 0)
+            assert half_inning_state["play_per_game"][ii] == row["play_per_game"]
+        
+        for n_plays in range(1, min(this_half.shape[0], 8) + 1):
+            small_half = this_half.iloc[:n_plays]
+            small_half_state = game_1903_30._get_half_inning_state(small_half)
+            
+            outs_seq = np.full((n_plays, 2), np.nan)
+            outs_domains = game_1903_30._get_outs_domains(small_half, outs_seq, small_half_state)
+            
+            valid_seqs = []
+            
+            # the last play has to make it 3 outs, so only those get checked play by play
+            for seq in itertools.product(range(4), repeat=n_plays):
+                if sum(seq) != 3:
+                    continue
+                
+                outs_seq[:, 1] = seq
+                outs_seq[:, 0] = np.cumsum((0,) + seq[:-1])
+                
+                if all(
+                    game_1903_30._is_valid_outs_assignment(small_half, outs_seq, seq[ii], ii, half_inning_state=small_half_state)
+                    for ii in range(n_plays)
+                ):
+                    valid_seqs.append(list(seq))
+            
+            _, backward_counts = game_1903_30._count_outs_sequences(outs_domains)
+            
+            assert backward_counts[0, 3] == len(valid_seqs)
+            assert list(game_1903_30._enumerate_outs_sequences(outs_domains, backward_counts)) == valid_seqs
+
+
+def test_outs_event_sets_are_looked_up_once(monkeypatch):
+    """
+    the HRs and flyouts the outs solver checks are the same plays get_play_id_and_ppg_for_event finds,
+    and a whole impute_outs only looks them up once each instead of at every step of the search
+    
+    """
+    game_1903_30 = Game("1903_30_TeamNB_TeamA1")
+    outs_event_sets = game_1903_30._get_outs_event_sets(recompute=True)
+    
+    assert outs_event_sets["hr_play_per_games"] == frozenset(
+        game_1903_30.get_play_id_and_ppg_for_event("home run")["play_per_game"].values
+    )
+    assert outs_event_sets["flyouts_that_end_play"] == frozenset(
+        game_1903_30.get_play_id_and_ppg_for_event("ball acquired", player_position=[7, 8, 9], next_event="end of play")["play_per_game"].values
+    )
+    
+    n_lookups = []
+    find_plays_with_event = Game._find_plays_with_event
+    
+    def counting_find_plays_with_event(self, *args, **kwargs):
+        n_lookups.append(args[1])
+        
+        return find_plays_with_event(self, *args, **kwargs)
+    
+    monkeypatch.setattr(Game, "_find_plays_with_event", counting_find_plays_with_event)
+    
+    # the outs get filled in from nans, like the info stage does
+    unsolved_game_info = game_1903_30.game_info_df.assign(prev_outs=np.nan, this_play_outs=np.nan)
+    
+    game_info, which_half_innings_are_valid = game_1903_30.impute_outs(unsolved_game_info)
+    
+    assert sorted(n_lookups) == ["ball acquired", "home run"]
+    assert which_half_innings_are_valid == game_1903_30.which_half_innings_are_valid
+    assert (game_info["this_play_outs"].values == game_1903_30.game_info_df["this_play_outs"].values).all()
+    
+    # impute_outs looks them up again, so it uses the events it is given
+    no_hrs = game_1903_30.game_events_df.loc[game_1903_30.game_events_df["event"] != "home run", :]
+    game_1903_30.impute_outs(unsolved_game_info, game_events_df=no_hrs)
+    
+    assert game_1903_30.outs_event_sets["hr_play_per_games"] == frozenset()
+
+
+def _old_is_out_at_first(game_obj, game_info_state, ii, allowable_throw_angle=7, allowable_first_base_dist=15):
+    """
+    the per play _is_out_at_first from before it was vectorized, row ii of game_info
+    
+    """
+    seq_len = len(game_info_state["batter"])
+    
+    next_batter = None
+    next_set_batting_team = frozenset()
+    
+    if ii < seq_len - 1:
+        next_batter = game_info_state["batter"][ii + 1]
+        next_set_batting_team = game_info_state["set_batting_team"][ii + 1]
+    
+    this_batter = game_info_state["batter"][ii]
+    this_play_per_game = game_info_state["play_per_game"][ii]
+    
+    this_play_events = game_obj.game_events_df.loc[game_obj.game_events_df["play_per_game"] == this_play_per_game, :]
+    
+    if this_batter == next_batter:
+        return 0
+    
+    if this_play_per_game in game_obj._get_outs_event_sets()["hr_play_per_games"]:
+        return 0
+    
+    any_acqs_near_first = any(this_play_events.loc[
+        (this_play_events["event"] == "ball acquired") & (this_play_events["player_position"] == 3),
+        ["ball_position_x", "ball_position_y"]
+    ].apply(
+        lambda row: np.sqrt((row["ball_position_x"] - FIRST_BASE_COORDS[0])**2 + (row["ball_position_y"] - FIRST_BASE_COORDS[1])**2), 
+        axis=1
+    ) < allowable_first_base_dist)
+    
+    throw_to_first = ("ball hit into play" in this_play_events["event"].values) and\
+        ("ball bounce" in this_play_events["event"].values) and\
+        ("throw (ball-in-play)" in this_play_events["event"].values) and\
+        ("ball acquired" in this_play_events["event"].values) and\
+        any(this_play_events["xy_throw_angle"] < allowable_throw_angle) and\
+        any_acqs_near_first
+    
+    if throw_to_first and (this_batter not in next_set_batting_team):
+        return 1
+    
+    if throw_to_first and (this_batter in next_set_batting_team):
+        return -1
+    
+    return 0
+
+
+def test_outs_at_first_match_the_per_play_loop():
+    """
+    the groupby version of _fill_outs_at_first gives the same labels as checking one play at a time
+    
+    """
+    g_1903_30 = Game("1903_30_TeamNB_TeamA1")
+    game_info = g_1903_30.game_info_df
+    
+    game_info_state = g_1903_30._get_half_inning_state(game_info)
+    
+    per_play = [_old_is_out_at_first(g_1903_30, game_info_state, ii) for ii in range(game_info.shape[0])]
+    
+    assert game_info["is_out_at_first"].tolist() == per_play
+    
+    # so this isn't just all 0s matching
+    assert len(set(per_play)) > 1
+
+
+def _old_fill_ball_pos_when_acquired(game_events, player_pos, ball_pos):
+    """
+    the loop _fill_ball_pos_when_acquired used to be, one filter of player_pos for each time the ball is held
+    
+    """
+    ball_acquired_windows = game_events.loc[(game_events["event_code"] == 2) & (game_events["next_event_code"] != 5), :]
+    
+    in_glove = [ball_pos]
+    
+    for player, this_ts, next_ts in zip(
+        ball_acquired_windows["player_position"], ball_acquired_windows["timestamp"], ball_acquired_windows["next_event_ts"]
+    ):
+        play_pos_during_window = player_pos.loc[
+            (player_pos["player_position"] == player) & (player_pos["timestamp"] > this_ts) & (player_pos["timestamp"] < next_ts),
+            ["game_str", "play_id", "timestamp", "field_x", "field_y"]
+        ].copy()
+        
+        play_pos_during_window["ball_position_z"] = 5
+        play_pos_during_window.columns = ["game_str", "play_id", "timestamp", "ball_position_x", "ball_position_y", "ball_position_z"]
+        
+        in_glove.append(play_pos_during_window)
+    
+    return pd.concat(in_glove)
+
+
+def test_ball_in_glove_rows_match_the_per_window_loop():
+    """
+    the in glove ball rows from the searchsorted version are the same rows the per window loop made
+    
+    """
+    g_1903_30 = Game("1903_30_TeamNB_TeamA1", lazy=True).precompute("alignment")
+    
+    game_events = g_1903_30._stage_tables["events"]
+    ball_pos = g_1903_30._stage_tables["ball_pos"]
+    
+    filled = g_1903_30._fill_ball_pos_when_acquired(game_events, g_1903_30.player_pos_df, ball_pos)
+    old_filled = _old_fill_ball_pos_when_acquired(game_events, g_1903_30.player_pos_df, ball_pos)
+    
+    cols = ["play_id", "timestamp", "ball_position_x", "ball_position_y", "ball_position_z"]
+    
+    # rows at the same timestamp can come out of the sort in either order
+    filled = filled[cols].astype(float).sort_values(cols).reset_index(drop=True)
+    old_filled = old_filled[cols].astype(float).sort_values(cols).reset_index(drop=True)
+    
+    assert filled.shape[0] > ball_pos.shape[0]
+    
+    pd.testing.assert_frame_equal(filled, old_filled)
+
+
+def test_vectorized_throw_details_match_row_by_row():
+    """
+    the vectorized throw details should give the same numbers (and nans) as the baseline math on each throw's window, 
+    with the window found by a plain scan of the ball table instead of the play index
+    
+    """
+    g_1903_30 = Game("1903_30_TeamNB_TeamA1")
+    throws = g_1903_30.game_events_df.loc[g_1903_30.game_events_df["event"] == "throw (ball-in-play)", :]
+    # the vectorized math is done in float64, the positions are read in as float32 (see LOAD_DTYPES)
+    ball_pos = g_1903_30.new_ball_pos.astype({"ball_position_x" : float, "ball_position_y" : float, "ball_position_z" : float})
+    
+    for which, col in [("xy", "xy_throw_angle"), ("elevation", "elevation_throw_angle"), ("velo", "throw_velo")]:
+        row_by_row = throws.apply(
+            lambda row: g_1903_30._compute_throw_details(
+                ball_pos.loc[
+                    (ball_pos["play_id"] == row["play_id"]) & 
+                    (ball_pos["timestamp"] >= row["timestamp"] - THROW_BUFFER_MS) & 
+                    (ball_pos["timestamp"] <= row["timestamp"] + THROW_SNAPSHOT_MS)
+                ].sort_values("timestamp"), 
+                which=which
+            ),
+            axis=1
+        ).values
+        
+        assert np.allclose(throws[col].values, row_by_row, equal_nan=True)
+
+
+def test_throw_details_match_a_hand_computed_throw(tmp_path, write_game_csvs, lagged_acquisition_tables):
+    """
+    a throw that goes in a straight line at a known speed, the angles and velo can be worked out by hand
+    
+    """
+    tables = lagged_acquisition_tables()
+    ball_pos = tables["ball_pos"]
+    
+    # from where the SS is at the throw (1200 ms into the play), 100 ft/s in x, -50 ft/s in y, and 20 ft/s up
+    release = np.array([16.0, 100.0, 3.0])
+    throw_velo = np.array([100.0, -50.0, 20.0])
+    
+    after_throw = (ball_pos["timestamp"] - 20000000) >= 1200
+    flight_secs = ((ball_pos.loc[after_throw, "timestamp"] - 20001200) / 1000).values[:, None]
+    
+    ball_pos.loc[after_throw, ["ball_position_x", "ball_position_y", "ball_position_z"]] = release + flight_secs * throw_velo
+    
+    write_game_csvs(str(tmp_path) + "/", "1999_01_TeamXA_TeamXB", tables)
+    
+    g = Game("1999_01_TeamXA_TeamXB", file_path=str(tmp_path) + "/", stages=["event_features"])
+    throw = g.game_events_df.loc[g.game_events_df["event"] == "throw (ball-in-play)", :].iloc[0]
+    
+    # the window starts at the first ball sample after the throw, 20 ms in
+    first_xy = release[:2] + 0.02 * throw_velo[:2]
+    to_first = FIRST_BASE_COORDS - first_xy
+    
+    xy_angle = np.degrees(np.arctan2(throw_velo[1], throw_velo[0]) - np.arctan2(to_first[1], to_first[0]))
+    elevation = np.degrees(np.arctan2(throw_velo[2], np.hypot(throw_velo[0], throw_velo[1])))
+    velo_mph = np.sqrt(throw_velo.dot(throw_velo)) / 1.467
+    
+    assert np.isclose(throw["xy_throw_angle"], abs(xy_angle))
+    assert np.isclose(throw["elevation_throw_angle"], elevation)
+    assert np.isclose(throw["throw_velo"], velo_mph)
+
+
+def test_play_windows_stay_in_play():
+    """
+    looking up a window of ball or player data should never return rows from another play
+    
+    """
+    g_1903_30 = Game("1903_30_TeamNB_TeamA1")
+    
+    for play_id in g_1903_30.game_events_df["play_id"].unique():
+        for which in ["ball_pos", "player_pos"]:
+            this_play = g_1903_30.get_this_play(play_id, which)
+            
+            assert (this_play["play_id"] == play_id).all()
+            assert this_play["timestamp"].is_monotonic_increasing
+            
+            window = g_1903_30.get_play_window(play_id, which, 0, np.inf)
+            assert window.shape[0] == this_play.shape[0]
+
+
+def test_play_slices_match_full_scans():
+    """
+    the per play slices have to be the same rows you would get from scanning the whole table
+    
+    """
+    g_1903_30 = Game("1903_30_TeamNB_TeamA1")
+    
+    for play_id in g_1903_30.game_events_df["play_id"].unique():
+        this_play_events = g_1903_30.get_this_play(play_id, "game_events")
+        
+        assert this_play_events.equals(g_1903_30.game_events_df.loc[g_1903_30.game_events_df["play_id"] == play_id])
+        
+        assert (g_1903_30.get_this_play_ts(play_id) == 
+                g_1903_30.timestamp_df.loc[g_1903_30.timestamp_df["play_id"] == play_id, "timestamp"].values).all()
+        
+        assert g_1903_30.get_pid_from_ppg(g_1903_30.get_ppg_from_pid(play_id)) == play_id
+
+
+def test_collect_all_timestamps_uses_what_it_is_given():
+    """
+    collect_all_timestamps works on the dfs and cols it is passed (not the game's own tables), they don't have to be sorted,
+    it gives back just the df by default, and with return_index=True the play_index too, 
+    each play's slice being the sorted unique timestamps of that play
+    
+    """
+    rng = np.random.default_rng(21)
+    
+    # nothing gets read, so all of the timestamps have to come from these
+    game_obj = Game("1903_30_TeamNB_TeamA1", lazy=True)
+    
+    made_up_dfs = [
+        pd.DataFrame({"pid" : rng.integers(1, 6, n_rows).astype(float), "ts" : rng.integers(0, 40, n_rows) * 10.0})
+        for n_rows in [200, 150, 30]
+    ]
+    
+    # some missing plays and timestamps, and a play that is only in the events
+    made_up_dfs[0].loc[:4, "pid"] = np.nan
+    made_up_dfs[1].loc[:4, "ts"] = np.nan
+    made_up_dfs[2].loc[0, ["pid", "ts"]] = [9, 5]
+    
+    timestamp_df, play_index = game_obj.collect_all_timestamps(*made_up_dfs, cols=["pid", "ts"], return_index=True)
+    
+    pd.testing.assert_frame_equal(game_obj.collect_all_timestamps(*made_up_dfs, cols=["pid", "ts"]), timestamp_df)
+    
+    expected_df = pd.concat(made_up_dfs).dropna().drop_duplicates().sort_values(["pid", "ts"]).reset_index(drop=True)
+    
+    assert list(timestamp_df.columns) == ["pid", "ts"]
+    assert np.array_equal(timestamp_df.values, expected_df.values)
+    
+    assert sorted(play_index) == sorted(expected_df["pid"].unique())
+    
+    for play_id, (start, stop) in play_index.items():
+        assert np.array_equal(timestamp_df["ts"].values[start:stop], expected_df.loc[expected_df["pid"] == play_id, "ts"].values)
+    
+    assert game_obj.stages_run == set()
+
+
+def test_resampled_plays_are_on_the_clock():
+    """
+    after resampling, every play's ticks are evenly spaced from the start of the play, 
+    and events only move to the nearest tick
+    
+    """
+    g_1903_30 = Game("1903_30_TeamNB_TeamA1", resample_hz=30)
+    
+    step_ms = 1000 / 30
+    
+    for play_id in g_1903_30.game_events_df["play_id"].unique():
+        play_start = g_1903_30.get_this_play_ts(play_id)[0]
+        
+        for which in ["ball_pos", "player_pos"]:
+            ticks = (g_1903_30.get_this_play(play_id, which, on_clock=True)["timestamp"].values - play_start) / step_ms
+            
+            assert np.abs(ticks - np.round(ticks)).max(initial=0) < 0.05
+        
+        this_play_events = g_1903_30.get_this_play(play_id, "game_events", on_clock=True)
+        
+        assert (np.abs(this_play_events["timestamp"] - this_play_events["raw_timestamp"]) <= step_ms / 2 + 1).all()
+
+
+def test_merged_player_details_match_row_by_row():
+    """
+    the batter and thrower features come from a merge now, they should match looking them up one event at a time
+    
+    """
+    g_1903_30 = Game("1903_30_TeamNB_TeamA1")
+    throws = g_1903_30.game_events_df.loc[g_1903_30.game_events_df["event"] == "throw (ball-in-play)", :]
+    
+    for which, col in [("batter_dist", "batter_dist_to_first"), ("thrower_x", "thrower_x"), ("thrower_y", "thrower_y")]:
+        row_by_row = throws.apply(
+            lambda row: g_1903_30._fill_player_details_at_throw(
+                row["timestamp"], 
+                g_1903_30.new_player_pos, 
+                which=which, 
+                thrower_position=row["player_position"], 
+                play_id=row["play_id"]
+            ),
+            axis=1
+        ).values
+        
+        assert np.allclose(throws[col].values, row_by_row, equal_nan=True)
+
+
+def test_cached_game_matches_fresh_game(tmp_path):
+    """
+    a game loaded from the cache should be the same as one that is prepped from the csvs
+    
+    """
+    fresh_1903_30 = Game("1903_30_TeamNB_TeamA1")
+    
+    # the first one writes the cache, the second one reads it
+    Game("1903_30_TeamNB_TeamA1", cache_dir=str(tmp_path))
+    cached_1903_30 = Game("1903_30_TeamNB_TeamA1", cache_dir=str(tmp_path))
+    
+    assert len(os.listdir(tmp_path)) == 1
+    
+    for frame_name in ["game_info_df", "game_events_df", "new_ball_pos", "new_player_pos", "ball_pos_df", "player_pos_df", "timestamp_df"]:
+        pd.testing.assert_frame_equal(getattr(fresh_1903_30, frame_name), getattr(cached_1903_30, frame_name))
+    
+    assert fresh_1903_30.which_half_innings_are_valid == cached_1903_30.which_half_innings_are_valid
+
+
+def test_cache_files_for_other_configs_are_kept(tmp_path, monkeypatch, write_game_csvs, lagged_acquisition_tables):
+    """
+    caching a game with different which_outs shouldn't delete the other one's cache, 
+    a warm load shouldn't hash the csvs, and changing a csv should replace the old cache
+    
+    """
+    file_path = str(tmp_path / "data") + "/"
+    cache_dir = str(tmp_path / "cache")
+    
+    tables = lagged_acquisition_tables()
+    write_game_csvs(file_path, "1999_01_TeamXA_TeamXB", tables)
+    
+    fresh = Game("1999_01_TeamXA_TeamXB", file_path=file_path)
+    
+    Game("1999_01_TeamXA_TeamXB", file_path=file_path, cache_dir=cache_dir)
+    Game("1999_01_TeamXA_TeamXB", file_path=file_path, cache_dir=cache_dir, which_outs=["full_seq"])
+    
+    first_files = sorted(os.listdir(cache_dir))
+    assert len(first_files) == 2
+    
+    def no_hashing(self):
+        raise AssertionError("the csvs didn't change, they shouldn't get hashed")
+    
+    with monkeypatch.context() as patch:
+        patch.setattr(Game, "_cache_key", no_hashing)
+        
+        cached = Game("1999_01_TeamXA_TeamXB", file_path=file_path, cache_dir=cache_dir)
+    
+    for frame_name in ["game_info_df", "game_events_df", "new_ball_pos", "new_player_pos", "ball_pos_df", "player_pos_df", "ts_lag_df"]:
+        pd.testing.assert_frame_equal(getattr(fresh, frame_name), getattr(cached, frame_name))
+    
+    # a new csv replaces this config's cache, and leaves the other one alone
+    tables["ball_pos"]["ball_position_z"] = 4.0
+    write_game_csvs(file_path, "1999_01_TeamXA_TeamXB", tables)
+    
+    rebuilt = Game("1999_01_TeamXA_TeamXB", file_path=file_path, cache_dir=cache_dir)
+    
+    rebuilt_fresh = Game("1999_01_TeamXA_TeamXB", file_path=file_path)
+    
+    for frame_name in ["new_ball_pos", "new_player_pos", "ball_pos_df", "player_pos_df"]:
+        pd.testing.assert_frame_equal(getattr(rebuilt, frame_name), getattr(rebuilt_fresh, frame_name))
+    
+    new_files = sorted(os.listdir(cache_dir))
+    assert len(new_files) == 2
+    assert len(set(new_files) & set(first_files)) == 1
+
+
+def test_lazy_stages_match_the_full_prep():
+    """
+    a table that gets looked up on its own should only run the stages it needs, and be the same as after the full prep
+    
+    """
+    full_1903_30 = Game("1903_30_TeamNB_TeamA1").precompute()
+    
+    ball_only_1903_30 = Game("1903_30_TeamNB_TeamA1", stages=["ball_velos"])
+    
+    assert "info" not in ball_only_1903_30.stages_run
+    assert "event_features" not in ball_only_1903_30.stages_run
+    
+    pd.testing.assert_frame_equal(ball_only_1903_30.new_ball_pos, full_1903_30.new_ball_pos)
+    
+    # the rest still get filled in when they are looked up
+    for frame_name in ["game_info_df", "game_events_df", "timestamp_df"]:
+        pd.testing.assert_frame_equal(getattr(ball_only_1903_30, frame_name), getattr(full_1903_30, frame_name))
+
+
+def test_lazy_games_wait_to_read(tmp_path, write_game_csvs, tiny_game_tables):
+    """
+    a lazy game doesn't read anything until it is needed, and names that aren't stage attributes never run a stage
+    
+    """
+    write_game_csvs(str(tmp_path) + "/", "1999_01_TeamXA_TeamXB", tiny_game_tables(batter=3001))
+    
+    g = Game("1999_01_TeamXA_TeamXB", file_path=str(tmp_path) + "/", lazy=True)
+    
+    assert g.stages_run == set()
+    
+    with pytest.raises(AttributeError):
+        g.game_evnts_df
+    
+    assert not hasattr(g, "new_bal_pos")
+    assert g.stages_run == set()
+    
+    assert len(g.ball_pos_df) == 2
+    assert g.stages_run == {"read", "events", "alignment", "ball_pos"}
+
+
+def test_failed_stages_can_be_run_again(tmp_path, monkeypatch, write_game_csvs, lagged_acquisition_tables):
+    """
+    a stage that raises keeps the tables it needs, so looking its attribute up again reruns it instead of hitting a KeyError
+    
+    """
+    write_game_csvs(str(tmp_path) + "/", "1999_01_TeamXA_TeamXB", lagged_acquisition_tables())
+    
+    fresh = Game("1999_01_TeamXA_TeamXB", file_path=str(tmp_path) + "/")
+    
+    g = Game("1999_01_TeamXA_TeamXB", file_path=str(tmp_path) + "/", lazy=True)
+    
+    smooth_ball_position = Game._smooth_ball_position
+    
+    def out_of_memory(self, df):
+        raise MemoryError("made up")
+    
+    with monkeypatch.context() as patch:
+        patch.setattr(Game, "_smooth_ball_position", out_of_memory)
+        
+        with pytest.raises(MemoryError):
+            g.new_ball_pos
+    
+    assert "ball_pos" not in g.stages_run
+    assert "ball_pos" in g._stage_tables
+    
+    pd.testing.assert_frame_equal(g.new_ball_pos, fresh.new_ball_pos)
+    
+    # once it has finished, the tables it used up are dropped
+    assert "ball_pos" not in g._stage_tables
+    
+    for frame_name in ["game_info_df", "game_events_df", "new_player_pos"]:
+        pd.testing.assert_frame_equal(getattr(g, frame_name), getattr(fresh, frame_name))
+
+
+def test_bad_paths_fail_right_away(tmp_path):
+    """
+    by default a game is prepped when it is made, so a bad path fails there and not on some later lookup
+    
+    """
+    with pytest.raises(FileNotFoundError):
+        Game("1999_01_TeamXA_TeamXB", file_path=str(tmp_path) + "/not_here/")
+    
+    # a lazy game only finds out when it reads
+    g = Game("1999_01_TeamXA_TeamXB", file_path=str(tmp_path) + "/not_here/", lazy=True)
+    
+    with pytest.raises(FileNotFoundError):
+        g.game_events_df
+
+
+def test_acquired_distances_are_per_play():
+    """
+    every acquisition only gets paired with its own play, so there can't be more pairs than acquisitions in a play
+    
+    """
+    g_1903_30 = Game("1903_30_TeamNB_TeamA1")
+    game_events = g_1903_30.game_events_df
+    
+    n_acq_per_play = game_events.loc[
+        (game_events["event"] == "ball acquired") & (game_events["player_position"] != 2)
+    ].groupby("play_id").size()
+    
+    acquired_dist = g_1903_30.acquired_dist_df.set_index("play_id")
+    
+    assert (acquired_dist["n_acquired"] <= n_acq_per_play.reindex(acquired_dist.index)).all()
+    assert (acquired_dist["min_dist"] <= acquired_dist["max_dist"]).all()
+    assert np.isclose(g_1903_30.avg_ball_and_player_dist, acquired_dist["min_dist"].mean())
+
+
+def test_only_misaligned_plays_get_shifted():
+    """
+    the timestamps only get shifted on plays where a player that acquires the ball is far from it, 
+    and every play gets a lag in ts_lag_df (0 if it wasn't shifted)
+    
+    """
+    g_1903_30 = Game("1903_30_TeamNB_TeamA1")
+    ts_lag_df = g_1903_30.ts_lag_df
+    
+    assert set(ts_lag_df["play_id"]) == set(g_1903_30.player_pos_df["play_id"])
+    
+    shifted_plays = ts_lag_df.loc[ts_lag_df["shifted"], "play_id"]
+    
+    far_plays = g_1903_30.acquired_dist_df.loc[g_1903_30.acquired_dist_df["max_dist"] > REALIGN_MIN_DIST_FT, "play_id"]
+    
+    assert shifted_plays.isin(far_plays).all()
+    assert (ts_lag_df.loc[ts_lag_df["shifted"], "time_offset"] > 0).all()
+    assert (ts_lag_df.loc[~ts_lag_df["shifted"], "time_offset"] == 0).all()
+    
+    not_shifted = g_1903_30.player_pos_df.loc[~g_1903_30.player_pos_df["play_id"].isin(shifted_plays), :]
+    
+    assert (not_shifted["timestamp"] == not_shifted["old_ts"]).all()
+
+
+def _old_ts_lags(game_events, player_pos, ball_pos, margin=3):
+    """
+    the lag for each play, worked out the way _align_ball_and_player_ts used to,
+    with a groupby and idxmax for the plays within the margin and another for the ones that aren't
+    
+    """
+    ball_acq_event = game_events.loc[
+        game_events["event"] == "ball acquired"
+    ][["play_id", "player_position", "timestamp"]]
+    
+    ball_acq_pos = ball_pos.merge(ball_acq_event, how="inner", on=["play_id", "timestamp"])[
+        ["play_id", "ball_position_x", "ball_position_y"]
+    ]
+    
+    player_pos_acq = player_pos.merge(
+        ball_acq_event, how="inner", on=["play_id", "player_position"], suffixes=["", "_ball_acq"]
+    )
+    
+    combined_acq = player_pos_acq.merge(ball_acq_pos, on="play_id", how="left")
+    combined_acq["delta_dist"] = np.sqrt(
+        (combined_acq["field_x"] - combined_acq["ball_position_x"])**2 +
+        (combined_acq["field_y"] - combined_acq["ball_position_y"])**2
+    )
+    
+    when_within_margin = combined_acq[
+        combined_acq["delta_dist"] < margin
+    ].groupby(["play_id", "player_position"]).min(numeric_only=True)
+    
+    when_within_margin["time_offset"] = when_within_margin["timestamp"] - when_within_margin["timestamp_ball_acq"]
+    when_within_margin = when_within_margin.loc[when_within_margin.groupby("play_id")["time_offset"].idxmax()]
+    
+    plays_that_not_within_margin = set(combined_acq["play_id"].unique()) - \
+        set(when_within_margin.reset_index()["play_id"].unique())
+    
+    not_within_margin = combined_acq.loc[
+        (combined_acq["play_id"].isin(plays_that_not_within_margin)) &
+        (combined_acq["delta_dist"] < (2 * margin))
+    ].groupby(["play_id", "player_position"]).min(numeric_only=True)
+    
+    not_within_margin["time_offset"] = not_within_margin["timestamp"] - not_within_margin["timestamp_ball_acq"]
+    not_within_margin = not_within_margin.loc[not_within_margin.groupby("play_id")["time_offset"].idxmax()]
+    
+    all_plays = pd.concat([not_within_margin, when_within_margin]).reset_index()
+    
+    return pd.Series(all_plays["time_offset"].values, index=all_plays["play_id"].values).sort_index()
+
+
+def test_lags_match_the_per_play_lags():
+    """
+    the one pass lags are the same ones the two groupby and idxmax version found,
+    and with every play allowed to shift, each shifted play moves by its positive lag
+    
+    """
+    g_1903_30 = Game("1903_30_TeamNB_TeamA1", lazy=True).precompute("events")
+    
+    game_events = g_1903_30._stage_tables["events"]
+    player_pos = g_1903_30._stage_tables["player_pos"]
+    ball_pos = g_1903_30._stage_tables["ball_pos"]
+    
+    new_player_pos = g_1903_30._align_ball_and_player_ts(game_events, player_pos, ball_pos)
+    
+    old_lags = _old_ts_lags(game_events, player_pos, ball_pos)
+    found_lags = g_1903_30.ts_lag_df.dropna(subset=["found_offset"]).set_index("play_id")["found_offset"]
+    
+    assert len(old_lags) > 0
+    assert np.array_equal(found_lags.index.values, old_lags.index.values)
+    assert np.allclose(found_lags.values, old_lags.values)
+    
+    # plays with no lag or a negative one aren't touched
+    positive_lags = old_lags[old_lags > 0]
+    offsets = new_player_pos["play_id"].map(positive_lags).fillna(0)
+    
+    assert (new_player_pos["timestamp"] == new_player_pos["old_ts"] - offsets).all()
+
+
+def test_games_without_a_runner_on_third(tmp_path, write_game_csvs, lagged_acquisition_tables):
+    """
+    a game where nobody is ever on third (or on some other base) still gets prepped, 
+    before the runners were tallied with a crosstab this was a KeyError: 'Runner 3rd'
+    
+    """
+    tables = lagged_acquisition_tables()
+    tables["game_info"]["first_baserunner"] = 3011
+    tables["game_info"]["second_baserunner"] = 3012
+    
+    batter_rows = tables["player_pos"].loc[tables["player_pos"]["player_position"] == 3, :]
+    
+    tables["player_pos"] = pd.concat(
+        [tables["player_pos"]] + [batter_rows.assign(player_position=runner, field_x=x, field_y=y) for runner, x, y in [(11, 90.0, 1.0), (12, 1.0, 125.0)]], 
+        ignore_index=True
+    )
+    
+    write_game_csvs(str(tmp_path) + "/", "1999_01_TeamXA_TeamXB", tables)
+    
+    game_info = Game("1999_01_TeamXA_TeamXB", file_path=str(tmp_path) + "/").game_info_df
+    
+    assert (game_info[["Runner 1st", "Runner 2nd"]] > 0).all().all()
+    assert (game_info["Runner 3rd"] == 0).all()
+    assert (game_info["n_br"] == 2).all()
+    assert (game_info["player_pos_and_info_agree"] == 1).all()
+
+
+def test_one_bad_acquisition_gets_the_play_shifted(tmp_path, capsys, write_game_csvs, lagged_acquisition_tables):
+    """
+    a play with one clean acquisition and one far off one still gets lined up, and it says so
+    
+    """
+    write_game_csvs(str(tmp_path) + "/", "1999_01_TeamXA_TeamXB", lagged_acquisition_tables())
+    
+    g = Game("1999_01_TeamXA_TeamXB", file_path=str(tmp_path) + "/", stages=["alignment"])
+    
+    assert "large on 1 of 1 plays" in capsys.readouterr().out
+    acquired_dist_df = g.acquired_dist_df.set_index("play_id")
+    
+    assert acquired_dist_df.loc[1, "min_dist"] < 1
+    assert acquired_dist_df.loc[1, "max_dist"] > REALIGN_MIN_DIST_FT
+    
+    ts_lag_df = g.ts_lag_df.set_index("play_id")
+    
+    assert ts_lag_df.loc[1, "shifted"]
+    assert ts_lag_df.loc[1, "time_offset"] > 0
+    
+    # the SS should be a lot closer to the ball when they acquire it after the shift
+    aligned_dist_df = g._check_positions_when_acquired(g.game_events_df, g.player_pos_df, g.ball_pos_df).set_index("play_id")
+    
+    assert aligned_dist_df.loc[1, "max_dist"] < acquired_dist_df.loc[1, "max_dist"]
+
+
+def test_kalman_smoothing_tracks_the_ball():
+    """
+    the kalman smoothed ball should stay close to the raw ball, and give a velo for every row the ball was seen
+    
+    """
+    g_1903_30 = Game("1903_30_TeamNB_TeamA1", smoothing="kalman", stages=["ball_velos"])
+    ball_pos = g_1903_30.new_ball_pos
+    
+    seen = ball_pos["ball_position_x"].notnull() & ~ball_pos["ball_in_glove"]
+    
+    for axis in ["x", "y", "z"]:
+        dist = np.abs(ball_pos.loc[seen, "smoothed_ball_position_" + axis] - ball_pos.loc[seen, "ball_position_" + axis])
+        
+        assert dist.median() < 1
+        assert ball_pos.loc[seen, "smoothed_ball_velo_" + axis].notnull().all()
+
+
+def test_kalman_velos_carry_onto_the_clock(tmp_path, write_game_csvs, lagged_acquisition_tables):
+    """
+    resampling a kalman game interpolates its smoothed velos instead of diffing the smoothed positions again,
+    on a clock that lands on the made up play's 20 ms samples they come out the same
+    
+    """
+    write_game_csvs(str(tmp_path) + "/", "1999_01_TeamXA_TeamXB", lagged_acquisition_tables())
+    
+    g = Game("1999_01_TeamXA_TeamXB", file_path=str(tmp_path) + "/", smoothing="kalman", resample_hz=50)
+    
+    # the clock table has the same velo columns as new_ball_pos, so no diffs of the smoothed positions
+    assert not any(col.startswith(("lag_1_smoothed", "diff_smoothed")) for col in g.clock_ball_pos.columns)
+    
+    velo_cols = ["smoothed_ball_velo_x", "smoothed_ball_velo_y", "smoothed_ball_velo_z"]
+    on_both = g.clock_ball_pos[["timestamp"] + velo_cols].merge(
+        g.new_ball_pos.drop_duplicates("timestamp")[["timestamp"] + velo_cols], on="timestamp", suffixes=["_clock", ""]
+    )
+    
+    assert len(on_both) > 0.9 * len(g.clock_ball_pos)
+    
+    for col in velo_cols:
+        assert np.allclose(on_both[col + "_clock"], on_both[col], equal_nan=True)
+
+
+def test_read_dtypes_keep_the_values(tmp_path, write_game_csvs, tiny_game_tables):
+    """
+    reading with LOAD_DTYPES can't change any values, 255 (ball bounces and such) has to stay 255, 
+    and ids with missing values have to stay exact
+    
+    """
+    tables = tiny_game_tables(player_position=255, batter=np.nan)
+    tables["game_info"].loc[0, "pitcher"] = 123456789
+    
+    write_game_csvs(str(tmp_path), "1999_01_TeamXA_TeamXB", tables)
+    
+    tiny_game = Game("1999_01_TeamXA_TeamXB", file_path=str(tmp_path) + "/", debug_mode=True)
+    
+    read_tables = {
+        "game_info" : tiny_game.game_info_df, "game_events" : tiny_game.game_events_df, 
+        "ball_pos" : tiny_game.ball_pos_df, "player_pos" : tiny_game.player_pos_df
+    }
+    
+    for which, df in read_tables.items():
+        for col in tables[which].columns:
+            if pd.api.types.is_numeric_dtype(tables[which][col]):
+                assert np.allclose(df[col].astype(float), tables[which][col].astype(float), equal_nan=True)
+            else:
+                assert (df[col].astype(str) == tables[which][col].astype(str)).all()
+    
+    assert tiny_game.game_events_df["player_position"].tolist() == [1, 255, 0]
+    assert tiny_game.game_info_df["pitcher"].iloc[0] == 123456789
+    assert np.isnan(tiny_game.game_info_df["batter"].iloc[0])
+
+
+def test_read_dtypes_refuse_values_that_do_not_fit(tmp_path, write_game_csvs, tiny_game_tables):
+    """
+    a value too big for its dtype should raise instead of wrapping around
+    
+    """
+    write_game_csvs(str(tmp_path), "1999_01_TeamXA_TeamXB", tiny_game_tables(player_position=70000))
+    
+    with pytest.raises(ValueError):
+        Game("1999_01_TeamXA_TeamXB", file_path=str(tmp_path) + "/", debug_mode=True)
+
+
+def test_real_game_dtypes_match_the_csvs():
+    """
+    every int column read with LOAD_DTYPES matches the plain csv, on a real game
+    
+    """
+    g_1903_30 = Game("1903_30_TeamNB_TeamA1", debug_mode=True)
+    
+    for which, df in [("game_events", g_1903_30.game_events_df), ("player_pos", g_1903_30.player_pos_df)]:
+        raw_df = pd.read_csv(g_1903_30.source_paths[which], index_col=0)
+        
+        for col, dtype in LOAD_DTYPES[which].items():
+            if dtype.startswith("int"):
+                assert np.array_equal(df[col].values.astype(float), raw_df[col].values.astype(float), equal_nan=True)
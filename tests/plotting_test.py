@@ -0,0 +1,199 @@
+# This file contains tests on writing plays out to gifs and videos
+
+import io
+
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageSequence
+from matplotlib.backends.backend_svg import FigureCanvasSVG
+
+import src.plotting as plotting
+from src.plotting import FrameEncoder, Baseball_Field
+
+import pytest
+
+pd.options.mode.chained_assignment = None  # default='warn'
+
+
+def _moving_frames(n_frames=5):
+    """
+    a few small RGBA frames of a yellow and a white box moving across a green field
+    
+    """
+    frames = []
+    
+    for i in range(n_frames):
+        frame = np.zeros((40, 60, 4), dtype=np.uint8)
+        frame[:, :, 1] = 120
+        frame[:, :, 3] = 255
+        
+        frame[10:20, 5 + 5 * i:15 + 5 * i, :3] = [255, 255, 0]
+        frame[25:30, 40 - 3 * i:45 - 3 * i, :3] = [255, 255, 255]
+        
+        frames.append(frame)
+    
+    return frames
+
+
+class _FailingFfmpeg:
+    """
+    stands in for an ffmpeg subprocess that takes the frames and then fails
+    
+    """
+    def __init__(self, cmd, stdin=None):
+        self.stdin = io.BytesIO()
+    
+    def wait(self):
+        return 1
+
+
+def test_gifs_round_trip_without_ffmpeg(tmp_path, monkeypatch):
+    """
+    without ffmpeg or imageio, gifs get written a frame at a time with Pillow and read back the same
+    
+    """
+    monkeypatch.setattr(plotting.shutil, "which", lambda name: None)
+    monkeypatch.setattr(plotting, "imageio", None)
+    
+    frames = _moving_frames()
+    file_name = str(tmp_path) + "/play.gif"
+    
+    with FrameEncoder(file_name, fps=20) as encoder:
+        for frame in frames:
+            encoder.write(frame)
+    
+    gif = Image.open(file_name)
+    
+    assert gif.n_frames == len(frames)
+    assert gif.info["loop"] == 0
+    
+    for frame, gif_frame in zip(frames, ImageSequence.Iterator(gif)):
+        assert gif_frame.info["duration"] == 50
+        
+        np.testing.assert_array_equal(np.asarray(gif_frame.convert("RGB")), frame[:, :, :3])
+
+
+def test_encoder_errors_do_not_hide_the_real_error(tmp_path, monkeypatch):
+    """
+    if something goes wrong while the frames are being written, that's the error that comes out,
+    not the one about ffmpeg failing to finish the half written file
+    
+    """
+    monkeypatch.setattr(plotting.shutil, "which", lambda name: "/usr/bin/ffmpeg")
+    monkeypatch.setattr(plotting.subprocess, "Popen", _FailingFfmpeg)
+    
+    file_name = str(tmp_path) + "/play.mp4"
+    
+    with pytest.raises(KeyError):
+        with FrameEncoder(file_name) as encoder:
+            encoder.write(_moving_frames(1)[0])
+            
+            raise KeyError("made up")
+    
+    # on its own, ffmpeg failing still gets reported
+    with pytest.raises(RuntimeError):
+        with FrameEncoder(file_name) as encoder:
+            encoder.write(_moving_frames(1)[0])
+
+
+@pytest.fixture
+def made_up_field(tmp_path, write_game_csvs, lagged_acquisition_tables):
+    """
+    makes Baseball_Fields for the one made up play from lagged_acquisition_tables
+    
+    """
+    file_path = str(tmp_path / "data") + "/"
+    write_game_csvs(file_path, "1999_01_TeamXA_TeamXB", lagged_acquisition_tables())
+    
+    def make_field(verbose=False):
+        return Baseball_Field("1999_01_TeamXA_TeamXB", file_path=file_path, verbose=verbose)
+    
+    return make_field
+
+
+def test_iter_frames_leave_the_figure_alone(made_up_field):
+    """
+    iter_frames draws on its own canvas, so the figure keeps its canvas and dpi, and each frame is the size dpi asks for
+    
+    """
+    bf = made_up_field()
+    
+    # a canvas that can't blit, like the ones for non Agg backends
+    canvas = FigureCanvasSVG(bf.fig)
+    dpi = bf.fig.dpi
+    
+    frames = list(bf.iter_frames(1, dpi=20))
+    
+    assert len(frames) == len(bf._get_play_frames(1)["frames"])
+    assert all(frame.shape == (240, 240, 4) for frame in frames)
+    
+    # the ball and players move
+    assert not all(np.array_equal(frames[0], frame) for frame in frames[1:])
+    
+    assert bf.fig.canvas is canvas
+    assert bf.fig.dpi == dpi
+
+
+def test_create_video_without_ffmpeg_or_imageio(tmp_path, monkeypatch, made_up_field):
+    """
+    without ffmpeg or imageio gifs still get made, but mp4s and webms can't be
+    
+    """
+    bf = made_up_field()
+    
+    monkeypatch.setattr(plotting.shutil, "which", lambda name: None)
+    monkeypatch.setattr(plotting, "imageio", None)
+    
+    file_name = bf.create_video(1, file_path=str(tmp_path) + "/", fmt="gif", dpi=20)
+    
+    assert Image.open(file_name).n_frames == len(bf._get_play_frames(1)["frames"])
+    
+    with pytest.raises(RuntimeError, match="Need ffmpeg or imageio"):
+        bf.create_video(1, file_path=str(tmp_path) + "/", fmt="mp4", dpi=20)
+
+
+def test_gif_velo_arrows_scale_like_the_plot(made_up_field):
+    """
+    the velo arrows the gifs move around get autoscaled every frame, the same as the quiver add_fielders_to_plot makes
+    
+    """
+    bf = made_up_field()
+    
+    play_frames = bf._get_play_frames(1)
+    bf._init_gif_artists(play_frames, show_velos=True)
+    
+    moving_frames = [
+        i for i, velo in enumerate(play_frames["fielders_velo"]) if len(velo) and np.isfinite(velo).all() and np.abs(velo).sum() > 0
+    ]
+    
+    assert len(moving_frames)
+    
+    for i in moving_frames[::10]:
+        bf._gif_frame_writer(i, play_frames, show_velos=True)
+        bf.fig.canvas.draw()
+        
+        xy = play_frames["fielders_xy"][i]
+        velo = 0.2 * play_frames["fielders_velo"][i]
+        
+        one_frame_quiver = bf.ax.quiver(xy[:, 0], xy[:, 1], velo[:, 0], velo[:, 1], angles="xy")
+        bf.fig.canvas.draw()
+        
+        assert np.isclose(bf.fielders_velo_artist.scale, one_frame_quiver.scale)
+        
+        one_frame_quiver.remove()
+
+
+def test_missing_fielders_only_print_when_verbose(capsys, made_up_field):
+    """
+    the made up play only has two fielders, that only gets printed with verbose=True, 
+    the same for the gif frames and for drawing one frame
+    
+    """
+    for verbose in [False, True]:
+        made_up_field(verbose=verbose)._get_play_frames(1)
+        
+        assert ("missing fielders data" in capsys.readouterr().out) == verbose
+        
+        made_up_field(verbose=verbose).add_fielders_to_plot(play_id=1, frame_index=50)
+        
+        assert ("missing fielders data" in capsys.readouterr().out) == verbose
@@ -0,0 +1,48 @@
+# This file contains tests on making gifs for lots of plays at once
+
+import os
+
+import pandas as pd
+
+from src.render import render_gifs, _chunk_plays
+
+import pytest
+
+pd.options.mode.chained_assignment = None  # default='warn'
+
+
+def test_bad_plays_do_not_kill_the_batch(tmp_path):
+    """
+    a game or play that can't be rendered should be reported, and the rest of the gifs should still get made
+    
+    """
+    plays = [
+        ("1903_30_TeamNB_TeamA1", 3, "--first"),
+        ("not_a_real_game", 1, ""),
+        ("1903_30_TeamNB_TeamA1", 7, "--second"),
+    ]
+    
+    render_report = render_gifs(plays, file_path=str(tmp_path) + "/", workers=2, verbose=False)
+    
+    # the report is in the same order as the plays
+    assert render_report["game_str"].tolist() == [which_game for which_game, _, _ in plays]
+    
+    assert render_report["error"].notnull().tolist() == [False, True, False]
+    
+    for file_name in render_report["file_name"].dropna():
+        assert os.path.exists(file_name)
+
+
+def test_plays_from_one_game_get_split_up():
+    """
+    a list of plays that is all from one game still gets spread out, and each game's plays stay together and in order
+    
+    """
+    plays = [("game_a", play_id, "") for play_id in range(1, 8)] + [("game_b", 3, "--b")]
+    
+    chunks = _chunk_plays(plays, chunk_size=3)
+    
+    assert [which_game for which_game, _ in chunks] == ["game_a", "game_a", "game_a", "game_b"]
+    assert [len(chunk_plays) for _, chunk_plays in chunks] == [3, 3, 1, 1]
+    
+    assert [(which_game, play_id, tag) for which_game, chunk_plays in chunks for play_id, tag in chunk_plays] == plays